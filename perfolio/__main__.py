@@ -1,10 +1,38 @@
+import argparse
 import sys
 
-from perfolio.application import Application
-
 def main() -> int:
-    app = Application(sys.argv)
+    # Shadow mode checks every operation against the reference engine, for this session only
+    shadow = "--shadow" in sys.argv
+    argv = [argument for argument in sys.argv if argument != "--shadow"]
+    if shadow:
+        from perfolio.shadow import ShadowMode
+        ShadowMode.forced = True
+
+    # Without a command, the desktop application is started
+    if len(argv) > 1 and argv[1] == "serve":
+        parser = argparse.ArgumentParser(prog="perfolio serve", description="Serve the analysis engine as a local JSON API.")
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--offline", action="store_true", help="use synthetic prices instead of Yahoo Finance")
+        args = parser.parse_args(argv[2:])
+
+        from perfolio.server import serve
+        return serve(args.host, args.port, args.offline)
+
+    if len(argv) > 1 and argv[1] == "shadow-test":
+        parser = argparse.ArgumentParser(prog="perfolio shadow-test", description="Compare the optimized and reference engines on random synthetic portfolios.")
+        parser.add_argument("--portfolios", type=int, default=10)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--operations", default="", help="only check operations whose name contains this text")
+        args = parser.parse_args(argv[2:])
+
+        from perfolio.shadow import ShadowHarness
+        return ShadowHarness.run(args.portfolios, args.seed, args.operations)
+
+    from perfolio.application import Application
+    app = Application(argv)
     return app.run()
 
 if __name__ == '__main__':
-    sys.exit(main())
\ No newline at end of file
+    sys.exit(main())
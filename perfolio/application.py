@@ -3,7 +3,10 @@ import qdarktheme
 from PySide6.QtWidgets import QApplication, QMenu
 
 from perfolio.gui import MainWindow
+from perfolio.pricestore import PriceStore
 from perfolio.settings import AppSettings
+from perfolio.symbol import SymbolCache
+from perfolio.utils import Utils
 
 class Application:
     def __init__(self, argv:list[str]):
@@ -12,6 +15,9 @@ class Application:
         
         # Setup environment
         AppSettings.load_settings()
+
+        # Downloaded prices are kept between sessions, each start only fetches the newest days
+        SymbolCache.price_store = PriceStore(Utils.get_prices_folder_path())
         
         qdarktheme.setup_theme(AppSettings.get("theme"))
 
@@ -0,0 +1,207 @@
+import itertools
+import numpy
+
+from PySide6.QtCore import Qt, QDate
+from perfolio.ledger import Ledger
+from perfolio.periodic import PeriodicReturn, PeriodicReturnsProcessor
+from perfolio.portfolio import Portfolio
+from perfolio.utils import Utils
+
+# Trades smaller than this are rounding noise and are not recorded
+QUANTITY_EPSILON = 1e-9
+
+class BacktestResult:
+    def __init__(self, begin_date: QDate, end_date: QDate, symbols: list[str], weights: numpy.ndarray, returns: list[PeriodicReturn], traded_values: numpy.ndarray, costs: numpy.ndarray, portfolios: list[Portfolio], actual: PeriodicReturn):
+        self.begin_date = begin_date
+        self.end_date = end_date
+
+        # One row per weight set, one column per symbol
+        self.symbols = symbols
+        self.weights = weights
+
+        self.returns = returns
+        self.traded_values = traded_values
+        self.costs = costs
+        self.portfolios = portfolios
+        self.actual = actual
+
+class BacktestProcessor:
+    schedules = ["Monthly", "Quarterly", "Yearly", "Never"]
+    max_weight_sets = 5000
+
+    @staticmethod
+    def parse_weight_sets(text: str) -> tuple[list[str], numpy.ndarray]:
+        symbols = []
+        weight_sets = []
+
+        # One "SYMBOL WEIGHT, SYMBOL WEIGHT" set per line, weights are normalized to sum to one
+        for line in text.splitlines():
+            parts = line.replace(",", " ").replace(":", " ").replace("%", " ").split()
+            if not parts:
+                continue
+            if len(parts) % 2 != 0:
+                raise ValueError(f"Invalid weights: {line}")
+            try:
+                weight_set = {symbol.upper(): float(weight) for symbol, weight in zip(parts[::2], parts[1::2])}
+            except ValueError:
+                raise ValueError(f"Invalid weights: {line}")
+            if any(weight < 0 for weight in weight_set.values()) or sum(weight_set.values()) <= 0:
+                raise ValueError(f"Invalid weights: {line}")
+            symbols += [symbol for symbol in weight_set if symbol not in symbols]
+            weight_sets.append(weight_set)
+
+        weights = numpy.array([[weight_set.get(symbol, 0.0) for symbol in symbols] for weight_set in weight_sets]).reshape(len(weight_sets), len(symbols))
+        return symbols, weights / weights.sum(axis=1, keepdims=True) if len(weight_sets) else weights
+
+    @staticmethod
+    def generate_weight_grid(symbol_count: int, step: float) -> numpy.ndarray:
+        # Every split of 100% into multiples of the step, placed as bars between the units
+        units = round(1 / step)
+        if units < 1 or abs(units * step - 1) > 1e-9:
+            raise ValueError("The sweep step must divide 100%.")
+        if symbol_count == 0:
+            return numpy.zeros((0, 0))
+
+        set_count = numpy.prod(numpy.arange(units + 1, units + symbol_count, dtype=float)) / numpy.prod(numpy.arange(1, symbol_count, dtype=float))
+        if set_count > BacktestProcessor.max_weight_sets:
+            raise ValueError(f"The sweep would test {int(set_count)} weight sets, at most {BacktestProcessor.max_weight_sets} are supported.")
+
+        bars = numpy.array(list(itertools.combinations(range(units + symbol_count - 1), symbol_count - 1)), dtype=numpy.int64).reshape(-1, symbol_count - 1)
+        edges = numpy.hstack((numpy.full((len(bars), 1), -1), bars, numpy.full((len(bars), 1), units + symbol_count - 1)))
+        return (numpy.diff(edges, axis=1) - 1) / units
+
+    @staticmethod
+    def get_rebalance_days(begin_date: QDate, end_date: QDate, schedule: str) -> numpy.ndarray:
+        if schedule == "Never":
+            return numpy.zeros(0, dtype=numpy.int64)
+
+        # The first period starts with the initial investment, every later one with a rebalance
+        ranges = PeriodicReturnsProcessor.generate_calendar_ranges(begin_date, end_date, schedule)
+        return Utils.dates_to_days([start_date for _, start_date, _ in ranges[1:]])
+
+    @staticmethod
+    def backtest(portfolio: Portfolio, begin_date: QDate, end_date: QDate, symbols: list[str], weights: numpy.ndarray, schedule: str, cost_rate: float = 0.0, fixed_cost: float = 0.0) -> BacktestResult:
+        if schedule not in BacktestProcessor.schedules:
+            raise ValueError(f"Unknown rebalance schedule: {schedule}")
+        if len(weights) == 0:
+            raise ValueError("No target weights specified.")
+        if len(weights) > BacktestProcessor.max_weight_sets:
+            raise ValueError(f"At most {BacktestProcessor.max_weight_sets} weight sets are supported.")
+
+        # Target symbols the portfolio never held are fetched apart from its own, into a cache the weight sets are valued with
+        cache = portfolio.get_symbols_cache(symbols)
+        if cache is None:
+            raise ValueError("Historical prices are not loaded.")
+        price_source = portfolio.get_price_source(cache)
+
+        ranges = PeriodicReturnsProcessor.snap_to_trading_days(portfolio, [("Backtest", begin_date, end_date)])
+        if not ranges:
+            raise ValueError("No market data in the selected range.")
+        _, begin_date, end_date = ranges[0]
+        begin_day = Utils.date_to_day(begin_date)
+        end_day = Utils.date_to_day(end_date)
+
+        # Row 0 is the close before the range, where the actual portfolio's value is invested at the target weights.
+        # Days any of the portfolio's or the target symbols traded, like a cache holding both
+        trading_days = numpy.union1d(portfolio.get_price_source().get_days(), price_source.get_days())
+        first_index = numpy.searchsorted(trading_days, begin_day, side='left')
+        last_index = numpy.searchsorted(trading_days, end_day, side='right')
+        days = trading_days[max(first_index - 1, 0):last_index]
+
+        flows = numpy.zeros(len(days))
+        if first_index > 0:
+            flows[0] = portfolio.get_values_at_days(days[:1], True)[0]
+
+        # The actual portfolio's net purchases become deposits on the same days, or the next trading day
+        ledger = portfolio.get_ledger()
+        in_range = (ledger.days >= begin_day) & (ledger.days <= end_day)
+        flow_rows = numpy.searchsorted(days, ledger.days[in_range], side='left')
+        flows += numpy.bincount(flow_rows, weights=ledger.cash_flows[in_range], minlength=len(days))[:len(days)]
+
+        rebalancing = numpy.zeros(len(days), dtype=bool)
+        rebalancing[0] = True
+        rebalance_rows = numpy.searchsorted(days, BacktestProcessor.get_rebalance_days(begin_date, end_date, schedule), side='left')
+        rebalancing[rebalance_rows[rebalance_rows < len(days)]] = True
+        event_rows = numpy.flatnonzero(rebalancing | (flows != 0))
+
+        # Prices carry over days a symbol did not trade, splits scale the simulated shares like real ones
+        closes = price_source.get_symbol_prices_at_days(symbols, days, 'Close')
+        filled_rows = numpy.maximum.accumulate(numpy.where(numpy.isnan(closes), 0, numpy.arange(len(days))[:, None]), axis=0)
+        closes = closes[filled_rows, numpy.arange(len(symbols))]
+        splits = price_source.get_symbol_prices_at_days(symbols, days, 'Stock Splits')
+        split_factors = numpy.cumprod(numpy.where(numpy.isnan(splits) | (splits <= 0), 1.0, splits), axis=0)
+
+        weighted = weights.max(axis=0) > 0
+        for row in event_rows:
+            missing = numpy.flatnonzero(weighted & numpy.isnan(closes[row]))
+            if len(missing):
+                raise ValueError(f"No price for {symbols[missing[0]]} on {Utils.day_to_date(days[row]).toString(Qt.DateFormat.ISODate)}.")
+
+        # Every weight set is stepped at once, one (weight set x symbol) update per event
+        set_count = len(weights)
+        shares = numpy.zeros((set_count, len(symbols)))
+        traded_values = numpy.zeros(set_count)
+        costs = numpy.zeros(set_count)
+        trade_rows, trade_sets, trade_symbols, trade_quantities, trade_prices = [], [], [], [], []
+        previous_row = event_rows[0] if len(event_rows) else 0
+
+        def get_costs(trades: numpy.ndarray, prices: numpy.ndarray) -> numpy.ndarray:
+            return cost_rate * (numpy.abs(trades) * prices).sum(axis=1) + fixed_cost * (numpy.abs(trades) > QUANTITY_EPSILON).sum(axis=1)
+
+        def get_target_values(current_values: numpy.ndarray, amount: numpy.ndarray, rebalance: bool) -> numpy.ndarray:
+            # Deposits and withdrawals follow the target weights, sets they would push short are rebalanced instead
+            deployed_values = current_values + weights * amount[:, None]
+            rebalanced_values = weights * numpy.maximum(current_values.sum(axis=1) + amount, 0)[:, None]
+            rebalance_sets = numpy.full(set_count, rebalance) | (deployed_values < 0).any(axis=1)
+            return numpy.where(rebalance_sets[:, None], rebalanced_values, deployed_values)
+
+        for row in event_rows:
+            shares = shares * (split_factors[row] / split_factors[previous_row])
+            previous_row = row
+
+            prices = numpy.where(weighted, closes[row], 1.0)
+            current_values = shares * prices
+            amount = numpy.full(set_count, flows[row])
+
+            # Costs are paid out of the amount invested, estimated from the trades they are charged on
+            estimated_trades = get_target_values(current_values, amount, rebalancing[row]) / prices - shares
+            amount = amount - get_costs(estimated_trades, prices)
+            trades = get_target_values(current_values, amount, rebalancing[row]) / prices - shares
+            trades[numpy.abs(trades) <= QUANTITY_EPSILON] = 0.0
+            shares = shares + trades
+
+            trade_costs = get_costs(trades, prices)
+            traded_values += (numpy.abs(trades) * prices).sum(axis=1)
+            costs += trade_costs
+
+            # Costs are folded into the trade prices, so they show up in the cash flows and lower the returns
+            set_indices, symbol_indices = numpy.nonzero(trades)
+            quantities = trades[set_indices, symbol_indices]
+            trade_prices.append(prices[symbol_indices] * (1 + cost_rate * numpy.sign(quantities)) + fixed_cost / quantities)
+            trade_rows.append(numpy.full(len(set_indices), row))
+            trade_sets.append(set_indices)
+            trade_symbols.append(symbol_indices)
+            trade_quantities.append(quantities)
+
+        trade_rows, trade_sets, trade_symbols, trade_quantities, trade_prices = [numpy.concatenate(values) if values else numpy.zeros(0) for values in (trade_rows, trade_sets, trade_symbols, trade_quantities, trade_prices)]
+
+        # Each weight set becomes a portfolio of its own, measured like the actual one
+        order = numpy.argsort(trade_sets, kind='stable')
+        boundaries = numpy.searchsorted(trade_sets[order], numpy.arange(set_count + 1))
+        period = [("Backtest", begin_date, end_date)]
+        portfolios = []
+        returns = []
+        for index in range(set_count):
+            selected = order[boundaries[index]:boundaries[index + 1]]
+            backtest_portfolio = Portfolio()
+            backtest_portfolio.transactions = []
+            backtest_portfolio.symbol_cache = cache
+            backtest_portfolio.invalidate_ledger()
+            backtest_portfolio.ledger = Ledger.from_trades(symbols, days[trade_rows[selected].astype(numpy.int64)], trade_symbols[selected].astype(numpy.int64), trade_quantities[selected], trade_prices[selected])
+            backtest_portfolio.include_dividends = portfolio.include_dividends
+            backtest_portfolio.memory_budget = portfolio.memory_budget
+            portfolios.append(backtest_portfolio)
+            returns.append(PeriodicReturnsProcessor.calculate_periodic_returns(backtest_portfolio, period)[0])
+
+        actual = PeriodicReturnsProcessor.calculate_periodic_returns(portfolio, period)[0]
+        return BacktestResult(begin_date, end_date, symbols, weights, returns, traded_values, costs, portfolios, actual)
@@ -0,0 +1,38 @@
+import numpy
+
+class Decimation:
+    @staticmethod
+    def get_window(x: numpy.ndarray, x_min: float, x_max: float) -> tuple[int, int]:
+        # Keep one point on each side so lines still reach the window edges
+        start = max(numpy.searchsorted(x, x_min, side='left') - 1, 0)
+        end = min(numpy.searchsorted(x, x_max, side='right') + 1, len(x))
+        return start, end
+
+    @staticmethod
+    def min_max(x: numpy.ndarray, y: numpy.ndarray, buckets: int) -> tuple[numpy.ndarray, numpy.ndarray]:
+        # Keeps the lowest and highest point of every bucket, in order, so peaks and troughs survive
+        count = len(y)
+        if count <= 2 * buckets:
+            return x, y
+
+        bucket_size = -(-count // buckets)
+        padded_count = bucket_size * buckets
+
+        low = numpy.full(padded_count, numpy.inf)
+        high = numpy.full(padded_count, -numpy.inf)
+        low[:count] = numpy.where(numpy.isnan(y), numpy.inf, y)
+        high[:count] = numpy.where(numpy.isnan(y), -numpy.inf, y)
+
+        offsets = numpy.arange(buckets) * bucket_size
+        min_indices = low.reshape(buckets, bucket_size).argmin(axis=1) + offsets
+        max_indices = high.reshape(buckets, bucket_size).argmax(axis=1) + offsets
+
+        # The first and last points are always kept, trailing padded buckets are dropped
+        indices = numpy.unique(numpy.concatenate(([0, count - 1], min_indices, max_indices)))
+        indices = indices[indices < count]
+        return x[indices], y[indices]
+
+    @staticmethod
+    def decimate_window(x: numpy.ndarray, y: numpy.ndarray, x_min: float, x_max: float, width: int) -> tuple[numpy.ndarray, numpy.ndarray]:
+        start, end = Decimation.get_window(x, x_min, x_max)
+        return Decimation.min_max(x[start:end], y[start:end], max(width, 1))
@@ -0,0 +1,62 @@
+import numpy
+
+from perfolio.ledger import Ledger, LedgerEdit
+from perfolio.sparse import SparseSeries
+from perfolio.splits import SplitAdjustment
+
+# Dividend income of the ledger's holdings, one entry per ex-date of a symbol
+class DividendIncome:
+    def __init__(self, split_adjustment: SplitAdjustment, price_source):
+        ledger = split_adjustment.ledger
+        self.price_source = price_source
+        self.version = price_source.version
+
+        # Shares held before the ex-date's transactions receive the dividend
+        self.event_symbol_ids, self.event_days, self.dividends = price_source.get_price_events(ledger.symbols, 'Dividends')
+        self.income = split_adjustment.get_positions_at_points(self.event_symbol_ids, self.event_days, False) * self.dividends
+
+        # Running totals per symbol, then over all symbols by day, like the ledger's cash flows
+        self.cumulative_income = SparseSeries.from_changes(len(ledger.symbols), self.event_symbol_ids, self.event_days, self.income)
+        self.order = numpy.argsort(self.event_days, kind='stable')
+        self.days = self.event_days[self.order]
+        totals = self.income[self.order]
+        self.first_day = self.days[0] if len(self.days) else 0
+        self.income_totals = numpy.concatenate(([0.0], numpy.cumsum(totals)))
+        self.day_weighted_income_totals = numpy.concatenate(([0.0], numpy.cumsum(totals * (self.days - self.first_day))))
+
+    def apply_edit(self, split_adjustment: SplitAdjustment, edit: LedgerEdit):
+        # Only the edited symbols' income from the first edited day on changes
+        changed = numpy.isin(self.event_symbol_ids, edit.symbol_ids) & (self.event_days >= edit.first_day)
+        symbol_ids = self.event_symbol_ids[changed]
+        days = self.event_days[changed]
+        self.income[changed] = split_adjustment.get_positions_at_points(symbol_ids, days, False) * self.dividends[changed]
+        self.cumulative_income = self.cumulative_income.splice(edit.symbol_ids, edit.first_day, symbol_ids, days, self.income[changed])
+
+        first = numpy.searchsorted(self.days, edit.first_day, side='left')
+        totals = self.income[self.order]
+        self.income_totals = Ledger.update_totals(self.income_totals, totals, first)
+        self.day_weighted_income_totals = Ledger.update_totals(self.day_weighted_income_totals, totals * (self.days - self.first_day), first)
+
+    def get_day_counts(self, days: numpy.ndarray) -> numpy.ndarray:
+        return numpy.searchsorted(self.days, days, side='right')
+
+    def get_income_between_days(self, boundary_days: numpy.ndarray) -> numpy.ndarray:
+        # Income of each (previous boundary, boundary] interval, per symbol
+        cumulative = self.cumulative_income.get_dense(boundary_days)
+        return cumulative[1:] - cumulative[:-1]
+
+    def get_cumulative_income_at_days(self, days: numpy.ndarray) -> numpy.ndarray:
+        return self.income_totals[self.get_day_counts(days)]
+
+    def get_weighted_income(self, begin_day: int, end_day: int) -> tuple[float, float]:
+        # Same weighting as Ledger.get_weighted_cash_flows
+        first = numpy.searchsorted(self.days, begin_day, side='left')
+        last = numpy.searchsorted(self.days, end_day, side='right')
+
+        income = self.income_totals[last] - self.income_totals[first]
+        day_weighted_income = self.day_weighted_income_totals[last] - self.day_weighted_income_totals[first]
+
+        length = end_day - begin_day
+        if length <= 0:
+            return income, income
+        return income, ((end_day - self.first_day) * income - day_weighted_income) / length
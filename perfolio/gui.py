@@ -1,24 +1,35 @@
+import copy
 import os
-import csv
+import numpy
 
 from PySide6 import QtCore
-from PySide6.QtCore import Qt, QUrl, QDate
+from PySide6.QtCore import (
+    Qt, QUrl, QDate, QAbstractTableModel, QModelIndex, QSortFilterProxyModel,
+    QObject, Signal, QRunnable, QThreadPool, QTimer, QFileSystemWatcher,
+    QDateTime, QPointF
+)
+from PySide6.QtCharts import QChart, QChartView, QLineSeries, QDateTimeAxis, QValueAxis
 from PySide6.QtGui import QAction, QFont, QFontDatabase, QIcon, QPainter, QPixmap, QDesktopServices
 from PySide6.QtWidgets import (
     QDialog, QLayout, QMainWindow, QMessageBox,
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
     QLabel, QFormLayout, QDockWidget, QStyle,
-    QTextEdit, QApplication, QTableWidget,
+    QTextEdit, QApplication, QTableWidget, QTableView,
     QFileDialog, QTableWidgetItem, QHeaderView,
-    QGroupBox, QTabWidget
+    QGroupBox, QTabWidget, QCheckBox, QComboBox
 )
 import perfolio
-from perfolio.output import Output
+from perfolio.decimation import Decimation
+from perfolio.history import ResultsHistory
+from perfolio.output import Chart, Column, Output, Table
 from perfolio.portfolio import Portfolio, Transaction
 
 from perfolio.settings import AppSettings
+from perfolio.shadow import ShadowMode
 from perfolio.utils import Utils
+from perfolio.whatif import WhatIfSession
 from perfolio.operations import OperationRegistry, Operation
+from perfolio.operations.analysis import ValidatePortfolioOperation
 
 class SettingsDialog(QDialog):
     def __init__(self):
@@ -100,13 +111,78 @@ class SettingsDialog(QDialog):
         else:
             QMessageBox.warning(self, "Warning", "Settings file not found.")
 
+class ResultsHistoryDialog(QDialog):
+    def __init__(self, history: ResultsHistory, output: Output):
+        super().__init__()
+
+        self.history = history
+        self.output = output
+        self.runs = history.get_runs()
+
+        self.setWindowTitle("Results History")
+
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+
+        self.runs_table = QTableWidget(len(self.runs), 6)
+        self.runs_table.setHorizontalHeaderLabels(["Time", "Operation", "Account", "Settings", "Duration", "Status"])
+        self.runs_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.runs_table.setSelectionMode(QTableWidget.SelectionMode.SingleSelection)
+        self.runs_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        for row, run in enumerate(self.runs):
+            values = [
+                QDateTime.fromSecsSinceEpoch(int(run.started_at)).toString(Qt.DateFormat.ISODate),
+                run.operation_name,
+                run.account or TransactionPanel.all_accounts,
+                ", ".join(f"{key}: {value}" for key, value in run.settings.items()),
+                f"{run.duration:.2f} s",
+                "Succeeded" if run.success else "Failed",
+            ]
+            for column, value in enumerate(values):
+                self.runs_table.setItem(row, column, QTableWidgetItem(value))
+        self.runs_table.resizeColumnsToContents()
+        self.runs_table.doubleClicked.connect(self.open_run)
+        layout.addWidget(self.runs_table)
+
+        buttons_layout = QHBoxLayout()
+
+        open_button = QPushButton("Open")
+        open_button.clicked.connect(self.open_run)
+        buttons_layout.addWidget(open_button)
+
+        compare_button = QPushButton("Compare Runs")
+        compare_button.clicked.connect(self.compare_runs)
+        buttons_layout.addWidget(compare_button)
+
+        layout.addLayout(buttons_layout)
+
+    def get_selected_run(self):
+        rows = self.runs_table.selectionModel().selectedRows()
+        return self.runs[rows[0].row()] if rows else None
+
+    def open_run(self):
+        # Stored results are shown again as they were, nothing is recomputed
+        run = self.get_selected_run()
+        if run is not None:
+            self.history.replay(run.run_id, self.output)
+            self.accept()
+
+    def compare_runs(self):
+        # The latest runs with the same operation and settings, side by side
+        run = self.get_selected_run()
+        if run is not None:
+            trend = self.history.get_trend(run.operation_hash, run.settings, run.account)
+            self.output.log_table(f"{run.operation_name.split('|')[-1]} History", trend.columns)
+            self.accept()
+
 class OperationSettingsDialog(QDialog):
-    def __init__(self, portfolio: Portfolio, output: Output, operation: Operation):
+    def __init__(self, portfolio: Portfolio, output: Output, operation: Operation, run_callback=None):
         super().__init__()
 
         self.portfolio = portfolio
         self.output = output
         self.operation = operation
+        self.run_callback = run_callback
 
         self.setWindowTitle(f"{operation.name} Settings")
         
@@ -120,6 +196,9 @@ class OperationSettingsDialog(QDialog):
             self.controls[id] = setting.create_widget(id)
             layout.addRow(label, self.controls[id])
 
+        self.pin_checkbox = QCheckBox("Re-run when the portfolio file changes")
+        layout.addRow(self.pin_checkbox)
+
         buttons_layout = QHBoxLayout()  # Horizontal layout for buttons
         
         self.run_button = QPushButton("Run")
@@ -133,7 +212,10 @@ class OperationSettingsDialog(QDialog):
     def on_run(self):
         settings = self.get_settings()
         self.run_button.setDisabled(True)
-        self.operation.execute_with_settings(settings, self.portfolio, self.output)
+        if self.run_callback:
+            self.run_callback(self.operation, settings, self.pin_checkbox.isChecked())
+        else:
+            self.operation.execute_with_settings(settings, self.portfolio, self.output)
         self.close()
 
     def get_settings(self) -> dict:
@@ -144,6 +226,24 @@ class OperationSettingsDialog(QDialog):
             
         return settings
 
+class Task(QRunnable):
+    def __init__(self, function, error_callback):
+        super().__init__()
+        self.function = function
+        self.error_callback = error_callback
+
+    def run(self):
+        try:
+            self.function()
+        except Exception as e:
+            self.error_callback(f"Error running background task: {e}")
+
+# Forwards output logged from background tasks to the GUI thread
+class OutputBridge(QObject):
+    text_logged = Signal(str)
+    table_logged = Signal(object)
+    chart_logged = Signal(object)
+
 class Panel(QDockWidget):
     def __init__(self, title, parent):
         super().__init__(title, parent)
@@ -155,6 +255,141 @@ class Panel(QDockWidget):
     def create_layout(self) -> QLayout:
         pass
 
+class TableModel(QAbstractTableModel):
+    def __init__(self, table: Table):
+        super().__init__()
+        self.table = table
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.table.get_row_count()
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.table.columns)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        # Cells are only formatted when the view asks for them, i.e. when they are visible
+        if not index.isValid():
+            return None
+        column = self.table.columns[index.column()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return column.format_value(index.row())
+        if role == Qt.ItemDataRole.UserRole:
+            return column.get_raw_value(index.row())
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.table.columns[section].name
+        return str(section + 1)
+
+class DecimatedChartView(QChartView):
+    # Emitted with the new visible range (in msecs since epoch) when the user zooms or pans
+    range_changed = Signal(float, float)
+
+    milliseconds_per_day = 86400000
+    label_formats = {"percent": "%.1f%%", "currency": "$%.0f"}
+
+    def __init__(self, days: numpy.ndarray, column: Column):
+        chart = QChart()
+        chart.setTitle(column.name)
+        chart.legend().hide()
+        super().__init__(chart)
+        self.setRenderHint(QPainter.RenderHint.Antialiasing)
+
+        # The full series is kept here, Qt only ever receives the decimated visible window
+        self.x = days.astype(numpy.float64) * self.milliseconds_per_day
+        self.y = column.values * 100 if column.format == "percent" else column.values
+
+        self.series = QLineSeries()
+        chart.addSeries(self.series)
+
+        self.x_axis = QDateTimeAxis()
+        self.x_axis.setFormat("yyyy-MM-dd")
+        chart.addAxis(self.x_axis, Qt.AlignmentFlag.AlignBottom)
+        self.series.attachAxis(self.x_axis)
+
+        self.y_axis = QValueAxis()
+        self.y_axis.setLabelFormat(self.label_formats.get(column.format, "%.2f"))
+        chart.addAxis(self.y_axis, Qt.AlignmentFlag.AlignLeft)
+        self.series.attachAxis(self.y_axis)
+
+        self.drag_start = None
+        self.reset_range()
+
+    def get_range(self) -> tuple[float, float]:
+        return self.x_axis.min().toMSecsSinceEpoch(), self.x_axis.max().toMSecsSinceEpoch()
+
+    def reset_range(self):
+        if len(self.x) > 0:
+            self.set_range(self.x[0], self.x[-1])
+
+    def set_range(self, x_min: float, x_max: float):
+        self.x_axis.setRange(QDateTime.fromMSecsSinceEpoch(int(x_min)), QDateTime.fromMSecsSinceEpoch(int(x_max)))
+        self.update_points()
+
+    def update_points(self):
+        # One bucket per pixel of plot area, each keeping its lowest and highest point
+        x_min, x_max = self.get_range()
+        width = int(self.chart().plotArea().width()) or self.width()
+        x, y = Decimation.decimate_window(self.x, self.y, x_min, x_max, width)
+        self.series.replace([QPointF(x_value, y_value) for x_value, y_value in zip(x.tolist(), y.tolist())])
+
+        finite_y = y[numpy.isfinite(y)]
+        if len(finite_y) > 0:
+            padding = (finite_y.max() - finite_y.min()) * 0.05 or 1.0
+            self.y_axis.setRange(finite_y.min() - padding, finite_y.max() + padding)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.update_points()
+
+    def wheelEvent(self, event):
+        # Zoom around the cursor
+        x_min, x_max = self.get_range()
+        anchor = self.chart().mapToValue(event.position(), self.series).x()
+        factor = 0.8 if event.angleDelta().y() > 0 else 1.25
+        self.range_changed.emit(anchor + (x_min - anchor) * factor, anchor + (x_max - anchor) * factor)
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            self.drag_start = (event.position().x(), self.get_range())
+        super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event):
+        if self.drag_start is not None:
+            start_x, (x_min, x_max) = self.drag_start
+            offset = (start_x - event.position().x()) * (x_max - x_min) / max(self.chart().plotArea().width(), 1)
+            self.range_changed.emit(x_min + offset, x_max + offset)
+        super().mouseMoveEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        self.drag_start = None
+        super().mouseReleaseEvent(event)
+
+    def mouseDoubleClickEvent(self, event):
+        if len(self.x) > 0:
+            self.range_changed.emit(self.x[0], self.x[-1])
+
+class ChartPanel(QWidget):
+    def __init__(self, chart: Chart):
+        super().__init__()
+        self.chart = chart
+
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+
+        # One chart per series, zooming or panning any of them moves them all
+        self.views = [DecimatedChartView(chart.days, series) for series in chart.series]
+        for view in self.views:
+            view.range_changed.connect(self.set_range)
+            layout.addWidget(view)
+
+    def set_range(self, x_min: float, x_max: float):
+        for view in self.views:
+            view.set_range(x_min, x_max)
+
 class OutputPanel(Panel):    
     def __init__(self, title, parent):
         super().__init__(title, parent)
@@ -181,18 +416,22 @@ class OutputPanel(Panel):
         self.scroll_to_top_button = QPushButton("Scroll to Top")
         self.scroll_to_bottom_button = QPushButton("Scroll to Bottom")
         self.copy_button = QPushButton("Copy to Clipboard")
+        self.export_button = QPushButton("Export Table")
         
         # Controls Icons & Settings
         self.clear_button.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_DialogResetButton)) 
         self.scroll_to_top_button.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_ArrowUp))
         self.scroll_to_bottom_button.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_ArrowDown)) 
         self.copy_button.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_DialogSaveButton))
+        self.export_button.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_DriveFDIcon))
+        self.export_button.setEnabled(False)
         
         # Controls Callbacks
         self.clear_button.clicked.connect(self.clear_text)
         self.scroll_to_bottom_button.clicked.connect(self.scroll_to_bottom)
         self.scroll_to_top_button.clicked.connect(self.scroll_to_top)
         self.copy_button.clicked.connect(self.copy_to_clipboard)
+        self.export_button.clicked.connect(self.export_current_table)
         
         # Controls Layout
         controls_layout = QHBoxLayout()
@@ -200,6 +439,7 @@ class OutputPanel(Panel):
         controls_layout.addWidget(self.scroll_to_top_button)
         controls_layout.addWidget(self.scroll_to_bottom_button)
         controls_layout.addWidget(self.copy_button)
+        controls_layout.addWidget(self.export_button)
         
         return controls_layout
         
@@ -221,26 +461,46 @@ class OutputPanel(Panel):
     
     def close_tab(self, index):
         self.tabs.removeTab(index)
+        self.export_button.setEnabled(self.tabs.count() > 0)
     
-    def append_table(self, name: str, headers: list[str], data: list[tuple]):
-        table = QTableWidget()
-        table.horizontalHeader().setStretchLastSection(False)
-        table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
-        table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
-
-        table.setColumnCount(len(headers))
-        table.setHorizontalHeaderLabels(headers)
-
-        for rowIndex, entry in enumerate(data):
-            table.insertRow(rowIndex)
-            for col, value in enumerate(entry):
-                    item = QTableWidgetItem(str(value))
-                    table.setItem(rowIndex, col, item)
-
-        table.resizeColumnsToContents()
-        self.tabs.addTab(table, name)
-        self.tabs.setCurrentWidget(table)
+    def append_table(self, table: Table):
+        # Sorting goes through the raw values so numeric columns sort numerically
+        proxy_model = QSortFilterProxyModel()
+        proxy_model.setSourceModel(TableModel(table))
+        proxy_model.setSortRole(Qt.ItemDataRole.UserRole)
+
+        view = QTableView()
+        view.setModel(proxy_model)
+        view.horizontalHeader().setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
+        view.setSortingEnabled(True)
+        view.horizontalHeader().setStretchLastSection(False)
+        view.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
+        view.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
+        view.setEditTriggers(QTableView.EditTrigger.NoEditTriggers)
+
+        view.resizeColumnsToContents()
+        self.tabs.addTab(view, table.name)
+        self.tabs.setCurrentWidget(view)
+        self.export_button.setEnabled(True)
+
+    def append_chart(self, chart: Chart):
+        chart_panel = ChartPanel(chart)
+        self.tabs.addTab(chart_panel, chart.name)
+        self.tabs.setCurrentWidget(chart_panel)
+        self.export_button.setEnabled(True)
+
+    def export_current_table(self):
+        view = self.tabs.currentWidget()
+        if view is None:
+            return
+
+        table = view.chart.to_table() if isinstance(view, ChartPanel) else view.model().sourceModel().table
+        file_path, _ = QFileDialog.getSaveFileName(self, "Export Table", f"{table.name}.csv", "CSV Files (*.csv);;JSON Files (*.json);;Parquet Files (*.parquet)")
+        if file_path:
+            try:
+                table.export(file_path)
+            except Exception as e:
+                QMessageBox.critical(self, "Error", f"Failed to export table: {str(e)}")
 
     def append_text(self, text):
         if text != None:
@@ -271,27 +531,98 @@ class OutputPanel(Panel):
         clipboard.setText(self.output.toPlainText())
     
 class TransactionPanel(Panel):
-    def __init__(self, title, parent, portfolio: Portfolio):
+    all_accounts = "All Accounts"
+
+    # Emitted from background tasks, handled on the GUI thread
+    portfolio_loaded = Signal(list)
+    transactions_ingested = Signal()
+    what_if_applied = Signal()
+
+    # Columns of the transactions table, parsed back like CSV headers when a cell is edited
+    headers = ["account", "symbol", "date", "type", "quantity", "price"]
+
+    def __init__(self, title, parent, portfolio: Portfolio, output: Output, run_in_background, execute_operation):
         self.portfolio = portfolio
+        self.output = output
+        self.run_in_background = run_in_background
+        self.execute_operation = execute_operation
+
+        # Raw CSV headers and rows of every loaded file along with their parsed transaction
+        self.loaded_files = dict[str, tuple[list[str], list[tuple[tuple, Transaction]]]]()
+        self.changed_file_paths = set[str]()
+
+        # Operations (with their settings and account) re-run whenever a portfolio file changes
+        self.pinned_operations = list[tuple[Operation, dict, str]]()
+
+        # Hypothetical edits of the loaded transactions, the transaction shown on each table row
+        self.what_if = WhatIfSession(self.portfolio)
+        self.table_transactions = list[Transaction]()
+
         super().__init__(title, parent)
 
+        self.file_watcher = QFileSystemWatcher(self)
+        self.file_watcher.fileChanged.connect(self.on_file_changed)
+
+        # Brokers often write files in several bursts, wait for them to settle
+        self.ingest_timer = QTimer(self)
+        self.ingest_timer.setSingleShot(True)
+        self.ingest_timer.setInterval(1000)
+        self.ingest_timer.timeout.connect(lambda: self.run_in_background(self.ingest_file_changes))
+
+        self.portfolio_loaded.connect(self.on_portfolio_loaded)
+        self.transactions_ingested.connect(self.refresh_accounts)
+        self.transactions_ingested.connect(self.refresh_table)
+        self.what_if_applied.connect(self.refresh_accounts)
+        self.what_if_applied.connect(self.refresh_table)
+
+        last_opened_portfolio = Utils.retrieve_last_opened_portfolio()
+        self.load_data_from_csvs(last_opened_portfolio)
+
     def setup_table(self):
         self.transactions_table.horizontalHeader().setStretchLastSection(False)
         self.transactions_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
         self.transactions_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        self.transactions_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.transactions_table.setEditTriggers(QTableWidget.EditTrigger.DoubleClicked | QTableWidget.EditTrigger.EditKeyPressed)
+        self.transactions_table.itemChanged.connect(self.on_item_changed)
         
     def create_layout(self):
         layout = QVBoxLayout()
 
+        # Operations run on the selected account, or on all of them combined
+        self.account_selector = QComboBox()
+        self.account_selector.addItem(TransactionPanel.all_accounts)
+        self.account_selector.currentTextChanged.connect(lambda _: self.refresh_table())
+        layout.addWidget(self.account_selector)
+
         self.transactions_table = QTableWidget()
-        self.transactions_table.setColumnCount(5)
-        self.transactions_table.setHorizontalHeaderLabels(["Symbol", "Date", "Type", "Quantity", "Price"])
+        self.transactions_table.setColumnCount(6)
+        self.transactions_table.setHorizontalHeaderLabels(["Account", "Symbol", "Date", "Type", "Quantity", "Price"])
         self.setup_table()
         layout.addWidget(self.transactions_table)
-        
-        last_opened_portfolio = Utils.retrieve_last_opened_portfolio()
-        self.load_data_from_csv(last_opened_portfolio)
+
+        # What-if edits change the loaded transactions only, reloading the files discards them
+        what_if_layout = QHBoxLayout()
+        add_button = QPushButton("Add")
+        add_button.setToolTip("Add a what-if transaction, copied from the selected one")
+        add_button.clicked.connect(self.add_what_if_transaction)
+        what_if_layout.addWidget(add_button)
+
+        remove_button = QPushButton("Remove")
+        remove_button.setToolTip("Remove the selected transactions")
+        remove_button.clicked.connect(self.remove_what_if_transactions)
+        what_if_layout.addWidget(remove_button)
+
+        self.undo_button = QPushButton("Undo")
+        self.undo_button.setShortcut("Ctrl+Z")
+        self.undo_button.clicked.connect(lambda: self.apply_what_if(self.what_if.undo))
+        what_if_layout.addWidget(self.undo_button)
+
+        self.redo_button = QPushButton("Redo")
+        self.redo_button.setShortcut("Ctrl+Shift+Z")
+        self.redo_button.clicked.connect(lambda: self.apply_what_if(self.what_if.redo))
+        what_if_layout.addWidget(self.redo_button)
+        layout.addLayout(what_if_layout)
+        self.refresh_what_if_buttons()
 
         load_button = QPushButton("Load from CSV")
         load_button.clicked.connect(self.load_data_from_csv_dialog)
@@ -308,84 +639,239 @@ class TransactionPanel(Panel):
         return layout
 
     def load_data_from_csv_dialog(self):
-        # Open a file dialog to get the path to the CSV file
+        # Open a file dialog to get the paths to the CSV files, one per account
         file_dialog = QFileDialog()
-        file_path, _ = file_dialog.getOpenFileName(self, "Open CSV File", "", "CSV Files (*.csv)")
-        self.load_data_from_csv(file_path)
-
-    def load_data_from_csv(self, file_path):
-        if file_path:
-            print(f"Loading data from CSV file: {file_path}")
-
-            # Load data from the CSV file and update the table
-            try:
-                self.portfolio.clear()
-                self.portfolio.file_path = file_path
-
-                with open(file_path, 'r', newline='') as csvfile:
-                    csvreader = csv.reader(csvfile)
-                    headers = [header.lower() for header in next(csvreader)]
-
-                    # Mapping for header variations
-                    header_mapping = {
-                        'date': ['date', 'dt', 'dte', 'de', 'day', 'at', 'dy', 'time', 'timestamp'],
-                        'symbol': ['symbol', 'ticker', 'sym', 'sbl', 'symbols'],
-                        'type': ['type', 'transaction', 'trz', 'tpe'],
-                        'quantity': ['quantity', 'qty', 'qt', 'amount', 'volume', 'amnt', 'shares'],
-                        'price': ['price', 'prc', 'pc', 'cost', 'value', 'cst', 'money', 'spent']
-                    }
-                    
-                    for row in csvreader:
-                        transaction = Transaction()
-
-                        # Process each header and fill in the transaction attributes
-                        for attribute, variations in header_mapping.items():
-                            for variation in variations:
-                                if variation in headers:
-                                    index = headers.index(variation)
-                                    value = row[index]
-
-                                    # Special handling for 'date' and 'quantity'
-                                    if attribute == 'date':
-                                        value = Utils.convert_date_format(value)
-                                        transaction.date = QDate.fromString(value, Qt.DateFormat.ISODate)
-                                    elif attribute == 'quantity':
-                                        transaction.quantity = float(value)
-                                    else:
-                                        setattr(transaction, attribute, value)
-                                    break
-
-                        self.portfolio.transactions.append(transaction)
-
-                self.on_portfolio_updated()
-
-            except Exception as e:
-                print(f"Error loading CSV file: {e}")
+        file_paths, _ = file_dialog.getOpenFileNames(self, "Open CSV Files", "", "CSV Files (*.csv)")
+        self.load_data_from_csvs(file_paths)
+
+    def load_data_from_csvs(self, file_paths):
+        if file_paths:
+            self.run_in_background(lambda: self.load_portfolio_files(file_paths))
+
+    def load_portfolio_files(self, file_paths):
+        print(f"Loading data from CSV files: {', '.join(file_paths)}")
+
+        # Load data from the CSV files and update the table
+        try:
+            loaded_files = self.portfolio.load_data_from_csvs(file_paths)
+            self.loaded_files = dict(zip(file_paths, loaded_files))
+            self.what_if.clear()
+            self.report_duplicates()
+
+            self.on_portfolio_updated()
+            self.portfolio_loaded.emit(file_paths)
+            self.report_validation_issues()
+
+        except Exception as e:
+            print(f"Error loading CSV files: {e}")
+
+    def report_duplicates(self):
+        row_count = sum(len(loaded_rows) for _, loaded_rows in self.loaded_files.values())
+        if row_count > len(self.portfolio.transactions):
+            print(f"Skipped {row_count - len(self.portfolio.transactions)} transactions repeated across files")
+
+    def on_portfolio_loaded(self, file_paths):
+        # Only the loaded files are watched
+        if self.file_watcher.files():
+            self.file_watcher.removePaths(self.file_watcher.files())
+        self.file_watcher.addPaths(file_paths)
+        self.refresh_accounts()
+        self.refresh_table()
+
+    def on_file_changed(self, file_path):
+        # Editors that replace the file on save remove it from the watcher
+        if file_path not in self.file_watcher.files() and os.path.exists(file_path):
+            self.file_watcher.addPath(file_path)
+        self.changed_file_paths.add(file_path)
+        self.ingest_timer.start()
+
+    def ingest_file(self, file_path: str, changed_dates: list[QDate]) -> bool:
+        if file_path not in self.loaded_files or not os.path.exists(file_path):
+            return False
+
+        try:
+            headers, rows = Portfolio.read_csv_rows(file_path)
+        except Exception as e:
+            print(f"Error reading CSV file: {e}")
+            return False
+
+        # Unchanged rows keep their parsed transaction, only new rows are parsed
+        csv_headers, csv_loaded_rows = self.loaded_files[file_path]
+        unchanged_rows = {}
+        file_changed_dates = []
+        if headers == csv_headers:
+            for row, transaction in csv_loaded_rows:
+                unchanged_rows.setdefault(row, []).append(transaction)
+        else:
+            file_changed_dates += [transaction.date for _, transaction in csv_loaded_rows]
+
+        loaded_rows = []
+        source = Portfolio.get_source_name(file_path)
+        try:
+            for row in rows:
+                transactions = unchanged_rows.get(row)
+                if transactions:
+                    loaded_rows.append((row, transactions.pop(0)))
+                else:
+                    transaction = Portfolio.parse_transaction(headers, row, source)
+                    loaded_rows.append((row, transaction))
+                    file_changed_dates.append(transaction.date)
+        except Exception as e:
+            print(f"Error parsing CSV file: {e}")
+            return False
+
+        # Whatever was not matched has been removed from the file
+        for transactions in unchanged_rows.values():
+            file_changed_dates += [transaction.date for transaction in transactions]
+
+        if not file_changed_dates:
+            return False
+
+        print(f"Ingesting {len(file_changed_dates)} changed rows from CSV file: {file_path}")
+        self.loaded_files[file_path] = (headers, loaded_rows)
+        changed_dates += file_changed_dates
+        return True
+
+    def ingest_file_changes(self):
+        changed_file_paths = self.changed_file_paths
+        self.changed_file_paths = set()
+
+        changed_dates = []
+        changed = [self.ingest_file(file_path, changed_dates) for file_path in self.portfolio.file_paths if file_path in changed_file_paths]
+        if not any(changed):
+            return
+
+        # Files that did not change are merged again from their parsed rows, none of them is read again.
+        # Only the changed transactions are then edited into the ledger
+        self.portfolio.replace_transactions(Portfolio.merge_transactions([[transaction for _, transaction in self.loaded_files[file_path][1]] for file_path in self.portfolio.file_paths]))
+        self.what_if.clear()
+        self.report_duplicates()
+        self.update_prices_if_needed()
+
+        self.transactions_ingested.emit()
+        self.report_validation_issues()
+        self.rerun_pinned_operations(min((date for date in changed_dates if date is not None), default=QDate()))
+
+    def update_prices_if_needed(self):
+        # Prices are only downloaded again for unknown symbols or an earlier history
+        symbol_cache = self.portfolio.symbol_cache
+        valid_transactions = self.portfolio.get_valid_transactions()
+        symbols = set(transaction.symbol for transaction in valid_transactions)
+        first_date = min((transaction.date for transaction in valid_transactions if transaction.date is not None), default=None)
+        if symbol_cache is None or not symbols.issubset(symbol_cache.symbols) or (first_date is not None and first_date < symbol_cache.start_date):
+            self.on_portfolio_updated()
+
+    def apply_what_if(self, edit_function):
+        # Edits run in the background after the tasks already queued, results are shown from the first edited date on
+        def apply():
+            earliest_changed_date = edit_function()
+            if earliest_changed_date is None:
+                return
+            self.update_prices_if_needed()
+            self.what_if_applied.emit()
+            if self.portfolio.symbol_cache is not None:
+                self.output.log_text(self.what_if.get_summary(QDate.currentDate().addYears(-1), QDate.currentDate()))
+            self.rerun_pinned_operations(earliest_changed_date)
+        self.run_in_background(apply)
+
+    def get_selected_transactions(self) -> list[Transaction]:
+        rows = sorted(set(index.row() for index in self.transactions_table.selectedIndexes()))
+        return [self.table_transactions[row] for row in rows if row < len(self.table_transactions)]
+
+    def add_what_if_transaction(self):
+        # A copy of the selected transaction dated today, or an empty buy the cells are then filled in
+        selected = self.get_selected_transactions()
+        if selected:
+            transaction = copy.copy(selected[-1])
+        else:
+            transaction = Transaction()
+            transaction.symbol = ""
+            transaction.type = "buy"
+            transaction.quantity = 0.0
+            transaction.account = self.get_selected_account()
+        transaction.date = QDate.currentDate()
+        self.apply_what_if(lambda: self.what_if.add(transaction))
+
+    def remove_what_if_transactions(self):
+        for transaction in self.get_selected_transactions():
+            self.apply_what_if(lambda transaction=transaction: self.what_if.remove(self.portfolio.transactions.index(transaction)))
+
+    def on_item_changed(self, item: QTableWidgetItem):
+        # The edited cell is parsed like a CSV value, the other fields and the file of the transaction are kept as they are
+        previous = self.table_transactions[item.row()]
+        attribute = TransactionPanel.headers[item.column()]
+        parsed = Portfolio.parse_transaction([attribute], (item.text(),), previous.source)
+        transaction = copy.copy(previous)
+        setattr(transaction, attribute, getattr(parsed, attribute))
+        self.apply_what_if(lambda: self.what_if.modify(self.portfolio.transactions.index(previous), transaction))
+
+    def refresh_what_if_buttons(self):
+        self.undo_button.setEnabled(self.what_if.can_undo())
+        self.redo_button.setEnabled(self.what_if.can_redo())
+
+    def report_validation_issues(self):
+        # Issues get their own output tab, clean portfolios only log a line
+        OperationRegistry.get_operation_instance(ValidatePortfolioOperation).execute_with_settings({}, self.portfolio, self.output)
+
+    def pin_operation(self, operation: Operation, settings: dict, account: str):
+        self.pinned_operations.append((operation, settings, account))
+
+    def rerun_pinned_operations(self, earliest_changed_date: QDate):
+        for operation, settings, account in self.pinned_operations:
+            # Results that end before the first changed transaction are not affected
+            dates = [value for value in settings.values() if isinstance(value, QDate)]
+            if dates and max(dates) < earliest_changed_date:
+                continue
+            self.execute_operation(operation, settings, account)
+
+    def get_selected_account(self) -> str:
+        account = self.account_selector.currentText()
+        return None if account == TransactionPanel.all_accounts else account
+
+    def refresh_accounts(self):
+        # The selection is kept when the account still exists after a reload
+        selected_account = self.account_selector.currentText()
+        self.account_selector.blockSignals(True)
+        self.account_selector.clear()
+        self.account_selector.addItems([TransactionPanel.all_accounts] + self.portfolio.get_accounts())
+        self.account_selector.setCurrentText(selected_account)
+        self.account_selector.blockSignals(False)
 
     def on_portfolio_updated(self):
         auto_load_prices = AppSettings.get("auto_load_historical_prices")
-        self.portfolio.update_symbol_cache(auto_load_prices)
+        benchmark_symbols = AppSettings.get_list("benchmark_symbols")
+        self.portfolio.include_dividends = AppSettings.get("include_dividends")
+        self.portfolio.memory_budget = AppSettings.get("memory_budget") * 1024 * 1024
+        self.portfolio.update_symbol_cache(auto_load_prices, benchmark_symbols)
 
-        Utils.store_last_opened_portfolio(self.portfolio.file_path)
-        
+        Utils.store_last_opened_portfolio(self.portfolio.file_paths)
+
+    def refresh_table(self):
+        account = self.get_selected_account()
+        self.table_transactions = [transaction for transaction in self.portfolio.transactions if account is None or transaction.get_account() == account]
+        self.refresh_what_if_buttons()
         self.load_data_to_table([
             (
+            transaction.get_account(),
             transaction.symbol,
             transaction.date.toString(Qt.DateFormat.ISODate),
             transaction.type,
             f"{transaction.quantity:.0f}" if transaction.quantity.is_integer() else f"{transaction.quantity:.2f}",
             str(transaction.price)
             )
-            for transaction in self.portfolio.transactions
+            for transaction in self.table_transactions
         ])
     
     def reload(self):
-        self.load_data_from_csv(self.portfolio.file_path)
+        self.load_data_from_csvs(self.portfolio.file_paths)
 
     def reload_historical_prices(self):
-        self.portfolio.symbol_cache.populate()
+        self.run_in_background(self.portfolio.reload_prices)
 
     def load_data_to_table(self, data):
+        # Only edits made by the user count as what-if changes
+        self.transactions_table.blockSignals(True)
+
         # Clear existing data
         self.transactions_table.setRowCount(0)
 
@@ -397,6 +883,7 @@ class TransactionPanel(Panel):
                 self.transactions_table.setItem(row, col, item)
 
         self.transactions_table.resizeColumnsToContents()
+        self.transactions_table.blockSignals(False)
 
     def get_all_transactions(self):
         all_transactions = []
@@ -411,17 +898,18 @@ class TransactionPanel(Panel):
         return all_transactions
 
 class OperationPanel(QDockWidget):
-    def __init__(self, title, parent, portfolio: Portfolio, output: Output):
+    def __init__(self, title, parent, portfolio: Portfolio, output: Output, run_callback=None):
         super().__init__(title, parent)
         self.portfolio = portfolio
         self.output = output
+        self.run_callback = run_callback
         self.transactions = []
         self.setFeatures(QDockWidget.DockWidgetFeature.NoDockWidgetFeatures)
         self.setWidget(QWidget())
         self.widget().setLayout(self.create_layout())
 
     def open_operation_settings_dialog(self, portfolio: Portfolio, output: Output, operation: Operation):
-        settings_dialog = OperationSettingsDialog(portfolio, output, operation)
+        settings_dialog = OperationSettingsDialog(portfolio, output, operation, self.run_callback)
         main_window_size = self.size()
         dialog_width = main_window_size.width() // 2
         settings_dialog.setFixedWidth(max(dialog_width, 450))
@@ -433,21 +921,22 @@ class OperationPanel(QDockWidget):
 
         categories = {}
 
-        for operation in OperationRegistry.operations:
-            categories.setdefault(operation.category, []).append(operation)
+        # Operations are listed from their registry entries and only loaded once opened
+        for entry in OperationRegistry.get_entries():
+            categories.setdefault(entry.category, []).append(entry)
 
         # Define a helper function to create a lambda function with a default argument
-        def create_operation_setting_dialog_lambda(operation):
-            return lambda: self.open_operation_settings_dialog(self.portfolio, self.output, operation)
+        def create_operation_setting_dialog_lambda(entry):
+            return lambda: self.open_operation_settings_dialog(self.portfolio, self.output, entry.get_instance())
 
-        for category, operations in categories.items():
+        for category, entries in categories.items():
             # Create a group box
             group_box = QGroupBox(category)
             group_layout = QVBoxLayout(group_box)
 
-            for operation in operations:
-                operation_button = QPushButton(operation.name)
-                operation_button.clicked.connect(create_operation_setting_dialog_lambda(operation))
+            for entry in entries:
+                operation_button = QPushButton(entry.name)
+                operation_button.clicked.connect(create_operation_setting_dialog_lambda(entry))
                 group_layout.addWidget(operation_button)
             
             layout.addWidget(group_box)
@@ -478,23 +967,72 @@ class MainWindow(QMainWindow):
 
         self.portfolio = Portfolio()
         self.output = Output()
+
+        # Analysis tasks share the portfolio, so they run one at a time off the GUI thread
+        self.thread_pool = QThreadPool()
+        self.thread_pool.setMaxThreadCount(1)
         
-        # Create panels
-        self.transaction_panel = TransactionPanel("Transactions", self, self.portfolio)
+        # Create panels, output is wired first since the last portfolio is validated as soon as it loads
         self.output_panel = OutputPanel("Output", self)
-        self.operation_panel = OperationPanel("Operations", self, self.portfolio, self.output)
 
+        self.output_bridge = OutputBridge()
+        self.output_bridge.text_logged.connect(self.output_panel.append_text)
+        self.output_bridge.table_logged.connect(self.output_panel.append_table)
+        self.output_bridge.chart_logged.connect(self.output_panel.append_chart)
         self.output.register_callbacks(
-            self.output_panel.append_text,
-            self.output_panel.append_table
+            self.output_bridge.text_logged.emit,
+            self.output_bridge.table_logged.emit,
+            self.output_bridge.chart_logged.emit
         )
 
+        # Every run is kept, so past results open again without computing them
+        try:
+            self.history = ResultsHistory(Utils.get_history_file_path())
+        except Exception as e:
+            print(f"Error opening results history: {e}")
+            self.history = None
+
+        self.transaction_panel = TransactionPanel("Transactions", self, self.portfolio, self.output, self.run_in_background, self.execute_operation)
+        self.operation_panel = OperationPanel("Operations", self, self.portfolio, self.output, self.run_operation)
+
         # Setup docking
         self.addDockWidget(Qt.DockWidgetArea.LeftDockWidgetArea, self.transaction_panel)
         self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.output_panel)
         self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.operation_panel)
         self.setCentralWidget(self.output_panel)
         
+    def run_in_background(self, function):
+        # Errors are logged to the output, which forwards them to the GUI thread
+        self.thread_pool.start(Task(function, self.output.log_text))
+
+    def run_operation(self, operation: Operation, settings: dict, pinned: bool):
+        account = self.transaction_panel.get_selected_account()
+        if pinned:
+            self.transaction_panel.pin_operation(operation, settings, account)
+        self.portfolio.include_dividends = AppSettings.get("include_dividends")
+        self.portfolio.memory_budget = AppSettings.get("memory_budget") * 1024 * 1024
+        self.run_in_background(lambda: self.execute_operation(operation, settings, account))
+
+    def execute_operation(self, operation: Operation, settings: dict, account: str) -> bool:
+        portfolio = self.portfolio.get_account_portfolio(account)
+        if self.history is None:
+            success = operation.execute_with_settings(settings, portfolio, self.output)
+        else:
+            success = self.history.run_and_record(operation, settings, portfolio, self.output, account)
+
+        # Checked once the results are shown, mismatches go to the diagnostics log
+        if ShadowMode.is_enabled():
+            ShadowMode.run(operation, settings, portfolio)
+        return success
+
+    def open_results_history(self):
+        if self.history is None:
+            self.show_popup("Results History", "The results history could not be opened.", QMessageBox.Icon.Warning)
+            return
+        history_dialog = ResultsHistoryDialog(self.history, self.output)
+        history_dialog.resize(max(self.size().width() * 2 // 3, 600), max(self.size().height() // 2, 400))
+        history_dialog.exec()
+
     def init_menu(self):
         menu_bar = self.menuBar()
         
@@ -508,6 +1046,11 @@ class MainWindow(QMainWindow):
         settings_action.triggered.connect(self.open_settings)
         edit_menu.addAction(settings_action)
 
+        view_menu = menu_bar.addMenu("View")
+        history_action = QAction("Results History", self)
+        history_action.triggered.connect(self.open_results_history)
+        view_menu.addAction(history_action)
+
         help_menu = menu_bar.addMenu("Help")
 
         report_issue_action = QAction("Report Issue", self)
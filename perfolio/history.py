@@ -0,0 +1,226 @@
+import contextlib
+import json
+import os
+import sqlite3
+import time
+import numpy
+
+from PySide6.QtCore import Qt, QDate
+from perfolio.output import Chart, Column, Output, Table
+
+class HistoryRun:
+    def __init__(self, run_id: int, operation_hash: str, operation_name: str, settings: dict, account: str, fingerprint: str, started_at: float, duration: float, success: bool):
+        self.run_id = run_id
+        self.operation_hash = operation_hash
+        self.operation_name = operation_name
+        self.settings = settings
+        self.account = account
+        self.fingerprint = fingerprint
+        self.started_at = started_at
+        self.duration = duration
+        self.success = success
+
+# Every logged text, table and chart of operation runs, kept between sessions in a single SQLite file
+class ResultsHistory:
+    # Oldest runs are dropped past this count
+    max_runs = 2000
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY,
+            operation_hash TEXT NOT NULL,
+            operation_name TEXT NOT NULL,
+            settings TEXT NOT NULL,
+            account TEXT,
+            fingerprint TEXT NOT NULL,
+            started_at REAL NOT NULL,
+            duration REAL NOT NULL,
+            success INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS results (
+            id INTEGER PRIMARY KEY,
+            run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            name TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS columns (
+            result_id INTEGER NOT NULL REFERENCES results(id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            format TEXT NOT NULL,
+            data BLOB NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS runs_by_settings ON runs(operation_hash, settings, started_at);
+        CREATE INDEX IF NOT EXISTS runs_by_time ON runs(started_at);
+        CREATE INDEX IF NOT EXISTS results_by_run ON results(run_id, position);
+        CREATE INDEX IF NOT EXISTS columns_by_name ON columns(result_id, name);
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with self.connect() as connection:
+            connection.executescript(ResultsHistory.schema)
+
+    @contextlib.contextmanager
+    def connect(self):
+        # Runs are recorded from background tasks, every call gets its own connection and transaction
+        connection = sqlite3.connect(self.file_path, timeout=10)
+        try:
+            connection.execute("PRAGMA foreign_keys = ON")
+            connection.execute("PRAGMA journal_mode = WAL")
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    @staticmethod
+    def get_settings_key(settings: dict) -> str:
+        # Canonical JSON, so runs with the same settings are found with a single index lookup
+        return json.dumps({key: value.toString(Qt.DateFormat.ISODate) if isinstance(value, QDate) else value for key, value in settings.items()}, sort_keys=True)
+
+    @staticmethod
+    def encode_column(column: Column) -> bytes:
+        if column.format == "text":
+            return json.dumps(column.values.tolist(), default=str).encode()
+        if column.format == "date":
+            return column.values.astype(numpy.int64).tobytes()
+        return column.values.tobytes()
+
+    @staticmethod
+    def decode_column(name: str, format: str, data: bytes) -> Column:
+        if format == "text":
+            return Column(name, json.loads(data), format)
+        if format == "date":
+            return Column(name, numpy.frombuffer(data, dtype=numpy.int64), format)
+        return Column(name, numpy.frombuffer(data, dtype=numpy.float64), format)
+
+    def record(self, operation_hash: str, operation_name: str, settings: dict, account: str, fingerprint: str, started_at: float, duration: float, success: bool, results: list):
+        with self.connect() as connection:
+            run_id = connection.execute(
+                "INSERT INTO runs (operation_hash, operation_name, settings, account, fingerprint, started_at, duration, success) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (operation_hash, operation_name, ResultsHistory.get_settings_key(settings), account, fingerprint, started_at, duration, int(success))
+            ).lastrowid
+
+            for position, result in enumerate(results):
+                # Texts are single text columns, charts keep their days as the first column
+                if isinstance(result, str):
+                    kind, name, columns = "text", "", [Column("Text", [result])]
+                elif isinstance(result, Chart):
+                    kind, name, columns = "chart", result.name, [Column("Date", result.days, "date"), *result.series]
+                else:
+                    kind, name, columns = "table", result.name, result.columns
+
+                result_id = connection.execute("INSERT INTO results (run_id, position, kind, name) VALUES (?, ?, ?, ?)", (run_id, position, kind, name)).lastrowid
+                connection.executemany(
+                    "INSERT INTO columns (result_id, position, name, format, data) VALUES (?, ?, ?, ?, ?)",
+                    [(result_id, column_position, column.name, column.format, ResultsHistory.encode_column(column)) for column_position, column in enumerate(columns)]
+                )
+
+            connection.execute("DELETE FROM runs WHERE id NOT IN (SELECT id FROM runs ORDER BY started_at DESC LIMIT ?)", (ResultsHistory.max_runs,))
+
+    def run_and_record(self, operation, settings: dict, portfolio, output: Output, account: str = None) -> bool:
+        results = []
+
+        def log_chart(chart: Chart):
+            results.append(chart)
+            if output.chart_callback:
+                output.chart_callback(chart)
+            else:
+                output.table_callback(chart.to_table())
+
+        # Results are shown as they come and stored once the run is over
+        recording_output = Output()
+        recording_output.register_callbacks(
+            lambda text: (results.append(text), output.log_text(text)),
+            lambda table: (results.append(table), output.table_callback(table)),
+            log_chart
+        )
+
+        started_at = time.time()
+        start = time.perf_counter()
+        success = operation.execute_with_settings(settings, portfolio, recording_output)
+        duration = time.perf_counter() - start
+
+        try:
+            self.record(operation.get_hash(), operation.get_display_name(), settings, account, portfolio.get_fingerprint(), started_at, duration, success, results)
+        except sqlite3.Error as e:
+            print(f"Error recording results history: {e}")
+
+        return success
+
+    @staticmethod
+    def read_run(row: tuple) -> HistoryRun:
+        return HistoryRun(row[0], row[1], row[2], json.loads(row[3]), row[4], row[5], row[6], row[7], bool(row[8]))
+
+    def get_runs(self, limit: int = 200) -> list[HistoryRun]:
+        with self.connect() as connection:
+            rows = connection.execute("SELECT id, operation_hash, operation_name, settings, account, fingerprint, started_at, duration, success FROM runs ORDER BY started_at DESC LIMIT ?", (limit,)).fetchall()
+        return [ResultsHistory.read_run(row) for row in rows]
+
+    def get_results(self, run_id: int) -> list:
+        # Stored results come back as they were logged, nothing is computed again
+        with self.connect() as connection:
+            result_rows = connection.execute("SELECT id, kind, name FROM results WHERE run_id = ? ORDER BY position", (run_id,)).fetchall()
+            column_rows = connection.execute(
+                "SELECT columns.result_id, columns.name, columns.format, columns.data FROM columns JOIN results ON results.id = columns.result_id WHERE results.run_id = ? ORDER BY columns.result_id, columns.position",
+                (run_id,)
+            ).fetchall()
+
+        columns = {}
+        for result_id, name, format, data in column_rows:
+            columns.setdefault(result_id, []).append(ResultsHistory.decode_column(name, format, data))
+
+        results = []
+        for result_id, kind, name in result_rows:
+            result_columns = columns.get(result_id, [])
+            if kind == "text":
+                results.append(str(result_columns[0].values[0]))
+            elif kind == "chart":
+                results.append(Chart(name, result_columns[0].values.astype(numpy.int64), result_columns[1:]))
+            else:
+                results.append(Table(name, result_columns))
+        return results
+
+    def replay(self, run_id: int, output: Output):
+        for result in self.get_results(run_id):
+            if isinstance(result, str):
+                output.log_text(result)
+            elif isinstance(result, Chart):
+                output.log_chart(result.name, result.days, result.series)
+            else:
+                output.log_table(result.name, result.columns)
+
+    def get_trend(self, operation_hash: str, settings: dict, account: str = None, limit: int = 30) -> Table:
+        # Runs with the same operation and settings, newest first, each summarized by its first text and the first row of its first table
+        with self.connect() as connection:
+            runs = connection.execute(
+                "SELECT id, started_at, fingerprint FROM runs WHERE operation_hash = ? AND settings = ? AND account IS ? AND success = 1 ORDER BY started_at DESC LIMIT ?",
+                (operation_hash, ResultsHistory.get_settings_key(settings), account, limit)
+            ).fetchall()
+            column_rows = [] if not runs else connection.execute(
+                f"""SELECT results.run_id, results.kind, columns.name, columns.format, columns.data FROM columns
+                    JOIN results ON results.id = columns.result_id
+                    WHERE results.run_id IN ({", ".join("?" * len(runs))}) AND results.kind IN ('text', 'table')
+                    AND results.position = (SELECT MIN(first.position) FROM results AS first WHERE first.run_id = results.run_id AND first.kind = results.kind)
+                    ORDER BY results.run_id, results.position, columns.position""",
+                [run_id for run_id, _, _ in runs]
+            ).fetchall()
+
+        first_rows = {}
+        for run_id, kind, name, format, data in column_rows:
+            column = ResultsHistory.decode_column(name, format, data)
+            if len(column):
+                first_rows.setdefault(run_id, {})[("Summary" if kind == "text" else name, format)] = column.values[0]
+
+        # Columns are lined up by name, values a run did not produce are left empty
+        keys = list(dict.fromkeys(key for values in first_rows.values() for key in values))
+        return Table("Results History", [
+            Column("Run", [time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started_at)) for _, started_at, _ in runs]),
+            Column("Portfolio", [fingerprint[:8] for _, _, fingerprint in runs]),
+            *[
+                Column(name, [first_rows.get(run_id, {}).get((name, format), "" if format == "text" else (numpy.datetime64("NaT") if format == "date" else numpy.nan)) for run_id, _, _ in runs], format)
+                for name, format in keys
+            ],
+        ])
@@ -0,0 +1,170 @@
+import numpy
+
+from perfolio.sparse import SparseSeries
+from perfolio.utils import Utils
+
+# Where an edit changed the ledger, so what is built on it can be updated from there on only
+class LedgerEdit:
+    def __init__(self, first_row: int, first_day: int, symbol_ids: numpy.ndarray, key_map: numpy.ndarray):
+        # Rows before first_row are unchanged, positions of the edited symbols change from first_day on
+        self.first_row = first_row
+        self.first_day = first_day
+        self.symbol_ids = symbol_ids
+
+        # New transaction count of every previous one
+        self.key_map = key_map
+
+# Columnar, date-sorted view of a portfolio's transactions used by the vectorized computations
+class Ledger:
+    def __init__(self, transactions: list):
+        sorted_transactions = sorted(transactions, key=lambda t: t.date)
+
+        symbols = sorted(set(transaction.symbol for transaction in sorted_transactions))
+        symbol_indices = {symbol: index for index, symbol in enumerate(symbols)}
+
+        days = numpy.array([Utils.date_to_day(transaction.date) for transaction in sorted_transactions], dtype=numpy.int64)
+        symbol_ids = numpy.array([symbol_indices[transaction.symbol] for transaction in sorted_transactions], dtype=numpy.int64)
+
+        # Transactions are validated beforehand, only buys and sells with a valid quantity and price get here
+        signs = numpy.where(numpy.array([transaction.type for transaction in sorted_transactions], dtype=object) == 'sell', -1.0, 1.0)
+        quantities = numpy.array([float(transaction.quantity) for transaction in sorted_transactions])
+        prices = numpy.array([float(transaction.price) for transaction in sorted_transactions])
+
+        # Quantities are signed and keep fractional shares
+        self.transactions = sorted_transactions
+        self.set_trades(symbols, days, symbol_ids, signs * quantities, prices)
+
+    @staticmethod
+    def from_trades(symbols: list[str], days: numpy.ndarray, symbol_ids: numpy.ndarray, quantities: numpy.ndarray, prices: numpy.ndarray) -> 'Ledger':
+        # Synthetic trades skip the transaction objects, they only need to be sorted by day like the loaded ones
+        order = numpy.argsort(days, kind='stable')
+        ledger = Ledger.__new__(Ledger)
+        ledger.transactions = None
+        ledger.set_trades(list(symbols), days[order], symbol_ids[order], quantities[order], prices[order])
+        return ledger
+
+    def set_trades(self, symbols: list[str], days: numpy.ndarray, symbol_ids: numpy.ndarray, quantities: numpy.ndarray, prices: numpy.ndarray):
+        self.symbols = symbols
+        self.symbol_indices = {symbol: index for index, symbol in enumerate(symbols)}
+
+        self.days = days
+        self.symbol_ids = symbol_ids
+        self.quantities = quantities
+        self.prices = prices
+        self.cash_flows = self.quantities * self.prices
+
+        # Running totals after the first k transactions, kept per symbol only where its transactions change them
+        self.positions = self.accumulate(self.quantities)
+        self.cumulative_cash_flows = self.accumulate(self.cash_flows)
+
+        # Same totals over all symbols, with cash flows also weighted by their day (relative to the first one to keep precision)
+        self.first_day = self.days[0] if len(self.days) else 0
+        self.cash_flow_totals = numpy.concatenate(([0.0], numpy.cumsum(self.cash_flows)))
+        self.day_weighted_cash_flow_totals = numpy.concatenate(([0.0], numpy.cumsum(self.cash_flows * (self.days - self.first_day))))
+
+    def accumulate(self, values: numpy.ndarray) -> SparseSeries:
+        return SparseSeries.from_changes(len(self.symbols), self.symbol_ids, numpy.arange(1, len(values) + 1), values)
+
+    @staticmethod
+    def update_totals(totals: numpy.ndarray, values: numpy.ndarray, first: int) -> numpy.ndarray:
+        # Running totals of values (with a leading 0) summed again from values[first] on, identical to a full cumsum
+        return numpy.concatenate((totals[:first + 1], numpy.cumsum(numpy.concatenate((totals[first:first + 1], values[first:])))[1:]))
+
+    def update_accumulated(self, series: SparseSeries, values: numpy.ndarray, edit: LedgerEdit) -> SparseSeries:
+        # Only the edited symbols are accumulated again, from the first edited transaction on
+        rows = edit.first_row + numpy.flatnonzero(numpy.isin(self.symbol_ids[edit.first_row:], edit.symbol_ids))
+        return series.splice(edit.symbol_ids, edit.first_row + 1, self.symbol_ids[rows], rows + 1, values[rows], edit.key_map)
+
+    def edit(self, removed_row: int, added_row: int, transaction) -> LedgerEdit:
+        # Takes out the transaction at removed_row and puts the given one at added_row (after the removal), either can be None.
+        # Symbols stay the same, a transaction of a new symbol needs a new ledger
+        rows = numpy.arange(len(self.days))
+        edited_symbol_ids = []
+        first_rows = []
+        first_days = []
+        days, symbol_ids, quantities, prices = self.days, self.symbol_ids, self.quantities, self.prices
+
+        if removed_row is not None:
+            edited_symbol_ids.append(symbol_ids[removed_row])
+            first_rows.append(removed_row)
+            first_days.append(days[removed_row])
+            days, symbol_ids, quantities, prices = [numpy.delete(array, removed_row) for array in (days, symbol_ids, quantities, prices)]
+            rows = rows - (rows > removed_row)
+            del self.transactions[removed_row]
+
+        if added_row is not None:
+            symbol_id = self.symbol_indices[transaction.symbol]
+            day = Utils.date_to_day(transaction.date)
+            quantity = -float(transaction.quantity) if transaction.type == 'sell' else float(transaction.quantity)
+            edited_symbol_ids.append(symbol_id)
+            first_rows.append(added_row)
+            first_days.append(day)
+            days = numpy.insert(days, added_row, day)
+            symbol_ids = numpy.insert(symbol_ids, added_row, symbol_id)
+            quantities = numpy.insert(quantities, added_row, quantity)
+            prices = numpy.insert(prices, added_row, float(transaction.price))
+            rows = rows + (rows >= added_row)
+            self.transactions.insert(added_row, transaction)
+
+        first_row = min(first_rows)
+        edit = LedgerEdit(first_row, min(first_days), numpy.unique(numpy.array(edited_symbol_ids, dtype=numpy.int64)), numpy.concatenate(([0], rows + 1)))
+
+        previous_totals = self.cash_flow_totals
+        previous_day_weighted_totals = self.day_weighted_cash_flow_totals
+        previous_first_day = self.first_day
+        self.days = days
+        self.symbol_ids = symbol_ids
+        self.quantities = quantities
+        self.prices = prices
+        self.cash_flows = self.quantities * self.prices
+
+        self.positions = self.update_accumulated(self.positions, self.quantities, edit)
+        self.cumulative_cash_flows = self.update_accumulated(self.cumulative_cash_flows, self.cash_flows, edit)
+
+        # Day weights are relative to the first day, an edit moving it weighs every transaction again
+        self.first_day = self.days[0] if len(self.days) else 0
+        self.cash_flow_totals = Ledger.update_totals(previous_totals, self.cash_flows, first_row)
+        weighted_first_row = first_row if self.first_day == previous_first_day else 0
+        self.day_weighted_cash_flow_totals = Ledger.update_totals(previous_day_weighted_totals, self.cash_flows * (self.days - self.first_day), weighted_first_row)
+        return edit
+
+    def get_transaction_counts(self, days: numpy.ndarray, inclusive: bool) -> numpy.ndarray:
+        return numpy.searchsorted(self.days, days, side='right' if inclusive else 'left')
+
+    def get_position_entries(self, days: numpy.ndarray, at_close: bool) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        # Rows (into days), symbols and share counts of the non-zero positions only
+        return self.positions.get_entries(self.get_transaction_counts(days, at_close))
+
+    def get_positions_at_days(self, days: numpy.ndarray, at_close: bool) -> numpy.ndarray:
+        return self.positions.get_dense(self.get_transaction_counts(days, at_close))
+
+    def get_cash_flows_between_days(self, boundary_days: numpy.ndarray) -> numpy.ndarray:
+        # Cash flows of each (previous boundary, boundary] interval, per symbol
+        cumulative = self.cumulative_cash_flows.get_dense(self.get_transaction_counts(boundary_days, True))
+        return cumulative[1:] - cumulative[:-1]
+
+    def get_cumulative_cash_flows_at_days(self, days: numpy.ndarray) -> numpy.ndarray:
+        # Total cash flow of all transactions up to and including each day
+        return self.cash_flow_totals[self.get_transaction_counts(days, True)]
+
+    def get_period_boundaries(self, begin_day: int, end_day: int) -> numpy.ndarray:
+        # A new period ends on every day with transactions, plus the last day of the range
+        transaction_days = numpy.unique(self.days[(self.days > begin_day) & (self.days <= end_day)])
+        boundaries = numpy.concatenate(([begin_day], transaction_days))
+        if boundaries[-1] != end_day:
+            boundaries = numpy.append(boundaries, end_day)
+        return boundaries
+
+    def get_weighted_cash_flows(self, begin_day: int, end_day: int) -> tuple[float, float]:
+        # Total cash flow of [begin_day, end_day] and the same flows weighted by the share of the range left after them
+        first = numpy.searchsorted(self.days, begin_day, side='left')
+        last = numpy.searchsorted(self.days, end_day, side='right')
+
+        cash_flow = self.cash_flow_totals[last] - self.cash_flow_totals[first]
+        day_weighted_cash_flow = self.day_weighted_cash_flow_totals[last] - self.day_weighted_cash_flow_totals[first]
+
+        # Flows on the first day count fully, flows on the last day not at all
+        length = end_day - begin_day
+        if length <= 0:
+            return cash_flow, cash_flow
+        return cash_flow, ((end_day - self.first_day) * cash_flow - day_weighted_cash_flow) / length
@@ -0,0 +1,102 @@
+import numpy
+
+from collections import deque
+
+from perfolio.ledger import Ledger
+from perfolio.splits import SplitAdjustment
+
+# Remainders below this are rounding noise from fractional shares
+QUANTITY_EPSILON = 1e-9
+
+class TaxLots:
+    methods = ["FIFO", "LIFO", "Average Cost"]
+
+    def __init__(self, ledger: Ledger, method: str, split_adjustment: SplitAdjustment = None):
+        if method not in TaxLots.methods:
+            raise ValueError(f"Unknown lot method: {method}")
+
+        self.ledger = ledger
+        self.method = method
+        self.split_adjustment = split_adjustment
+
+        # Lots are matched in shares before any split, unit costs scale the other way so amounts stay the same
+        if split_adjustment is not None:
+            self.transaction_quantities = split_adjustment.base_quantities
+            self.transaction_prices = ledger.prices * split_adjustment.transaction_factors
+        else:
+            self.transaction_quantities = ledger.quantities
+            self.transaction_prices = ledger.prices
+
+        # One checkpoint per transaction day, row 0 is the empty portfolio before the first one
+        self.checkpoint_days = numpy.unique(ledger.days)
+        symbol_count = len(ledger.symbols)
+        self.quantities = numpy.zeros((len(self.checkpoint_days) + 1, symbol_count))
+        self.cost_basis = numpy.zeros((len(self.checkpoint_days) + 1, symbol_count))
+        self.realized = numpy.zeros((len(self.checkpoint_days) + 1, symbol_count))
+
+        self.process()
+
+    def process(self):
+        # Open lots per symbol as [quantity, unit cost], the average cost method keeps a single pooled lot
+        lots = [deque() for _ in self.ledger.symbols]
+        quantities = numpy.zeros(len(self.ledger.symbols))
+        cost_basis = numpy.zeros(len(self.ledger.symbols))
+        realized = numpy.zeros(len(self.ledger.symbols))
+
+        checkpoint = 0
+        transaction_count = len(self.ledger.days)
+
+        for index in range(transaction_count):
+            symbol_id = self.ledger.symbol_ids[index]
+            quantity = self.transaction_quantities[index]
+            price = self.transaction_prices[index]
+            symbol_lots = lots[symbol_id]
+
+            if quantity > 0:
+                if self.method == "Average Cost" and symbol_lots:
+                    lot = symbol_lots[0]
+                    lot[1] = (lot[0] * lot[1] + quantity * price) / (lot[0] + quantity)
+                    lot[0] += quantity
+                else:
+                    symbol_lots.append([quantity, price])
+                quantities[symbol_id] += quantity
+                cost_basis[symbol_id] += quantity * price
+            elif quantity < 0:
+                # Sold shares are matched against open lots, shares sold beyond them have no basis to realize against
+                remaining = -quantity
+                while remaining > QUANTITY_EPSILON and symbol_lots:
+                    lot = symbol_lots[-1] if self.method == "LIFO" else symbol_lots[0]
+                    matched = min(lot[0], remaining)
+                    realized[symbol_id] += matched * (price - lot[1])
+                    quantities[symbol_id] -= matched
+                    cost_basis[symbol_id] -= matched * lot[1]
+                    lot[0] -= matched
+                    remaining -= matched
+                    if lot[0] <= QUANTITY_EPSILON:
+                        symbol_lots.pop() if self.method == "LIFO" else symbol_lots.popleft()
+
+                if not symbol_lots:
+                    quantities[symbol_id] = 0.0
+                    cost_basis[symbol_id] = 0.0
+
+            # Snapshot once all of the day's transactions are processed
+            if index + 1 == transaction_count or self.ledger.days[index + 1] != self.ledger.days[index]:
+                checkpoint += 1
+                self.quantities[checkpoint] = quantities
+                self.cost_basis[checkpoint] = cost_basis
+                self.realized[checkpoint] = realized
+
+    def get_checkpoint(self, day: int, at_close: bool) -> int:
+        return numpy.searchsorted(self.checkpoint_days, day, side='right' if at_close else 'left')
+
+    def get_quantities(self, day: int, at_close: bool = True) -> numpy.ndarray:
+        quantities = self.quantities[self.get_checkpoint(day, at_close)]
+        if self.split_adjustment is not None:
+            quantities = quantities * self.split_adjustment.get_factors_at_days(numpy.array([day]))[0]
+        return quantities
+
+    def get_cost_basis(self, day: int, at_close: bool = True) -> numpy.ndarray:
+        return self.cost_basis[self.get_checkpoint(day, at_close)]
+
+    def get_realized(self, day: int, at_close: bool = True) -> numpy.ndarray:
+        return self.realized[self.get_checkpoint(day, at_close)]
@@ -0,0 +1,165 @@
+import hashlib
+import importlib
+import importlib.metadata
+from perfolio.output import Output
+from perfolio.portfolio import Portfolio
+from perfolio.settings import Setting
+
+# Base class for any operation
+class Operation:
+    def __init__(self, category, name):
+        super().__init__()
+        self.category = category
+        self.name = name
+        self.settings = None
+        
+    def get_hash(self) -> str:
+        return get_operation_hash(type(self).__name__)
+
+    def get_settings_desc(self) -> dict[str, Setting]:
+        return {}
+    
+    def get(self, key):
+        if key in self.settings:
+            value = self.settings[key]
+            return value
+        else:
+            return self.get_settings_desc()[key].default
+    
+    def get_display_name(self) -> str:
+        return f"{self.category}|{self.name}"
+    
+    def validate(self, context, output) -> bool:
+        return True
+
+    def execute(self, context, output) -> bool:
+        return True
+    
+    def execute_with_settings(self, settings, portfolio: Portfolio, output: Output) -> bool:
+        # Settings are cleared even when the operation raises, so the next run does not see them
+        self.settings = settings
+        try:
+            return self.validate(portfolio, output) and self.execute(portfolio, output)
+        finally:
+            self.settings = None
+
+def get_operation_hash(class_name: str) -> str:
+    return hashlib.sha256(class_name.encode()).hexdigest()
+
+def import_operation_class(target: str) -> type:
+    # "module:OperationClass", the module is imported on the first call
+    module_name, _, class_name = target.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+# Registered operation, only imported and instantiated the first time it is needed
+class OperationEntry:
+    def __init__(self, category, name, class_name, loader):
+        self.category = category
+        self.name = name
+        self.class_name = class_name
+        self.hash = get_operation_hash(class_name)
+        self.loader = loader
+        self.instance = None
+
+    def get_display_name(self) -> str:
+        return f"{self.category}|{self.name}"
+
+    def get_instance(self) -> Operation:
+        if self.instance is None:
+            self.instance = self.loader()(self.category, self.name)
+            OperationRegistry.classes[type(self.instance)] = self
+        return self.instance
+
+class OperationRegistry:
+    entry_point_group = "perfolio.operations"
+
+    # Built-in operations in menu order, declared like plugins so their modules and processors are only imported when used
+    builtin_operations = {
+        "Return Calculation|Calculate TWR": "perfolio.operations.returns:CalculateTWROperation",
+        "Return Calculation|Calculate MWR": "perfolio.operations.returns:CalculateMWROperation",
+        "Return Calculation|Compare to Benchmark": "perfolio.operations.returns:CompareToBenchmarkOperation",
+        "Return Calculation|Calculate Contribution": "perfolio.operations.returns:CalculateContributionOperation",
+        "Return Calculation|Periodic Returns": "perfolio.operations.periodic:PeriodicReturnsOperation",
+        "Return Calculation|Backtest Rebalancing": "perfolio.operations.backtest:BacktestRebalancingOperation",
+        "Risk Analysis|Risk Metrics": "perfolio.operations.risk:RiskMetricsOperation",
+        "Risk Analysis|Simulate": "perfolio.operations.simulation:SimulateOperation",
+        "Portfolio Analysis|Chart Performance": "perfolio.operations.risk:ChartPerformanceOperation",
+        "Portfolio Analysis|Tax Lot P&L": "perfolio.operations.lots:TaxLotOperation",
+        "Portfolio Analysis|Validate Portfolio": "perfolio.operations.analysis:ValidatePortfolioOperation",
+        "Portfolio Analysis|Price Quality": "perfolio.operations.analysis:PriceQualityOperation",
+        "Portfolio Analysis|View Holdings": "perfolio.operations.analysis:ViewHoldingsOperation",
+        "Portfolio Analysis|View Transactions": "perfolio.operations.analysis:ViewTransactionsOperation",
+        "Portfolio Analysis|View Holdings Difference": "perfolio.operations.analysis:ViewHoldingsDifferenceOperation",
+        "Portfolio Analysis|View Holdings Value": "perfolio.operations.analysis:ViewHoldingsValueOperation",
+        "Portfolio Analysis|View Cash Flows": "perfolio.operations.analysis:ViewCashFlowsOperation",
+    }
+
+    # Lookups by display name, hash and class are all precomputed
+    entries = dict[str, OperationEntry]()
+    hashes = dict[str, OperationEntry]()
+    classes = dict[type, OperationEntry]()
+    plugins_loaded = False
+    
+    @staticmethod
+    def add_entry(entry: OperationEntry):
+        OperationRegistry.entries[entry.get_display_name()] = entry
+        OperationRegistry.hashes[entry.hash] = entry
+
+    @staticmethod
+    def register(category, name):
+        def decorator(cls):
+            entry = OperationRegistry.entries.get(f"{category}|{name}")
+
+            # A plugin module using the decorator resolves its own lazy entry
+            if entry is None or entry.class_name != cls.__name__:
+                entry = OperationEntry(category, name, cls.__name__, lambda: cls)
+                OperationRegistry.add_entry(entry)
+            else:
+                entry.loader = lambda: cls
+
+            OperationRegistry.classes[cls] = entry
+            return cls
+        return decorator
+
+    @staticmethod
+    def add_builtin_entries():
+        for display_name, target in OperationRegistry.builtin_operations.items():
+            category, _, name = display_name.rpartition("|")
+            OperationRegistry.add_entry(OperationEntry(category, name, target.rpartition(":")[2], lambda target=target: import_operation_class(target)))
+
+    @staticmethod
+    def load_plugins():
+        if OperationRegistry.plugins_loaded:
+            return
+        OperationRegistry.plugins_loaded = True
+
+        # Plugins declare "Category|Name = module:OperationClass" entry points, imported on first use
+        entry_points = importlib.metadata.entry_points()
+        if hasattr(entry_points, "select"):
+            entry_points = entry_points.select(group=OperationRegistry.entry_point_group)
+        else:
+            entry_points = entry_points.get(OperationRegistry.entry_point_group, [])
+
+        for entry_point in entry_points:
+            category, _, name = entry_point.name.rpartition("|")
+            class_name = entry_point.value.rpartition(":")[2].strip()
+            if entry_point.name not in OperationRegistry.entries:
+                OperationRegistry.add_entry(OperationEntry(category or "Plugins", name, class_name, entry_point.load))
+
+    @staticmethod
+    def get_entries() -> list[OperationEntry]:
+        OperationRegistry.load_plugins()
+        return list(OperationRegistry.entries.values())
+    
+    @staticmethod
+    def get_operation_instance(operation_class):
+        entry = OperationRegistry.classes.get(operation_class)
+        return entry.get_instance() if entry else None
+    
+    @staticmethod
+    def get_operation_instance_from_hash(hashcode):
+        OperationRegistry.load_plugins()
+        entry = OperationRegistry.hashes.get(hashcode)
+        return entry.get_instance() if entry else None
+
+OperationRegistry.add_builtin_entries()
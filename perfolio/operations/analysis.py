@@ -0,0 +1,148 @@
+from PySide6.QtCore import Qt, QDate
+from perfolio.operations import Operation, OperationRegistry
+from perfolio.output import Column, Output
+from perfolio.portfolio import Portfolio
+from perfolio.settings import SettingFactory
+from perfolio.utils import Utils
+
+@OperationRegistry.register("Portfolio Analysis", "Validate Portfolio")
+class ValidatePortfolioOperation(Operation):
+    def execute(self, portfolio: Portfolio, output: Output):
+        report = portfolio.validate()
+
+        if report.get_issue_count() == 0:
+            output.log_text(f"Validation: no issues found in {len(portfolio.transactions)} transactions.")
+            return True
+
+        output.log_text(f"Validation: {report.get_issue_count()} issues found, {report.get_error_count()} errors. Transactions with errors are ignored.")
+        output.log_table("Validation Issues", report.get_columns())
+
+        return True
+
+@OperationRegistry.register("Portfolio Analysis", "Price Quality")
+class PriceQualityOperation(Operation):
+    def validate(self, portfolio: Portfolio, output: Output):
+        if portfolio.symbol_cache is None:
+            output.log_text("Error: Historical prices are not loaded.")
+            return False
+        return True
+
+    def execute(self, portfolio: Portfolio, output: Output):
+        # Decisions of the cleaning made when the prices were loaded, valuations only ever see the cleaned prices
+        report = portfolio.symbol_cache.get_quality_report()
+
+        if report.get_issue_count() == 0:
+            output.log_text(f"Price quality: no issues found in {len(set(report.symbols))} symbols.")
+            return True
+
+        output.log_text(f"Price quality: {report.get_issue_count()} price series with issues, {int(report.spikes.sum())} spikes removed, {int(report.filled.sum())} prices filled.")
+        output.log_table("Price Quality", report.get_columns())
+
+        return True
+
+@OperationRegistry.register("Portfolio Analysis", "View Holdings")
+class ViewHoldingsOperation(Operation):
+    def get_settings_desc(self):
+        return {
+            **super().get_settings_desc(),
+            "date": SettingFactory.date("Date"),
+        }
+    
+    def execute(self, portfolio: Portfolio, output: Output):
+        date = self.get("date")
+
+        holdings = portfolio.get_holdings_at_date(date, False)
+        output.log_table(f"Holdings ({date.toString(Qt.DateFormat.ISODate)})", [
+            Column("Symbol", list(holdings.keys())),
+            Column("Quantity", list(holdings.values()), "quantity"),
+        ])
+        
+        return True
+
+@OperationRegistry.register("Portfolio Analysis", "View Transactions")
+class ViewTransactionsOperation(Operation):
+    def get_settings_desc(self):
+        return {
+            **super().get_settings_desc(),
+            "from": SettingFactory.date("From", QDate.currentDate().addYears(-1)),
+            "to": SettingFactory.date("To"),
+        }
+    
+    def execute(self, portfolio: Portfolio, output: Output):
+        from_date = self.get("from")
+        to_date = self.get("to")
+
+        transactions = portfolio.get_transactions_between_dates(from_date, to_date)
+        output.log_table(f"Transactions (From {from_date.toString(Qt.DateFormat.ISODate)} to {to_date.toString(Qt.DateFormat.ISODate)})", [
+            Column("Symbol", [transaction.symbol for transaction in transactions]),
+            Column("Date", [Utils.date_to_day(transaction.date) for transaction in transactions], "date"),
+            Column("Type", [transaction.type for transaction in transactions]),
+            Column("Quantity", [transaction.quantity for transaction in transactions], "quantity"),
+            Column("Price", [transaction.price for transaction in transactions], "currency"),
+        ])
+        
+        return True
+
+@OperationRegistry.register("Portfolio Analysis", "View Holdings Difference")
+class ViewHoldingsDifferenceOperation(Operation):
+    def get_settings_desc(self):
+        return {
+            **super().get_settings_desc(),
+            "from": SettingFactory.date("From", QDate.currentDate().addYears(-1)),
+            "to": SettingFactory.date("To"),
+        }
+    
+    def execute(self, portfolio: Portfolio, output: Output):
+        from_date = self.get("from")
+        to_date = self.get("to")
+
+        holdings_diff = portfolio.get_holdings_difference(from_date, to_date)
+        output.log_table(f"Holdings Diff (From {from_date.toString(Qt.DateFormat.ISODate)} to {to_date.toString(Qt.DateFormat.ISODate)})", [
+            Column("Symbol", list(holdings_diff.keys())),
+            Column("Difference", list(holdings_diff.values()), "quantity"),
+        ])
+        
+        return True
+
+@OperationRegistry.register("Portfolio Analysis", "View Holdings Value")
+class ViewHoldingsValueOperation(Operation):
+    def get_settings_desc(self):
+        return {
+            **super().get_settings_desc(),
+            "date": SettingFactory.date("Date"),
+            "at": SettingFactory.list("At", ["Close", "Open"], "Close"),
+        }
+    
+    def execute(self, portfolio: Portfolio, output: Output):
+        date = self.get("date")
+        at = self.get("at")
+
+        portfolio_value = portfolio.get_value_at_date(date, at == "Close")
+        output.log_table(f"Holdings Value ({date.toString(Qt.DateFormat.ISODate)}, {at})", [
+            Column("Date", [Utils.date_to_day(date)], "date"),
+            Column("Portfolio Value", [portfolio_value], "currency"),
+        ])
+        
+        return True
+
+@OperationRegistry.register("Portfolio Analysis", "View Cash Flows")
+class ViewCashFlowsOperation(Operation):
+    def get_settings_desc(self):
+        return {
+            **super().get_settings_desc(),
+            "from": SettingFactory.date("From", QDate.currentDate().addYears(-1)),
+            "to": SettingFactory.date("To"),
+        }
+    
+    def execute(self, portfolio: Portfolio, output: Output):
+        from_date = self.get("from")
+        to_date = self.get("to")
+
+        cash_flows = portfolio.get_cash_flows_between(from_date, to_date)
+        output.log_table(f"Cash Flows (From {from_date.toString(Qt.DateFormat.ISODate)} to {to_date.toString(Qt.DateFormat.ISODate)})", [
+            Column("From", [Utils.date_to_day(from_date)], "date"),
+            Column("To", [Utils.date_to_day(to_date)], "date"),
+            Column("Cash Flows", [cash_flows], "currency"),
+        ])
+        
+        return True
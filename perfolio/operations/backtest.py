@@ -0,0 +1,84 @@
+import numpy
+
+from PySide6.QtCore import Qt, QDate
+from perfolio.backtest import BacktestProcessor
+from perfolio.operations import Operation, OperationRegistry
+from perfolio.output import Column, Output
+from perfolio.portfolio import Portfolio
+from perfolio.risk import RiskProcessor
+from perfolio.settings import SettingFactory
+
+@OperationRegistry.register("Return Calculation", "Backtest Rebalancing")
+class BacktestRebalancingOperation(Operation):
+    # Weight sets drawn on the chart next to the actual portfolio
+    charted_sets = 3
+
+    def get_settings_desc(self):
+        return {
+            **super().get_settings_desc(),
+            "from": SettingFactory.date("From", QDate.currentDate().addYears(-1)),
+            "to": SettingFactory.date("To"),
+            "weights": SettingFactory.text("Target Weights", "", "One weight set per line, e.g. AAPL 60, SPY 40"),
+            "sweep": SettingFactory.double("Sweep Step (%)", 0.0),
+            "schedule": SettingFactory.list("Rebalance", BacktestProcessor.schedules, "Monthly"),
+            "cost_rate": SettingFactory.double("Trading Cost (bps)", 0.0),
+            "fixed_cost": SettingFactory.double("Fixed Cost per Trade", 0.0),
+        }
+
+    def get_weight_sets(self) -> tuple[list[str], numpy.ndarray]:
+        symbols, weights = BacktestProcessor.parse_weight_sets(self.get("weights"))
+
+        # A sweep tests every weight set on the grid over the listed symbols, after the listed sets
+        if self.get("sweep") > 0:
+            weights = numpy.vstack((weights, BacktestProcessor.generate_weight_grid(len(symbols), self.get("sweep") / 100)))
+        return symbols, weights
+
+    def validate(self, portfolio: Portfolio, output: Output):
+        try:
+            symbols, weights = self.get_weight_sets()
+        except ValueError as e:
+            output.log_text(f"Error: {e}")
+            return False
+        if len(weights) == 0:
+            output.log_text("Error: No target weights specified.")
+            return False
+        return True
+
+    def execute(self, portfolio: Portfolio, output: Output):
+        from_date = self.get("from")
+        to_date = self.get("to")
+        schedule = self.get("schedule")
+        symbols, weights = self.get_weight_sets()
+
+        try:
+            result = BacktestProcessor.backtest(portfolio, from_date, to_date, symbols, weights, schedule, self.get("cost_rate") / 10000, self.get("fixed_cost"))
+        except ValueError as e:
+            output.log_text(f"Error: {e}")
+            return False
+
+        labels = [" / ".join(f"{symbol} {weight * 100:g}%" for symbol, weight in zip(result.symbols, weight_set) if weight > 0) for weight_set in result.weights]
+        twrs = numpy.array([backtest_return.twr for backtest_return in result.returns])
+        order = numpy.argsort(-twrs, kind='stable')
+        best = order[0]
+
+        period = f"From {result.begin_date.toString(Qt.DateFormat.ISODate)} to {result.end_date.toString(Qt.DateFormat.ISODate)}"
+        output.log_text(f"Backtested {len(labels)} weight sets, rebalanced {schedule.lower()}. Actual TWR: {result.actual.twr:.2%}, best: {labels[best]} with {twrs[best]:.2%}")
+        output.log_table(f"Backtest, {schedule} ({period})", [
+            Column("Weights", ["Actual"] + [labels[index] for index in order]),
+            Column("TWR", [result.actual.twr] + [twrs[index] for index in order], "percent"),
+            Column("Excess TWR", [0.0] + [twrs[index] - result.actual.twr for index in order], "percent"),
+            Column("MWR", [result.actual.mwr] + [result.returns[index].mwr for index in order], "percent"),
+            Column("Final Value", [result.actual.final_value] + [result.returns[index].final_value for index in order], "currency"),
+            Column("Gain/Loss", [result.actual.gain_loss] + [result.returns[index].gain_loss for index in order], "currency"),
+            Column("Traded Value", [0.0] + [result.traded_values[index] for index in order], "currency"),
+            Column("Costs", [0.0] + [result.costs[index] for index in order], "currency"),
+        ])
+
+        days = RiskProcessor.get_trading_days(portfolio, result.begin_date, result.end_date)
+        charted = order[:BacktestRebalancingOperation.charted_sets]
+        output.log_chart(f"Backtest Value, {schedule} ({period})", days, [
+            Column("Actual", portfolio.get_values_at_days(days, True), "currency"),
+            *[Column(labels[index], result.portfolios[index].get_values_at_days(days, True), "currency") for index in charted],
+        ])
+
+        return True
@@ -0,0 +1,66 @@
+import numpy
+
+from PySide6.QtCore import Qt, QDate
+from perfolio.lots import TaxLots
+from perfolio.operations import Operation, OperationRegistry
+from perfolio.output import Column, Output
+from perfolio.portfolio import Portfolio
+from perfolio.settings import SettingFactory
+from perfolio.utils import Utils
+
+@OperationRegistry.register("Portfolio Analysis", "Tax Lot P&L")
+class TaxLotOperation(Operation):
+    def get_settings_desc(self):
+        return {
+            **super().get_settings_desc(),
+            "from": SettingFactory.date("From", QDate.currentDate().addYears(-1)),
+            "to": SettingFactory.date("To"),
+            "method": SettingFactory.list("Method", TaxLots.methods, "FIFO"),
+        }
+    
+    def validate(self, portfolio: Portfolio, output: Output):
+        if portfolio.symbol_cache is None:
+            output.log_text("Error: Historical prices are not loaded.")
+            return False
+        return True
+
+    def execute(self, portfolio: Portfolio, output: Output):
+        from_date = self.get("from")
+        to_date = self.get("to")
+        method = self.get("method")
+
+        ledger = portfolio.get_ledger()
+        tax_lots = portfolio.get_tax_lots(method)
+        to_day = Utils.date_to_day(to_date)
+
+        quantities = tax_lots.get_quantities(to_day)
+        cost_basis = tax_lots.get_cost_basis(to_day)
+        realized = tax_lots.get_realized(to_day) - tax_lots.get_realized(Utils.date_to_day(from_date), False)
+
+        # Holdings are valued at the last close on or before the end, like the benchmark and periodic boundaries, so a weekend or holiday takes the close before it
+        price_source = portfolio.get_price_source()
+        prices = numpy.array([price_source.get_last_symbol_prices_at_days(symbol, numpy.array([to_day]))[0][0] for symbol in ledger.symbols])
+        market_values = numpy.where(quantities != 0, quantities * prices, 0.0)
+        unpriced = (quantities != 0) & numpy.isnan(prices)
+
+        # Symbols still held or with sales in the range
+        shown = (quantities != 0) | (realized != 0)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            average_costs = numpy.where(quantities != 0, cost_basis / quantities, numpy.nan)
+
+        # A holding without a price has no unrealized P&L, the total is not given rather than counting it as zero
+        unrealized = f"{numpy.sum(market_values - cost_basis):.2f}" if not unpriced.any() else "n/a"
+        output.log_text(f"Realized P&L: {numpy.sum(realized):.2f}, Unrealized P&L: {unrealized}")
+        if unpriced.any():
+            output.log_text(f"Warning: No price on or before {to_date.toString(Qt.DateFormat.ISODate)} for {', '.join(symbol for symbol, missing in zip(ledger.symbols, unpriced) if missing)}, their market value and unrealized P&L are unknown.")
+        output.log_table(f"Tax Lot P&L, {method} (From {from_date.toString(Qt.DateFormat.ISODate)} to {to_date.toString(Qt.DateFormat.ISODate)})", [
+            Column("Symbol", [symbol for symbol, keep in zip(ledger.symbols, shown) if keep]),
+            Column("Quantity", quantities[shown], "quantity"),
+            Column("Cost Basis", cost_basis[shown], "currency"),
+            Column("Average Cost", average_costs[shown], "currency"),
+            Column("Market Value", market_values[shown], "currency"),
+            Column("Unrealized P&L", (market_values - cost_basis)[shown], "currency"),
+            Column("Realized P&L", realized[shown], "currency"),
+        ])
+
+        return True
@@ -0,0 +1,60 @@
+from PySide6.QtCore import Qt, QDate
+from perfolio.operations import Operation, OperationRegistry
+from perfolio.output import Column, Output
+from perfolio.periodic import PeriodicReturnsProcessor
+from perfolio.portfolio import Portfolio
+from perfolio.settings import SettingFactory
+from perfolio.utils import Utils
+
+@OperationRegistry.register("Return Calculation", "Periodic Returns")
+class PeriodicReturnsOperation(Operation):
+    def get_settings_desc(self):
+        return {
+            **super().get_settings_desc(),
+            "from": SettingFactory.date("From", QDate.currentDate().addYears(-1)),
+            "to": SettingFactory.date("To"),
+            "frequency": SettingFactory.list("Frequency", PeriodicReturnsProcessor.frequencies, "Monthly"),
+            "ranges": SettingFactory.text("Custom Ranges", "", "One range per line, e.g. 2023-01-01 2023-06-30"),
+        }
+    
+    def validate(self, portfolio: Portfolio, output: Output):
+        if self.get("frequency") == "Custom":
+            try:
+                if not PeriodicReturnsProcessor.parse_custom_ranges(self.get("ranges")):
+                    output.log_text("Error: No custom range specified.")
+                    return False
+            except ValueError as e:
+                output.log_text(f"Error: {e}")
+                return False
+        return True
+
+    def execute(self, portfolio: Portfolio, output: Output):
+        from_date = self.get("from")
+        to_date = self.get("to")
+        frequency = self.get("frequency")
+
+        if frequency == "Custom":
+            requested_ranges = PeriodicReturnsProcessor.parse_custom_ranges(self.get("ranges"))
+        else:
+            requested_ranges = PeriodicReturnsProcessor.generate_calendar_ranges(from_date, to_date, frequency)
+
+        # Custom ranges are snapped like calendar ones, a range starting or ending on a closed market day would have no price
+        ranges = PeriodicReturnsProcessor.snap_to_trading_days(portfolio, requested_ranges)
+        if frequency == "Custom" and len(ranges) < len(requested_ranges):
+            output.log_text(f"Warning: {len(requested_ranges) - len(ranges)} custom ranges have no trading day and are left out.")
+
+        returns = PeriodicReturnsProcessor.calculate_periodic_returns(portfolio, ranges)
+
+        output.log_table(f"{frequency} Returns (From {from_date.toString(Qt.DateFormat.ISODate)} to {to_date.toString(Qt.DateFormat.ISODate)})", [
+            Column("Period", [result.label for result in returns]),
+            Column("From", [Utils.date_to_day(result.start_date) for result in returns], "date"),
+            Column("To", [Utils.date_to_day(result.end_date) for result in returns], "date"),
+            Column("TWR", [result.twr for result in returns], "percent"),
+            Column("MWR", [result.mwr for result in returns], "percent"),
+            Column("Initial Value", [result.initial_value for result in returns], "currency"),
+            Column("Final Value", [result.final_value for result in returns], "currency"),
+            Column("Cash Flow", [result.cash_flow for result in returns], "currency"),
+            Column("Gain/Loss", [result.gain_loss for result in returns], "currency"),
+        ])
+
+        return True
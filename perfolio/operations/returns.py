@@ -0,0 +1,189 @@
+import numpy
+
+from PySide6.QtCore import Qt, QDate
+from perfolio.operations import Operation, OperationRegistry
+from perfolio.output import Column, Output
+from perfolio.portfolio import Portfolio
+from perfolio.settings import AppSettings, SettingFactory
+from perfolio.twr import TWRProcessor
+from perfolio.utils import Utils
+
+@OperationRegistry.register("Return Calculation", "Calculate TWR")
+class CalculateTWROperation(Operation):
+    def get_settings_desc(self):
+        return {
+            **super().get_settings_desc(),
+            "from": SettingFactory.date("From", QDate.currentDate().addYears(-1)),
+            "to": SettingFactory.date("To"),
+            "method": SettingFactory.list("Method", TWRProcessor.methods, "Exact"),
+        }
+    
+    def execute(self, portfolio: Portfolio, output: Output):
+        start_date = self.get("from")
+        end_date = self.get("to")
+        method = self.get("method")
+
+        if method != "Exact":
+            dietz = TWRProcessor.calculate_modified_dietz(portfolio, start_date, end_date)
+            output.log_text(f"Modified Dietz Return: {dietz.value:.2%}")
+            output.log_table(f"Modified Dietz (From {start_date.toString(Qt.DateFormat.ISODate)} to {end_date.toString(Qt.DateFormat.ISODate)})", [
+                Column("Return", [dietz.value], "percent"),
+                Column("Portfolio Initial Value", [dietz.begin_value], "currency"),
+                Column("Portfolio Final Value", [dietz.end_value], "currency"),
+                Column("Cash Flow", [dietz.cash_flow], "currency"),
+                Column("Weighted Cash Flow", [dietz.weighted_cash_flow], "currency"),
+            ])
+
+        if method == "Modified Dietz":
+            return True
+
+        # Calculate TWR
+        twr = TWRProcessor.calculate_twr(portfolio, start_date, end_date)
+
+        # Print the result
+        output.log_text(f"Time-Weighted Return (TWR): {twr.value:.2%}")
+        if method == "Both":
+            # TWR starts before the first day's cash flows and leaves them out of its flows, Modified Dietz counts them, so the two only cover the same flows when there are none that day
+            if portfolio.has_cash_flows_at_day(Utils.date_to_day(start_date)):
+                output.log_text(f"Warning: The range starts on a day with cash flows ({start_date.toString(Qt.DateFormat.ISODate)}), TWR leaves them out while Modified Dietz counts them, so the two are not compared. Start the range a day earlier or later to compare them.")
+            else:
+                output.log_text(f"Modified Dietz deviation from TWR: {(dietz.value - twr.value) * 100:+.2f} percentage points")
+        output.log_table(f"TWR (From {start_date.toString(Qt.DateFormat.ISODate)} to {end_date.toString(Qt.DateFormat.ISODate)})", [
+            Column("From", twr.boundary_days[:-1], "date"),
+            Column("To", twr.boundary_days[1:], "date"),
+            Column("Growth Factor", [period.growth_factor for period in twr.periods], "number"),
+            Column("Return", [period.period_return for period in twr.periods], "percent"),
+            Column("Portfolio Initial Value", [period.begin_portfolio_value for period in twr.periods], "currency"),
+            Column("Portfolio Final Value", [period.end_portfolio_value for period in twr.periods], "currency"),
+            Column("Cash Flow", [period.cash_flow for period in twr.periods], "currency"),
+            Column("Gain/Loss", [period.gain_loss for period in twr.periods], "currency"),
+        ])
+
+        return True
+
+@OperationRegistry.register("Return Calculation", "Calculate MWR")
+class CalculateMWROperation(Operation):
+    def get_settings_desc(self):
+        return {
+            **super().get_settings_desc(),
+            "from": SettingFactory.date("From", QDate.currentDate().addYears(-1)),
+            "to": SettingFactory.date("To"),
+           
+        }
+    
+    def execute(self, portfolio: Portfolio, output: Output):
+        from_date = self.get("from")
+        to_date = self.get("to")
+
+        # Dividends received leave the portfolio like a withdrawal
+        cash_flows = portfolio.get_cash_flows_between(from_date, to_date) - portfolio.get_dividends_between(from_date, to_date)
+
+        initial_value = portfolio.get_value_at_date(from_date, False)
+        final_value = portfolio.get_value_at_date(to_date, True)
+        gain_loss = final_value - initial_value - cash_flows
+
+        # Values priced through numpy don't raise on a zero division, so the initial value is checked directly
+        if initial_value == 0:
+            output.log_text("Error: Initial portfolio value is zero. Unable to calculate money-weighted return.")
+            mwr = 0.0
+        else:
+            mwr = (final_value - cash_flows) / initial_value - 1
+
+        output.log_table(f"MWR (From {from_date.toString(Qt.DateFormat.ISODate)} to {to_date.toString(Qt.DateFormat.ISODate)})", [
+            Column("From", [Utils.date_to_day(from_date)], "date"),
+            Column("To", [Utils.date_to_day(to_date)], "date"),
+            Column("Return", [mwr], "percent"),
+            Column("Initial Value", [initial_value], "currency"),
+            Column("Final Value", [final_value], "currency"),
+            Column("Cash Flow", [cash_flows], "currency"),
+            Column("Gain/Loss", [gain_loss], "currency"),
+        ])
+
+        return True
+
+@OperationRegistry.register("Return Calculation", "Compare to Benchmark")
+class CompareToBenchmarkOperation(Operation):
+    def get_settings_desc(self):
+        benchmark_symbols = AppSettings.get_list("benchmark_symbols")
+        return {
+            **super().get_settings_desc(),
+            "from": SettingFactory.date("From", QDate.currentDate().addYears(-1)),
+            "to": SettingFactory.date("To"),
+            "benchmark": SettingFactory.string("Benchmark", benchmark_symbols[0] if benchmark_symbols else "SPY", "Symbol, e.g. SPY"),
+        }
+    
+    def validate(self, portfolio: Portfolio, output: Output):
+        if not self.get("benchmark").strip():
+            output.log_text("Error: No benchmark symbol specified.")
+            return False
+        if portfolio.symbol_cache is None:
+            output.log_text("Error: Historical prices are not loaded.")
+            return False
+        return True
+
+    def execute(self, portfolio: Portfolio, output: Output):
+        start_date = self.get("from")
+        end_date = self.get("to")
+        benchmark = self.get("benchmark").strip().upper()
+
+        twr = TWRProcessor.calculate_twr(portfolio, start_date, end_date)
+
+        # Price the benchmark on the exact same period boundaries, boundaries on closed market days take the last close before them.
+        # Like the portfolio, the first period starts at the open, which on a closed day is the last close before it.
+        # Benchmarks the portfolio's cache does not hold are fetched apart from it
+        price_source = portfolio.get_price_source(portfolio.get_symbols_cache([benchmark]))
+        benchmark_prices, _ = price_source.get_last_symbol_prices_at_days(benchmark, twr.boundary_days)
+        if len(twr.boundary_days):
+            first_open = price_source.get_symbol_prices_at_points([benchmark], twr.boundary_days[:1], numpy.zeros(1, dtype=numpy.int64), 'Open')[0]
+            benchmark_prices[0] = first_open if not numpy.isnan(first_open) else price_source.get_last_symbol_prices_at_days(benchmark, twr.boundary_days[:1] - 1)[0][0]
+        if len(benchmark_prices) and numpy.isnan(benchmark_prices).all():
+            output.log_text(f"Error: No prices found for {benchmark} in the selected range.")
+            return False
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            benchmark_returns = benchmark_prices[1:] / benchmark_prices[:-1] - 1
+
+        # Periods before the benchmark's first price are reported rather than compounded as if flat
+        priced = ~numpy.isnan(benchmark_returns)
+        benchmark_twr = numpy.prod(1 + benchmark_returns[priced]) - 1
+        if not priced.all():
+            unpriced_days = twr.boundary_days[:-1][~priced]
+            output.log_text(f"Warning: {benchmark} has no price for {numpy.count_nonzero(~priced)} of {len(priced)} periods, starting {Utils.day_to_date(int(unpriced_days[0])).toString(Qt.DateFormat.ISODate)}. Its return only covers the other periods.")
+
+        output.log_text(f"Time-Weighted Return (TWR): {twr.value:.2%}, {benchmark}: {benchmark_twr:.2%}, Excess Return: {twr.value - benchmark_twr:.2%}")
+        period_returns = numpy.array([period.period_return for period in twr.periods])
+        output.log_table(f"TWR vs {benchmark} (From {start_date.toString(Qt.DateFormat.ISODate)} to {end_date.toString(Qt.DateFormat.ISODate)})", [
+            Column("From", twr.boundary_days[:-1], "date"),
+            Column("To", twr.boundary_days[1:], "date"),
+            Column("Portfolio Return", period_returns, "percent"),
+            Column("Benchmark Return", benchmark_returns, "percent"),
+            Column("Excess Return", period_returns - benchmark_returns, "percent"),
+        ])
+
+        return True
+
+@OperationRegistry.register("Return Calculation", "Calculate Contribution")
+class CalculateContributionOperation(Operation):
+    def get_settings_desc(self):
+        return {
+            **super().get_settings_desc(),
+            "from": SettingFactory.date("From", QDate.currentDate().addYears(-1)),
+            "to": SettingFactory.date("To"),
+        }
+    
+    def execute(self, portfolio: Portfolio, output: Output):
+        start_date = self.get("from")
+        end_date = self.get("to")
+
+        twr = TWRProcessor.calculate_twr(portfolio, start_date, end_date)
+        contributions = TWRProcessor.calculate_contributions(twr)
+        contributions.sort(key=lambda contribution: contribution.contribution, reverse=True)
+
+        output.log_text(f"Time-Weighted Return (TWR): {twr.value:.2%}")
+        output.log_table(f"Contribution (From {start_date.toString(Qt.DateFormat.ISODate)} to {end_date.toString(Qt.DateFormat.ISODate)})", [
+            Column("Symbol", [contribution.symbol for contribution in contributions]),
+            Column("Average Weight", [contribution.weight for contribution in contributions], "percent"),
+            Column("Contribution", [contribution.contribution for contribution in contributions], "percent"),
+            Column("Gain/Loss", [contribution.gain_loss for contribution in contributions], "currency"),
+        ])
+
+        return True
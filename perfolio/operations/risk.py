@@ -0,0 +1,85 @@
+import numpy
+
+from PySide6.QtCore import Qt, QDate
+from perfolio.operations import Operation, OperationRegistry
+from perfolio.output import Column, Output
+from perfolio.portfolio import Portfolio
+from perfolio.risk import RiskProcessor
+from perfolio.settings import AppSettings, SettingFactory
+
+@OperationRegistry.register("Risk Analysis", "Risk Metrics")
+class RiskMetricsOperation(Operation):
+    def get_settings_desc(self):
+        benchmark_symbols = AppSettings.get_list("benchmark_symbols")
+        return {
+            **super().get_settings_desc(),
+            "from": SettingFactory.date("From", QDate.currentDate().addYears(-1)),
+            "to": SettingFactory.date("To"),
+            "risk_free_rate": SettingFactory.double("Risk-Free Rate (%)", 0.0),
+            "benchmark": SettingFactory.string("Benchmark", benchmark_symbols[0] if benchmark_symbols else "SPY", "Symbol, e.g. SPY (leave empty to skip beta)"),
+        }
+    
+    def validate(self, portfolio: Portfolio, output: Output):
+        if portfolio.symbol_cache is None:
+            output.log_text("Error: Historical prices are not loaded.")
+            return False
+        return True
+
+    def execute(self, portfolio: Portfolio, output: Output):
+        from_date = self.get("from")
+        to_date = self.get("to")
+        benchmark = self.get("benchmark").strip().upper()
+
+        daily_returns = RiskProcessor.calculate_daily_returns(portfolio, from_date, to_date)
+
+        # Benchmarks the portfolio's cache does not hold are fetched apart from it
+        benchmark_prices = None
+        if benchmark:
+            benchmark_prices = portfolio.get_price_source(portfolio.get_symbols_cache([benchmark])).get_symbol_prices_at_days([benchmark], daily_returns.days)[:, 0]
+            if len(benchmark_prices) and numpy.isnan(benchmark_prices).all():
+                output.log_text(f"Error: No prices found for {benchmark} in the selected range.")
+                return False
+        metrics = RiskProcessor.calculate_risk_metrics(daily_returns, self.get("risk_free_rate") / 100, benchmark_prices)
+
+        output.log_text(f"Volatility: {metrics.volatility:.2%}, Sharpe: {metrics.sharpe_ratio:.2f}, Max Drawdown: {metrics.max_drawdown:.2%}")
+        output.log_table(f"Risk Metrics (From {from_date.toString(Qt.DateFormat.ISODate)} to {to_date.toString(Qt.DateFormat.ISODate)})", [
+            Column("Annualized Return", [metrics.annualized_return], "percent"),
+            Column("Volatility", [metrics.volatility], "percent"),
+            Column("Sharpe Ratio", [metrics.sharpe_ratio], "number"),
+            Column("Sortino Ratio", [metrics.sortino_ratio], "number"),
+            Column("Max Drawdown", [metrics.max_drawdown], "percent"),
+            Column("Peak", [metrics.peak_day if metrics.peak_day is not None else "NaT"], "date"),
+            Column("Trough", [metrics.trough_day if metrics.trough_day is not None else "NaT"], "date"),
+            Column("Recovery", [metrics.recovery_day if metrics.recovery_day is not None else "NaT"], "date"),
+            Column(f"Beta ({benchmark})" if benchmark else "Beta", [metrics.beta], "number"),
+        ])
+
+        return True
+
+@OperationRegistry.register("Portfolio Analysis", "Chart Performance")
+class ChartPerformanceOperation(Operation):
+    def get_settings_desc(self):
+        return {
+            **super().get_settings_desc(),
+            "from": SettingFactory.date("From", QDate.currentDate().addYears(-1)),
+            "to": SettingFactory.date("To"),
+        }
+    
+    def execute(self, portfolio: Portfolio, output: Output):
+        from_date = self.get("from")
+        to_date = self.get("to")
+
+        daily_returns = RiskProcessor.calculate_daily_returns(portfolio, from_date, to_date)
+        if len(daily_returns.days) == 0:
+            output.log_text("Error: No market data in the selected range.")
+            return False
+
+        growth = RiskProcessor.calculate_growth_index(daily_returns.returns)
+
+        output.log_chart(f"Performance (From {from_date.toString(Qt.DateFormat.ISODate)} to {to_date.toString(Qt.DateFormat.ISODate)})", daily_returns.days, [
+            Column("Portfolio Value", daily_returns.values, "currency"),
+            Column("Cumulative TWR", growth - 1, "percent"),
+            Column("Drawdown", RiskProcessor.calculate_drawdowns(growth), "percent"),
+        ])
+
+        return True
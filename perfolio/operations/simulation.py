@@ -0,0 +1,54 @@
+import numpy
+
+from PySide6.QtCore import Qt, QDate
+from perfolio.operations import Operation, OperationRegistry
+from perfolio.output import Column, Output
+from perfolio.portfolio import Portfolio
+from perfolio.settings import SettingFactory
+from perfolio.simulation import SimulationProcessor
+
+@OperationRegistry.register("Risk Analysis", "Simulate")
+class SimulateOperation(Operation):
+    # Horizons reported in the probability of loss table, in trading days
+    horizons = {"1 Month": 21, "3 Months": 63, "6 Months": 126, "1 Year": 252, "3 Years": 756, "5 Years": 1260}
+
+    def get_settings_desc(self):
+        return {
+            **super().get_settings_desc(),
+            "from": SettingFactory.date("History From", QDate.currentDate().addYears(-5)),
+            "to": SettingFactory.date("As Of"),
+            "method": SettingFactory.list("Method", SimulationProcessor.methods, "Bootstrap"),
+            "horizon": SettingFactory.integer("Horizon (Trading Days)", 252, 1, 2520),
+            "paths": SettingFactory.integer("Paths", 20000, 100, 1000000),
+            "seed": SettingFactory.integer("Seed", 0),
+        }
+    
+    def execute(self, portfolio: Portfolio, output: Output):
+        from_date = self.get("from")
+        to_date = self.get("to")
+        method = self.get("method")
+        horizon = self.get("horizon")
+
+        try:
+            result = SimulationProcessor.simulate(portfolio, from_date, to_date, horizon, self.get("paths"), method, self.get("seed"))
+        except ValueError as e:
+            output.log_text(f"Error: {e}")
+            return False
+
+        output.log_text(f"Simulated {self.get('paths')} {method.lower()} paths of {len(result.symbols)} holdings worth {result.initial_value:,.2f}, probability of loss after {horizon} trading days: {result.loss_probabilities[-1]:.2%}")
+        output.log_chart(f"Simulation, {method} (From {to_date.toString(Qt.DateFormat.ISODate)}, {horizon} Days)", result.days, [
+            *[Column(f"P{percentile}", band, "currency") for percentile, band in zip(result.percentiles, result.bands)],
+            Column("Mean", result.mean_values, "currency"),
+        ])
+
+        steps = [(label, days) for label, days in SimulateOperation.horizons.items() if days < horizon] + [(f"{horizon} Days", horizon)]
+        indices = numpy.array([days - 1 for _, days in steps])
+        output.log_table(f"Probability of Loss, {method} (From {to_date.toString(Qt.DateFormat.ISODate)})", [
+            Column("Horizon", [label for label, _ in steps]),
+            Column("Date", result.days[indices], "date"),
+            Column("Probability of Loss", result.loss_probabilities[indices], "percent"),
+            *[Column(f"P{percentile}", band[indices], "currency") for percentile, band in zip(result.percentiles, result.bands)],
+            Column("Mean", result.mean_values[indices], "currency"),
+        ])
+
+        return True
@@ -1,14 +1,155 @@
+import csv
+import json
+import math
+import numpy
+
+# Formatters applied by views to a single raw cell value
+FORMATTERS = {
+    "text": lambda value: str(value),
+    "date": lambda value: str(value),
+    "integer": lambda value: f"{value:.0f}",
+    "quantity": lambda value: f"{value:.0f}" if float(value).is_integer() else f"{value:.2f}",
+    "number": lambda value: f"{value:.2f}",
+    "percent": lambda value: f"{value:.2%}",
+    "currency": lambda value: f"$ {value:,.2f}",
+}
+
+class Column:
+    def __init__(self, name: str, values, format: str = "text"):
+        self.name = name
+        self.format = format
+
+        # Values are kept raw and typed, dates as datetime64[D]
+        if format == "date":
+            self.values = numpy.asarray(values).astype('datetime64[D]')
+        elif format == "text":
+            self.values = numpy.asarray(values, dtype=object)
+        else:
+            self.values = numpy.asarray(values, dtype=numpy.float64)
+
+    def __len__(self):
+        return len(self.values)
+
+    def format_value(self, row: int) -> str:
+        return FORMATTERS[self.format](self.values[row])
+
+    def get_raw_value(self, row: int):
+        if self.format == "text":
+            return self.values[row]
+        return str(self.values[row]) if self.format == "date" else self.values[row].item()
+
+    def get_export_values(self, start: int, end: int) -> list:
+        values = self.values[start:end]
+        return values.astype(str).tolist() if self.format == "date" else values.tolist()
+
+class Table:
+    export_chunk_size = 65536
+
+    def __init__(self, name: str, columns: list[Column]):
+        self.name = name
+        self.columns = columns
+
+    def get_headers(self) -> list[str]:
+        return [column.name for column in self.columns]
+
+    def get_row_count(self) -> int:
+        return len(self.columns[0]) if self.columns else 0
+
+    def get_column(self, name: str) -> Column:
+        for column in self.columns:
+            if column.name == name:
+                return column
+        return None
+
+    def iterate_chunks(self, chunk_size: int = None):
+        chunk_size = chunk_size or self.export_chunk_size
+        for start in range(0, self.get_row_count(), chunk_size):
+            end = start + chunk_size
+            yield [column.get_export_values(start, end) for column in self.columns]
+
+    def iterate_json_rows(self, chunk_size: int = None):
+        # JSON has no NaN or infinity, such numbers are written as null
+        for chunk in self.iterate_chunks(chunk_size):
+            yield [[None if isinstance(value, float) and not math.isfinite(value) else value for value in row] for row in zip(*chunk)]
+
+    def export(self, file_path: str):
+        extension = file_path.lower().rsplit(".", 1)[-1]
+        if extension == "csv":
+            self.export_csv(file_path)
+        elif extension == "json":
+            self.export_json(file_path)
+        elif extension == "parquet":
+            self.export_parquet(file_path)
+        else:
+            raise ValueError(f"Unsupported export format: {extension}")
+
+    def export_csv(self, file_path: str):
+        with open(file_path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(self.get_headers())
+            for chunk in self.iterate_chunks():
+                writer.writerows(zip(*chunk))
+
+    def export_json(self, file_path: str):
+        headers = self.get_headers()
+        with open(file_path, "w") as file:
+            file.write("[")
+            separator = "\n"
+            for rows in self.iterate_json_rows():
+                for row in rows:
+                    file.write(separator + json.dumps(dict(zip(headers, row))))
+                    separator = ",\n"
+            file.write("\n]\n")
+
+    def export_parquet(self, file_path: str):
+        import pyarrow
+        import pyarrow.parquet
+
+        # Each chunk is written as its own row group, straight from the typed arrays
+        writer = None
+        try:
+            for start in range(0, max(self.get_row_count(), 1), self.export_chunk_size):
+                end = start + self.export_chunk_size
+                arrays = [pyarrow.array(column.values[start:end].tolist() if column.format == "text" else column.values[start:end]) for column in self.columns]
+                batch = pyarrow.Table.from_arrays(arrays, names=self.get_headers())
+                if writer is None:
+                    writer = pyarrow.parquet.ParquetWriter(file_path, batch.schema)
+                writer.write_table(batch)
+        finally:
+            if writer is not None:
+                writer.close()
+
+class Chart:
+    def __init__(self, name: str, days, series: list[Column]):
+        # Every series is plotted against the same days
+        self.name = name
+        self.days = numpy.asarray(days, dtype=numpy.int64)
+        self.series = series
+
+    def to_table(self) -> Table:
+        return Table(self.name, [Column("Date", self.days, "date"), *self.series])
+
 class Output:
     text_callback = None
     table_callback = None
+    chart_callback = None
 
-    def register_callbacks(self, text_callback, table_callback):
+    def register_callbacks(self, text_callback, table_callback, chart_callback=None):
         self.text_callback = text_callback
         self.table_callback = table_callback
+        self.chart_callback = chart_callback
 
     def log_text(self, text: str):
         self.text_callback(text)
 
-    def log_table(self, name: str, headers: list[str], data: list[tuple]):
-        self.table_callback(name, headers, data)
-        
\ No newline at end of file
+    def log_table(self, name: str, columns: list[Column]):
+        self.table_callback(Table(name, columns))
+
+    def log_chart(self, name: str, days, series: list[Column]):
+        chart = Chart(name, days, series)
+
+        # Outputs that cannot display charts get their data as a table
+        if self.chart_callback:
+            self.chart_callback(chart)
+        else:
+            self.table_callback(chart.to_table())
@@ -0,0 +1,134 @@
+import numpy
+
+from PySide6.QtCore import Qt, QDate
+from perfolio.portfolio import Portfolio
+from perfolio.utils import Utils
+
+class PeriodicReturn:
+    def __init__(self, label: str, start_date: QDate, end_date: QDate, twr: float, mwr: float, initial_value: float, final_value: float, cash_flow: float, gain_loss: float):
+        self.label = label
+        self.start_date = start_date
+        self.end_date = end_date
+        self.twr = twr
+        self.mwr = mwr
+        self.initial_value = initial_value
+        self.final_value = final_value
+        self.cash_flow = cash_flow
+        self.gain_loss = gain_loss
+
+class PeriodicReturnsProcessor:
+    frequencies = ["Monthly", "Quarterly", "Yearly", "Custom"]
+
+    @staticmethod
+    def generate_calendar_ranges(begin_date: QDate, end_date: QDate, frequency: str) -> list[tuple[str, QDate, QDate]]:
+        months_per_period = {"Monthly": 1, "Quarterly": 3, "Yearly": 12}[frequency]
+        ranges = []
+
+        # Start from the beginning of the calendar period containing the begin date
+        first_month = (begin_date.month() - 1) // months_per_period * months_per_period + 1
+        period_start = QDate(begin_date.year(), first_month, 1)
+
+        while period_start <= end_date:
+            next_period_start = period_start.addMonths(months_per_period)
+
+            if frequency == "Monthly":
+                label = period_start.toString("yyyy-MM")
+            elif frequency == "Quarterly":
+                label = f"{period_start.year()}-Q{(period_start.month() - 1) // 3 + 1}"
+            else:
+                label = str(period_start.year())
+
+            ranges.append((label, max(period_start, begin_date), min(next_period_start.addDays(-1), end_date)))
+            period_start = next_period_start
+
+        return ranges
+
+    @staticmethod
+    def parse_custom_ranges(text: str) -> list[tuple[str, QDate, QDate]]:
+        ranges = []
+
+        # One "YYYY-MM-DD YYYY-MM-DD" range per line, commas are accepted as separators too
+        for line in text.splitlines():
+            parts = line.replace(",", " ").split()
+            if not parts:
+                continue
+            if len(parts) != 2:
+                raise ValueError(f"Invalid range: {line}")
+            start_date = QDate.fromString(parts[0], Qt.DateFormat.ISODate)
+            end_date = QDate.fromString(parts[1], Qt.DateFormat.ISODate)
+            if not start_date.isValid() or not end_date.isValid() or end_date < start_date:
+                raise ValueError(f"Invalid range: {line}")
+            ranges.append((f"{parts[0]} - {parts[1]}", start_date, end_date))
+
+        return ranges
+
+    @staticmethod
+    def snap_to_trading_days(portfolio: Portfolio, ranges: list[tuple[str, QDate, QDate]]) -> list[tuple[str, QDate, QDate]]:
+        # Calendar boundaries often fall on closed market days, which have no price
+        trading_days = portfolio.get_price_source().get_days()
+        snapped_ranges = []
+
+        for label, start_date, end_date in ranges:
+            start_index = numpy.searchsorted(trading_days, Utils.date_to_day(start_date), side='left')
+            end_index = numpy.searchsorted(trading_days, Utils.date_to_day(end_date), side='right') - 1
+            if start_index <= end_index:
+                snapped_ranges.append((label, Utils.day_to_date(trading_days[start_index]), Utils.day_to_date(trading_days[end_index])))
+
+        return snapped_ranges
+
+    @staticmethod
+    def calculate_periodic_returns(portfolio: Portfolio, ranges: list[tuple[str, QDate, QDate]]) -> list[PeriodicReturn]:
+        if not ranges:
+            return []
+
+        ledger = portfolio.get_ledger()
+        begin_days = Utils.dates_to_days([start_date for _, start_date, _ in ranges])
+        end_days = Utils.dates_to_days([end_date for _, _, end_date in ranges])
+
+        # Every range is derived from a single valuation of all transaction days and range boundaries
+        transaction_days = numpy.unique(ledger.days[(ledger.days > begin_days.min()) & (ledger.days <= end_days.max())])
+        transaction_values = portfolio.get_values_at_days(transaction_days, True)
+        initial_values = portfolio.get_values_at_days(begin_days, False)
+        final_values = portfolio.get_values_at_days(end_days, True)
+
+        transaction_cumulative_cash_flows = portfolio.get_cumulative_cash_flows_at_days(transaction_days)
+        begin_cumulative_cash_flows = portfolio.get_cumulative_cash_flows_at_days(begin_days)
+        end_cumulative_cash_flows = portfolio.get_cumulative_cash_flows_at_days(end_days)
+
+        # Growth factors between consecutive transaction days are shared by every range containing them
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            previous_values = numpy.concatenate(([0.0], transaction_values[:-1]))
+            transaction_growth_factors = numpy.where(previous_values != 0, (transaction_values - numpy.diff(transaction_cumulative_cash_flows, prepend=0.0)) / previous_values, 1.0)
+        transaction_growth_factors = numpy.where(numpy.isnan(transaction_growth_factors), 1.0, transaction_growth_factors)
+
+        first_indices = numpy.searchsorted(transaction_days, begin_days, side='right')
+        last_indices = numpy.searchsorted(transaction_days, end_days, side='right')
+
+        def growth_factor(end_value, cash_flow, begin_value):
+            if begin_value == 0:
+                return 1.0
+            factor = (end_value - cash_flow) / begin_value
+            return 1.0 if numpy.isnan(factor) else factor
+
+        results = []
+
+        for index, (label, start_date, end_date) in enumerate(ranges):
+            first, last = first_indices[index], last_indices[index]
+            begin_day, end_day = begin_days[index], end_days[index]
+
+            if first == last:
+                twr = growth_factor(final_values[index], end_cumulative_cash_flows[index] - begin_cumulative_cash_flows[index], initial_values[index]) if begin_day != end_day else 1.0
+            else:
+                twr = growth_factor(transaction_values[first], transaction_cumulative_cash_flows[first] - begin_cumulative_cash_flows[index], initial_values[index])
+                twr *= numpy.prod(transaction_growth_factors[first + 1:last])
+                if transaction_days[last - 1] != end_day:
+                    twr *= growth_factor(final_values[index], end_cumulative_cash_flows[index] - transaction_cumulative_cash_flows[last - 1], transaction_values[last - 1])
+
+            cash_flow = end_cumulative_cash_flows[index] - begin_cumulative_cash_flows[index]
+            initial_value = initial_values[index]
+            final_value = final_values[index]
+            mwr = (final_value - cash_flow) / initial_value - 1 if initial_value != 0 else 0.0
+
+            results.append(PeriodicReturn(label, start_date, end_date, twr - 1, mwr, initial_value, final_value, cash_flow, final_value - initial_value - cash_flow))
+
+        return results
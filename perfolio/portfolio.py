@@ -1,7 +1,20 @@
-from PySide6.QtCore import QDate
+import csv
+import hashlib
+import heapq
+import itertools
+import os
+
+from PySide6.QtCore import Qt, QDate
 import numpy
 
+from perfolio.dividends import DividendIncome
+from perfolio.ledger import Ledger
+from perfolio.lots import TaxLots
+from perfolio.splits import SplitAdjustment
+from perfolio.streaming import StoredPriceSource
 from perfolio.symbol import SymbolCache
+from perfolio.utils import Utils
+from perfolio.validation import PortfolioValidator, ValidationReport
 
 class Transaction:
     symbol: str = None
@@ -9,43 +22,373 @@ class Transaction:
     type: str = None
     quantity: float = None
     price: float = None
+    account: str = None
+
+    # Name of the file the transaction was loaded from
+    source: str = None
+
+    def get_account(self) -> str:
+        # Files without an account column are one account each
+        return self.account or self.source
 
 class Portfolio:
     file_path:str = None
+    file_paths: list[str] = []
     transactions: list[Transaction] = []
     symbol_cache: SymbolCache = None
+    ledger: Ledger = None
+    tax_lots: dict[str, TaxLots] = {}
+    validation_report: ValidationReport = None
+    dividend_income: DividendIncome = None
+    split_adjustment: SplitAdjustment = None
+    account_portfolios: dict[str, 'Portfolio'] = {}
+    fingerprint: str = None
+
+    # Dividends received count as money leaving the portfolio, which makes returns total returns
+    include_dividends: bool = True
+
+    # Working memory of valuations in bytes, 0 values every day at once from the cache
+    memory_budget: int = 0
+    stored_price_source: StoredPriceSource = None
+
+    # Working memory of valuing one position, all index and value arrays included
+    bytes_per_position = 128
+
+    # Changed transactions edited into the ledger one at a time, past this many it is built again
+    max_incremental_edits = 256
+
+    # Mapping for header variations
+    header_mapping = {
+        'date': ['date', 'dt', 'dte', 'de', 'day', 'at', 'dy', 'time', 'timestamp'],
+        'symbol': ['symbol', 'ticker', 'sym', 'sbl', 'symbols'],
+        'type': ['type', 'transaction', 'trz', 'tpe'],
+        'quantity': ['quantity', 'qty', 'qt', 'amount', 'volume', 'amnt', 'shares'],
+        'price': ['price', 'prc', 'pc', 'cost', 'value', 'cst', 'money', 'spent'],
+        'account': ['account', 'acct', 'acc', 'accnt', 'broker', 'brokerage'],
+    }
+
+    @staticmethod
+    def read_csv_rows(file_path: str) -> tuple[list[str], list[tuple]]:
+        with open(file_path, 'r', newline='') as csvfile:
+            csvreader = csv.reader(csvfile)
+            headers = [header.lower() for header in next(csvreader)]
+            rows = [tuple(row) for row in csvreader]
+        return headers, rows
+
+    @staticmethod
+    def get_source_name(file_path: str) -> str:
+        return os.path.splitext(os.path.basename(file_path))[0]
+
+    @staticmethod
+    def parse_transaction(headers: list[str], row: tuple, source: str = None) -> Transaction:
+        transaction = Transaction()
+        transaction.source = source
+
+        # Process each header and fill in the transaction attributes
+        for attribute, variations in Portfolio.header_mapping.items():
+            for variation in variations:
+                if variation in headers:
+                    index = headers.index(variation)
+                    value = row[index]
+
+                    # Special handling for 'date' and 'quantity'
+                    if attribute == 'date':
+                        value = Utils.convert_date_format(value)
+                        transaction.date = QDate.fromString(value, Qt.DateFormat.ISODate)
+                    elif attribute == 'quantity':
+                        # Unparsable quantities are reported by the validator instead of failing the whole load
+                        try:
+                            transaction.quantity = float(value)
+                        except ValueError:
+                            transaction.quantity = float('nan')
+                    else:
+                        setattr(transaction, attribute, value)
+                    break
+
+        return transaction
+
+    @staticmethod
+    def get_content_key(transaction: Transaction) -> tuple:
+        # Overlapping exports repeat the same content, only an explicit account column tells two accounts apart
+        try:
+            price = float(transaction.price)
+        except (TypeError, ValueError):
+            price = transaction.price
+        day = transaction.date.toJulianDay() if transaction.date is not None and transaction.date.isValid() else None
+        return (transaction.account or None, transaction.symbol, day, transaction.type, transaction.quantity, price)
+
+    @staticmethod
+    def merge_transactions(file_transactions: list[list[Transaction]]) -> list[Transaction]:
+        def get_ordered(transactions: list[Transaction]):
+            # Exports are sorted by date, newest first ones are read backwards
+            dates = [transaction.date for transaction in transactions if transaction.date is not None and transaction.date.isValid()]
+            return reversed(transactions) if dates and dates[0] > dates[-1] else transactions
+
+        def get_day(entry: tuple[int, Transaction]) -> int:
+            date = entry[1].date
+            return date.toJulianDay() if date is not None and date.isValid() else 0
+
+        # Sorted files are combined in a single streaming pass, ties keep the order of the files
+        merged = heapq.merge(*[zip(itertools.repeat(index), get_ordered(transactions)) for index, transactions in enumerate(file_transactions)], key=get_day)
+
+        # A transaction repeated across files is kept as many times as the file repeating it most, repeats within a file are all kept
+        kept_counts = {}
+        seen_counts = [{} for _ in file_transactions]
+        transactions = []
+        for index, transaction in merged:
+            content_key = Portfolio.get_content_key(transaction)
+            seen_count = seen_counts[index][content_key] = seen_counts[index].get(content_key, 0) + 1
+            if seen_count > kept_counts.get(content_key, 0):
+                kept_counts[content_key] = seen_count
+                transactions.append(transaction)
+
+        return transactions
+
+    def load_data_from_csvs(self, file_paths: list[str]) -> list[tuple[list[str], list[tuple[tuple, Transaction]]]]:
+        loaded_files = []
+        for file_path in file_paths:
+            headers, rows = Portfolio.read_csv_rows(file_path)
+            source = Portfolio.get_source_name(file_path)
+            loaded_files.append((headers, [(row, Portfolio.parse_transaction(headers, row, source)) for row in rows]))
+
+        self.clear()
+        self.file_paths = list(file_paths)
+        self.file_path = self.file_paths[0] if self.file_paths else None
+        self.transactions = Portfolio.merge_transactions([[transaction for _, transaction in loaded_rows] for _, loaded_rows in loaded_files])
+
+        # The raw rows of every file are returned so callers can detect which ones change later on
+        return loaded_files
+
+    def load_data_from_csv(self, file_path: str) -> tuple[list[str], list[tuple[tuple, Transaction]]]:
+        return self.load_data_from_csvs([file_path])[0]
 
     def clear(self):
         self.file_path = None
+        self.file_paths = []
         self.transactions = []
         self.symbol_cache = None
+        self.invalidate_ledger()
+
+    def invalidate_ledger(self):
+        self.ledger = None
+        self.tax_lots = {}
+        self.validation_report = None
+        self.dividend_income = None
+        self.split_adjustment = None
+        self.account_portfolios = {}
+        self.fingerprint = None
+
+    def edit_transactions(self, index: int, removed: Transaction, added: Transaction):
+        # At index of the transaction list, removed is taken out and added put in its place, either can be None
+        ledger = self.ledger
+        removed_row = None
+        if removed is not None:
+            if ledger is not None and PortfolioValidator.validate([removed]).valid[0]:
+                removed_row = ledger.transactions.index(removed)
+            del self.transactions[index]
+        if added is not None:
+            self.transactions.insert(index, added)
+
+        # Results keyed by the transactions, accounts and tax lots are computed again when asked for
+        self.validation_report = None
+        self.tax_lots = {}
+        self.account_portfolios = {}
+        self.fingerprint = None
+        if ledger is None:
+            return
+
+        # A symbol appearing or disappearing changes every symbol index, the ledger is built again
+        is_added = added is not None and PortfolioValidator.validate([added]).valid[0]
+        if is_added and added.symbol not in ledger.symbol_indices:
+            self.invalidate_ledger()
+            return
+        if removed_row is not None and numpy.count_nonzero(ledger.symbol_ids == ledger.symbol_ids[removed_row]) == 1 and not (is_added and added.symbol == removed.symbol):
+            self.invalidate_ledger()
+            return
+        if removed_row is None and not is_added:
+            return
+
+        # Same-day transactions keep the order of the transaction list, like the ledger's stable sort
+        added_row = None
+        if is_added:
+            day = Utils.date_to_day(added.date)
+            first, last = numpy.searchsorted(ledger.days, day, side='left'), numpy.searchsorted(ledger.days, day, side='right')
+            same_day_rows = [row for row in range(first, last) if row != removed_row]
+            added_row = first - (removed_row is not None and removed_row < first) + sum(self.transactions.index(ledger.transactions[row]) < index for row in same_day_rows)
+
+        # Everything built on the ledger follows its edit from the first edited transaction on
+        edit = ledger.edit(removed_row, added_row, added if is_added else None)
+        if self.split_adjustment is not None and self.split_adjustment.ledger is ledger:
+            self.split_adjustment.apply_edit(edit)
+            if self.dividend_income is not None:
+                self.dividend_income.apply_edit(self.split_adjustment, edit)
+        else:
+            self.split_adjustment = None
+            self.dividend_income = None
+
+    def replace_transactions(self, transactions: list[Transaction]):
+        # Transactions kept from the current list are the same objects, the others are taken out or put in one by one
+        # so the ledger and what is built on it are only updated from the first changed day on
+        new_ids = set(id(transaction) for transaction in transactions)
+        current_ids = set(id(transaction) for transaction in self.transactions)
+        removed_indices = [index for index, transaction in enumerate(self.transactions) if id(transaction) not in new_ids]
+        added_indices = [index for index, transaction in enumerate(transactions) if id(transaction) not in current_ids]
 
-    def update_symbol_cache(self, force_populate: bool = False):
-        sorted_transactions = sorted(self.transactions, key=lambda t: t.date)
+        # Kept transactions that moved, or too many changes at once, are cheaper to build again
+        same_order = [transaction for transaction in self.transactions if id(transaction) in new_ids] == [transaction for transaction in transactions if id(transaction) in current_ids]
+        if not same_order or len(removed_indices) + len(added_indices) > Portfolio.max_incremental_edits:
+            self.transactions = transactions
+            self.invalidate_ledger()
+            return
+
+        for index in reversed(removed_indices):
+            self.edit_transactions(index, self.transactions[index], None)
+        for index in added_indices:
+            self.edit_transactions(index, None, transactions[index])
+
+    def get_fingerprint(self) -> str:
+        # Identifies the transactions results were computed from, whatever files they were loaded from
+        if self.fingerprint is None:
+            content_hash = hashlib.sha256()
+            for transaction in self.get_valid_transactions():
+                content_hash.update(repr(Portfolio.get_content_key(transaction)).encode())
+            self.fingerprint = content_hash.hexdigest()
+        return self.fingerprint
+
+    def get_accounts(self) -> list[str]:
+        return sorted(set(transaction.get_account() for transaction in self.transactions if transaction.get_account()))
+
+    def get_account_portfolio(self, account: str) -> 'Portfolio':
+        # Accounts are views over the loaded transactions sharing the price cache, no file is read again
+        if account is None:
+            return self
+
+        if account not in self.account_portfolios:
+            account_portfolio = Portfolio()
+            account_portfolio.clear()
+            account_portfolio.transactions = [transaction for transaction in self.transactions if transaction.get_account() == account]
+            account_portfolio.symbol_cache = self.symbol_cache
+            self.account_portfolios[account] = account_portfolio
+
+        account_portfolio = self.account_portfolios[account]
+        account_portfolio.include_dividends = self.include_dividends
+        account_portfolio.memory_budget = self.memory_budget
+        return account_portfolio
+
+    def validate(self) -> ValidationReport:
+        # Runs once per change of transactions or prices, calculations then only see valid transactions
+        price_source = self.get_price_source()
+        if self.validation_report is None or (not self.validation_report.prices_checked and price_source is not None and not price_source.invalid):
+            self.validation_report = PortfolioValidator.validate(self.transactions, price_source)
+        return self.validation_report
+
+    def get_valid_transactions(self) -> list[Transaction]:
+        valid = self.validate().valid
+        return [transaction for transaction, is_valid in zip(self.transactions, valid) if is_valid]
+
+    def get_ledger(self) -> Ledger:
+        if self.ledger is None:
+            self.ledger = Ledger(self.get_valid_transactions())
+        return self.ledger
+
+    def get_tax_lots(self, method: str) -> TaxLots:
+        # Lots are matched once per method, then every date is a snapshot lookup
+        split_adjustment = self.get_split_adjustment()
+        if method not in self.tax_lots or self.tax_lots[method].split_adjustment is not split_adjustment:
+            self.tax_lots[method] = TaxLots(self.get_ledger(), method, split_adjustment)
+        return self.tax_lots[method]
+
+    def get_symbols_cache(self, symbols: list[str]) -> SymbolCache:
+        # Symbols the portfolio may not hold, like backtest targets and benchmarks, are fetched into a temporary cache over the same days.
+        # The portfolio's cache keeps its own symbols, so they are not downloaded again on every refresh
+        if self.symbol_cache is None or set(symbols).issubset(self.symbol_cache.symbols):
+            return self.symbol_cache
+        return SymbolCache(self.symbol_cache.start_date, self.symbol_cache.end_date, symbols)
+
+    def get_price_source(self, symbol_cache: SymbolCache = None):
+        # With a memory budget prices are streamed from the price store, the cache never holds every symbol and day
+        if symbol_cache is None:
+            symbol_cache = self.symbol_cache
+        if not self.memory_budget or SymbolCache.price_store is None or symbol_cache is None:
+            return symbol_cache
+        if symbol_cache is not self.symbol_cache:
+            return StoredPriceSource(symbol_cache, SymbolCache.price_store, self.memory_budget)
+
+        source = self.stored_price_source
+        if source is None or source.symbol_cache is not self.symbol_cache or source.price_store is not SymbolCache.price_store or source.memory_budget != self.memory_budget:
+            self.stored_price_source = StoredPriceSource(self.symbol_cache, SymbolCache.price_store, self.memory_budget)
+        return self.stored_price_source
+
+    def get_block_size(self, count: int, row_bytes: int) -> int:
+        # Rows processed at once, so the working arrays of a block stay within their half of the memory budget
+        if not self.memory_budget:
+            return max(count, 1)
+        return max(1, min(count, self.memory_budget // 2 // max(row_bytes, 1)))
+
+    def calculate_own_twr(self, begin_date: QDate, end_date: QDate):
+        # Portfolios valued another way, like the shadow mode's reference engine, return their own TWRResult here.
+        # None leaves TWRProcessor.calculate_twr to compute it over the ledger
+        return None
+
+    def get_split_adjustment(self) -> SplitAdjustment:
+        # Splits come with the prices, without a price cache share counts are taken as they were traded
+        if self.symbol_cache is None:
+            return None
+        price_source = self.get_price_source()
+        if self.split_adjustment is None or self.split_adjustment.price_source is not price_source or self.split_adjustment.version != price_source.version:
+            self.split_adjustment = SplitAdjustment(self.get_ledger(), price_source)
+        return self.split_adjustment
+
+    def get_position_entries(self, days: numpy.ndarray, at_close: bool) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        # Split-adjusted share counts of the non-zero positions, as rows (into days), symbols and shares
+        split_adjustment = self.get_split_adjustment()
+        if split_adjustment is None:
+            return self.get_ledger().get_position_entries(days, at_close)
+        return split_adjustment.get_position_entries(days, at_close)
+
+    def get_positions_at_days(self, days: numpy.ndarray, at_close: bool) -> numpy.ndarray:
+        # Split-adjusted share counts of every symbol (columns) at every day (rows)
+        split_adjustment = self.get_split_adjustment()
+        if split_adjustment is None:
+            return self.get_ledger().get_positions_at_days(days, at_close)
+        return split_adjustment.get_positions_at_days(days, at_close)
+
+    def update_symbol_cache(self, force_populate: bool = False, benchmark_symbols: list[str] = []):
+        valid_transactions = self.get_valid_transactions()
+        sorted_transactions = sorted(valid_transactions, key=lambda t: t.date)
         first_transaction_date = sorted_transactions[0].date
-        unique_symbols = sorted(set(transaction.symbol for transaction in self.transactions))
-        self.symbol_cache = SymbolCache(first_transaction_date, QDate.currentDate(), unique_symbols)
+        unique_symbols = sorted(set(transaction.symbol for transaction in valid_transactions))
+
+        # A cache that already covers the history is extended in place, only new symbols and days get downloaded
+        if self.symbol_cache is not None and self.symbol_cache.start_date <= first_transaction_date:
+            self.symbol_cache.add_benchmark_symbols(benchmark_symbols)
+            self.symbol_cache.add_symbols(unique_symbols)
+            self.symbol_cache.extend_to(QDate.currentDate())
+        else:
+            self.symbol_cache = SymbolCache(first_transaction_date, QDate.currentDate(), unique_symbols, benchmark_symbols)
+
+        self.invalidate_ledger()
         if force_populate:
-            self.symbol_cache.populate()
+            self.get_price_source().update()
+
+    def reload_prices(self):
+        # Stored prices are read again and the days after them downloaded, into the cache or, with a memory budget, only into the price store
+        self.symbol_cache.invalidate()
+        self.get_price_source().update()
 
     def get_transactions_between_dates(self, start_date: QDate, end_date: QDate) -> list[Transaction]:
         filtered_transactions = []
         
-        for transaction in self.transactions:
+        for transaction in self.get_valid_transactions():
             if start_date < transaction.date <= end_date:
                 filtered_transactions.append(transaction)
         
         return filtered_transactions
     
     def get_holdings_at_date(self, target_date: QDate, at_close: bool, filter_empty_holdings: bool = True) -> dict[str, float]:
-        holdings = {}
-
-        for transaction in self.transactions:
-            if (transaction.date <= target_date) if at_close else (transaction.date < target_date):
-                if transaction.type == 'buy':
-                    holdings[transaction.symbol] = holdings.get(transaction.symbol, 0) + int(transaction.quantity)
-                elif transaction.type == 'sell':
-                    holdings[transaction.symbol] = holdings.get(transaction.symbol, 0) - int(transaction.quantity)
+        # Shares bought before a split are reported as the shares held after it
+        positions = self.get_positions_at_days(numpy.array([Utils.date_to_day(target_date)]), at_close)[0]
+        holdings = {symbol: float(shares) for symbol, shares in zip(self.get_ledger().symbols, positions)}
 
         if filter_empty_holdings:
             holdings = {symbol: shares for symbol, shares in holdings.items() if shares != 0}
@@ -60,20 +403,72 @@ class Portfolio:
         return holdings_difference
     
     def get_value_at_date(self, date: QDate, at_close: bool):
-        total_portfolio_value = 0
-
-        holdings = self.get_holdings_at_date(date, at_close) # Returns a dict of str, float (symbol, quantity)
+        # Holdings after the day's transactions are valued at the close, holdings before them at the open.
+        # Prices are cleaned when loaded, a position without any price left on the day counts as zero
+        return float(self.get_values_at_days(numpy.array([Utils.date_to_day(date)]), at_close)[0])
+    
+    def get_position_values(self, days: numpy.ndarray, at_close: bool) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        # Only held positions are priced, a portfolio holding a few of many symbols never gathers the others
+        rows, symbol_ids, shares = self.get_position_entries(days, at_close)
+        prices = self.get_price_source().get_symbol_prices_at_points(self.get_ledger().symbols, days[rows], symbol_ids, 'Close' if at_close else 'Open')
+        return rows, symbol_ids, numpy.nan_to_num(shares * prices)
 
-        for symbol, quantity in holdings.items():
-            try:
-                price_at_date = self.symbol_cache.get_symbol_price_at_date(symbol, date)
-                if not numpy.isnan(price_at_date):
-                    total_portfolio_value += quantity * price_at_date
-            except Exception as e:
-                print(f"Error fetching historical price for {symbol}: {e}")
+    def get_values_matrix(self, days: numpy.ndarray, at_close: bool) -> numpy.ndarray:
+        # Value of every symbol (columns) at every day (rows), at the close or at the open like get_value_at_date
+        values = numpy.zeros((len(days), len(self.get_ledger().symbols)))
+        rows, symbol_ids, position_values = self.get_position_values(days, at_close)
+        values[rows, symbol_ids] = position_values
+        return values
 
-        return total_portfolio_value
+    def get_values_at_days(self, days: numpy.ndarray, at_close: bool) -> numpy.ndarray:
+        # Total value at every day, without a (days x symbols) matrix, valued in blocks of days that fit the memory budget
+        values = numpy.zeros(len(days))
+        block_size = self.get_block_size(len(days), len(self.get_ledger().symbols) * Portfolio.bytes_per_position)
+        for start in range(0, len(days), block_size):
+            block_days = days[start:start + block_size]
+            rows, _, position_values = self.get_position_values(block_days, at_close)
+            values[start:start + len(block_days)] = numpy.bincount(rows, weights=position_values, minlength=len(block_days))
+        return values
     
+    def get_dividend_income(self) -> DividendIncome:
+        # Rebuilt when the ledger or the stored prices change
+        price_source = self.get_price_source()
+        if self.dividend_income is None or self.dividend_income.price_source is not price_source or self.dividend_income.version != price_source.version:
+            self.dividend_income = DividendIncome(self.get_split_adjustment(), price_source)
+        return self.dividend_income
+
+    def get_cash_flows_between_days(self, boundary_days: numpy.ndarray) -> numpy.ndarray:
+        cash_flows = self.get_ledger().get_cash_flows_between_days(boundary_days)
+        if self.include_dividends:
+            cash_flows = cash_flows - self.get_dividend_income().get_income_between_days(boundary_days)
+        return cash_flows
+
+    def get_cumulative_cash_flows_at_days(self, days: numpy.ndarray) -> numpy.ndarray:
+        cash_flows = self.get_ledger().get_cumulative_cash_flows_at_days(days)
+        if self.include_dividends:
+            cash_flows = cash_flows - self.get_dividend_income().get_cumulative_income_at_days(days)
+        return cash_flows
+
+    def get_weighted_cash_flows(self, begin_day: int, end_day: int) -> tuple[float, float]:
+        cash_flow, weighted_cash_flow = self.get_ledger().get_weighted_cash_flows(begin_day, end_day)
+        if self.include_dividends:
+            income, weighted_income = self.get_dividend_income().get_weighted_income(begin_day, end_day)
+            cash_flow, weighted_cash_flow = cash_flow - income, weighted_cash_flow - weighted_income
+        return cash_flow, weighted_cash_flow
+
+    def has_cash_flows_at_day(self, day: int) -> bool:
+        # Transactions or, when they are counted, dividends on the day
+        days = numpy.array([day])
+        ledger = self.get_ledger()
+        if ledger.get_transaction_counts(days, True)[0] > ledger.get_transaction_counts(days, False)[0]:
+            return True
+        return self.include_dividends and self.get_dividend_income().get_weighted_income(day, day)[0] != 0
+
+    def get_dividends_between(self, start_date: QDate, end_date: QDate) -> float:
+        if not self.include_dividends:
+            return 0.0
+        return float(self.get_dividend_income().get_income_between_days(Utils.dates_to_days([start_date, end_date])).sum())
+
     def get_cash_flows_between(self, start_date: QDate, end_date: QDate):
         transactions = self.get_transactions_between_dates(start_date, end_date)
 
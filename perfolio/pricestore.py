@@ -0,0 +1,103 @@
+import os
+import re
+import struct
+import zipfile
+import numpy
+
+# Prices of a single symbol, as stored on disk between sessions
+class StoredPrices:
+    def __init__(self, covered_from: int, fetched_through: int, days: numpy.ndarray, prices: dict[str, numpy.ndarray], cleaned_from: int = None, cleaned: dict[str, numpy.ndarray] = None):
+        # Prices are complete from covered_from up to and including fetched_through
+        self.covered_from = covered_from
+        self.fetched_through = fetched_through
+        self.days = days
+        self.prices = prices
+
+        # Cleaned copies of some price types, one entry per day, cleaned over the days from cleaned_from on and NaN before
+        self.cleaned_from = cleaned_from
+        self.cleaned = cleaned if cleaned is not None else {}
+
+class PriceStore:
+    # Array data starts on a multiple of this within the file, so mapped arrays are read in place
+    alignment = 64
+
+    def __init__(self, folder_path: str):
+        self.folder_path = folder_path
+
+    def get_file_path(self, symbol: str) -> str:
+        return os.path.join(self.folder_path, re.sub(r'[^A-Za-z0-9._^=-]', '_', symbol) + ".npz")
+
+    @staticmethod
+    def read_stored_prices(arrays: dict[str, numpy.ndarray], price_types: list[str] = None) -> StoredPrices:
+        def select(prefix: str) -> dict[str, numpy.ndarray]:
+            return {key[len(prefix):]: arrays[key] for key in arrays if key.startswith(prefix) and key != "cleaned_from" and (price_types is None or key[len(prefix):] in price_types)}
+
+        cleaned_from = int(arrays["cleaned_from"]) if "cleaned_from" in arrays else None
+        return StoredPrices(int(arrays["covered_from"]), int(arrays["fetched_through"]), arrays["days"], select("price_"), cleaned_from, select("cleaned_"))
+
+    def load(self, symbol: str, price_types: list[str] = None) -> StoredPrices:
+        file_path = self.get_file_path(symbol)
+        if not os.path.exists(file_path):
+            return None
+
+        try:
+            # Arrays are only read when accessed, asking for some price types leaves the others on disk
+            with numpy.load(file_path) as data:
+                is_wanted = lambda key: price_types is None or not key.startswith(("price_", "cleaned_")) or key == "cleaned_from" or key.split("_", 1)[1] in price_types
+                return PriceStore.read_stored_prices({key: data[key] for key in data.files if is_wanted(key)}, price_types)
+        except Exception as e:
+            print(f"Error reading stored prices for {symbol}: {e}")
+            return None
+
+    def map(self, symbol: str) -> StoredPrices:
+        # Same as load with every array mapped from the file instead of read, only the rows looked at are ever read from disk
+        file_path = self.get_file_path(symbol)
+        if not os.path.exists(file_path):
+            return None
+
+        try:
+            file_map = numpy.memmap(file_path, dtype=numpy.uint8, mode='r')
+            arrays = {}
+            with zipfile.ZipFile(file_path) as archive, open(file_path, 'rb') as file:
+                for info in archive.infolist():
+                    if info.compress_type != zipfile.ZIP_STORED:
+                        return self.load(symbol)
+
+                    # Array data follows the member's local header and its npy header
+                    file.seek(info.header_offset + 26)
+                    name_length, extra_length = struct.unpack('<HH', file.read(4))
+                    file.seek(info.header_offset + 30 + name_length + extra_length)
+                    version = numpy.lib.format.read_magic(file)
+                    read_header = {(1, 0): numpy.lib.format.read_array_header_1_0, (2, 0): numpy.lib.format.read_array_header_2_0}[version]
+                    shape, fortran_order, dtype = read_header(file)
+                    arrays[info.filename.removesuffix(".npy")] = numpy.ndarray(shape, dtype, buffer=file_map, offset=file.tell(), order='F' if fortran_order else 'C')
+            return PriceStore.read_stored_prices(arrays)
+        except Exception as e:
+            print(f"Error mapping stored prices for {symbol}: {e}")
+            return None
+
+    def save(self, symbol: str, stored_prices: StoredPrices):
+        os.makedirs(self.folder_path, exist_ok=True)
+        file_path = self.get_file_path(symbol)
+
+        arrays = {
+            "covered_from": stored_prices.covered_from,
+            "fetched_through": stored_prices.fetched_through,
+            "days": stored_prices.days,
+            **{f"price_{price_type}": values for price_type, values in stored_prices.prices.items()},
+        }
+        if stored_prices.cleaned_from is not None:
+            arrays["cleaned_from"] = stored_prices.cleaned_from
+            arrays.update({f"cleaned_{price_type}": values for price_type, values in stored_prices.cleaned.items()})
+
+        # Written next to the target then swapped in, so an interrupted save never leaves a broken file.
+        # Same layout as numpy.savez, with every member padded so its array data is aligned for map
+        temporary_file_path = file_path + ".tmp.npz"
+        with zipfile.ZipFile(temporary_file_path, 'w', zipfile.ZIP_STORED) as archive:
+            for name, value in arrays.items():
+                info = zipfile.ZipInfo(name + ".npy", (1980, 1, 1, 0, 0, 0))
+                padding = -(archive.fp.tell() + 30 + len(info.filename) + 4) % PriceStore.alignment
+                info.extra = struct.pack('<HH', 0xFFFF, padding) + bytes(padding)
+                with archive.open(info, 'w') as member:
+                    numpy.lib.format.write_array(member, numpy.asanyarray(value), allow_pickle=False)
+        os.replace(temporary_file_path, file_path)
@@ -0,0 +1,66 @@
+import zlib
+
+import numpy
+import pandas
+import yfinance as yf
+
+class YahooPriceProvider:
+    def download(self, symbols: list[str], start: str, end: str) -> pandas.DataFrame:
+        # Actions add the dividends paid on each ex-date
+        return yf.download(symbols, start=start, end=end, actions=True)
+
+# Deterministic synthetic prices, for working without network access and for testing
+class OfflinePriceProvider:
+    origin = "1990-01-01"
+
+    def __init__(self, volatility: float = 0.01, glitch_rate: float = 0.0):
+        self.volatility = volatility
+
+        # Share of days with a bad quote, missing, zero or a one-day spike, like the ones the cleaning removes from real data
+        self.glitch_rate = glitch_rate
+
+    def download(self, symbols: list[str], start: str, end: str) -> pandas.DataFrame:
+        # Business days in [start, end), like yfinance
+        history = pandas.bdate_range(self.origin, pandas.Timestamp(end) - pandas.Timedelta(days=1))
+        in_range = history >= pandas.Timestamp(start)
+
+        columns = {}
+        for symbol in symbols:
+            # Every symbol walks from the same origin so prices do not depend on the requested range
+            generator = numpy.random.default_rng(zlib.crc32(symbol.encode()))
+            base_price = generator.uniform(20, 500)
+            drift = generator.normal(0.0003, 0.0002)
+            traded_close = base_price * numpy.exp(numpy.cumsum(generator.normal(drift, self.volatility, len(history))))
+
+            # About a third of the symbols split once, traded prices drop by the ratio from that day on
+            split_generator = numpy.random.default_rng(zlib.crc32(symbol.encode()) + 2)
+            ratios = numpy.ones(len(history))
+            if split_generator.random() < 1 / 3:
+                split_date = pandas.Timestamp(self.origin) + pandas.Timedelta(days=int(split_generator.integers(365, 35 * 365)))
+                ratios[history == split_date + pandas.offsets.BDay(0)] = float(split_generator.choice([2, 3, 4]))
+            split_factors = numpy.cumprod(ratios)
+            traded_close = traded_close / split_factors
+
+            # Like yfinance, prices and dividends are adjusted for every split up to the end of the range
+            adjustment = split_factors / split_factors[-1] if len(history) else split_factors
+            close = (traded_close * adjustment)[in_range]
+            quoted = close
+            if self.glitch_rate > 0:
+                glitch_generator = numpy.random.default_rng(zlib.crc32(symbol.encode()) + 3)
+                glitches = glitch_generator.choice([1.0, numpy.nan, 0.0, 5.0, 0.2], len(history), p=[1 - self.glitch_rate] + [self.glitch_rate / 4] * 4)
+                quoted = close * glitches[in_range]
+            columns[('Open', symbol)] = quoted * (1 - self.volatility / 2)
+            columns[('Close', symbol)] = quoted
+            columns[('Adj Close', symbol)] = quoted
+            columns[('Stock Splits', symbol)] = numpy.where(ratios > 1, ratios, 0.0)[in_range]
+
+            # About half the symbols pay a quarterly dividend, drawn separately so prices stay the same
+            dividend_generator = numpy.random.default_rng(zlib.crc32(symbol.encode()) + 1)
+            dividend_yield = dividend_generator.choice([0.0, dividend_generator.uniform(0.01, 0.05)])
+            dates = history[in_range]
+            ex_dates = (dates.month % 3 == 0) & (dates.day <= 7) & (dates.dayofweek == 0)
+            columns[('Dividends', symbol)] = numpy.where(ex_dates, close * dividend_yield / 4, 0.0)
+
+        frame = pandas.DataFrame(columns, index=history[in_range])
+        frame.columns = pandas.MultiIndex.from_tuples(list(columns.keys()))
+        return frame
@@ -0,0 +1,161 @@
+import numpy
+
+from perfolio.output import Column
+
+class PriceQualityReport:
+    def __init__(self, symbols: list[str], price_types: list[str], counts: numpy.ndarray, missing: numpy.ndarray, invalid: numpy.ndarray, spikes: numpy.ndarray, filled: numpy.ndarray, unfilled: numpy.ndarray, longest_flat_runs: numpy.ndarray, last_days: numpy.ndarray, stale: numpy.ndarray):
+        # One entry per symbol and price type, counts are days between the first and the last price of the series
+        self.symbols = symbols
+        self.price_types = price_types
+        self.counts = counts
+        self.missing = missing
+        self.invalid = invalid
+        self.spikes = spikes
+        self.filled = filled
+        self.unfilled = unfilled
+        self.longest_flat_runs = longest_flat_runs
+        self.last_days = last_days
+        self.stale = stale
+
+    @staticmethod
+    def concatenate(reports: list['PriceQualityReport']) -> 'PriceQualityReport':
+        return PriceQualityReport(
+            [symbol for report in reports for symbol in report.symbols],
+            [price_type for report in reports for price_type in report.price_types],
+            *[numpy.concatenate([getattr(report, name) for report in reports]) for name in ("counts", "missing", "invalid", "spikes", "filled", "unfilled", "longest_flat_runs", "last_days", "stale")]
+        )
+
+    def get_issues(self) -> numpy.ndarray:
+        return (self.missing > 0) | (self.invalid > 0) | (self.spikes > 0) | self.stale
+
+    def get_issue_count(self) -> int:
+        return int(numpy.count_nonzero(self.get_issues()))
+
+    def get_columns(self, only_issues: bool = True) -> list[Column]:
+        rows = numpy.flatnonzero(self.get_issues()) if only_issues else numpy.arange(len(self.symbols))
+        return [
+            Column("Symbol", [self.symbols[row] for row in rows]),
+            Column("Price Type", [self.price_types[row] for row in rows]),
+            Column("Prices", self.counts[rows], "integer"),
+            Column("Missing", self.missing[rows], "integer"),
+            Column("Zero or Negative", self.invalid[rows], "integer"),
+            Column("Spikes", self.spikes[rows], "integer"),
+            Column("Filled", self.filled[rows], "integer"),
+            Column("Left Missing", self.unfilled[rows], "integer"),
+            Column("Longest Flat Run", self.longest_flat_runs[rows], "integer"),
+            Column("Last Price", self.last_days[rows], "date"),
+            Column("Stale", ["Yes" if stale else "No" for stale in self.stale[rows]]),
+        ]
+
+# Cleans (day x symbol) price matrices in a single vectorized pass, every column on its own
+class PriceCleaner:
+    # Prices that are not one-off events, dividends and splits are left as they are, Adj Close is derived from the cleaned close
+    cleaned_price_types = ['Open', 'Close']
+
+    # A missing price takes the last one up to this many calendar days later, covering holidays and short outages
+    fill_limit_days = 7
+
+    # Robust z-score (median and MAD of the log returns) a jump and its reversal must both exceed to be a spike
+    spike_threshold = 10.0
+
+    # Series whose price did not move for this many trading days, or without a price for this many calendar days, are stale
+    stale_run_days = 10
+    stale_days = 14
+
+    @staticmethod
+    def get_previous_rows(valid: numpy.ndarray) -> numpy.ndarray:
+        # Row of the last valid price at or before every row, -1 before the first one
+        rows = numpy.arange(len(valid))[:, numpy.newaxis]
+        return numpy.maximum.accumulate(numpy.where(valid, rows, -1), axis=0)
+
+    @staticmethod
+    def get_next_rows(valid: numpy.ndarray) -> numpy.ndarray:
+        # Row of the next valid price at or after every row, len(valid) after the last one
+        rows = numpy.arange(len(valid))[:, numpy.newaxis]
+        return numpy.minimum.accumulate(numpy.where(valid, rows, len(valid))[::-1], axis=0)[::-1]
+
+    @staticmethod
+    def get_spikes(prices: numpy.ndarray, valid: numpy.ndarray) -> numpy.ndarray:
+        # A price jumping away from its neighbours and straight back, a move that holds is a real one.
+        # Rows of the valid prices strictly before and after every row
+        columns = numpy.arange(prices.shape[1])
+        previous_rows = numpy.vstack((numpy.full((1, prices.shape[1]), -1), PriceCleaner.get_previous_rows(valid)))[:-1]
+        next_rows = numpy.vstack((PriceCleaner.get_next_rows(valid), numpy.full((1, prices.shape[1]), len(prices))))[1:]
+
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            log_prices = numpy.log(prices)
+        has_previous = valid & (previous_rows >= 0)
+        returns = numpy.where(has_previous, log_prices - log_prices[previous_rows.clip(min=0), columns], numpy.nan)
+
+        # Medians only over columns with returns, an empty column has no scale and no spike
+        medians = numpy.zeros(prices.shape[1])
+        deviations = numpy.zeros(prices.shape[1])
+        with_returns = has_previous.any(axis=0)
+        if with_returns.any():
+            medians[with_returns] = numpy.nanmedian(returns[:, with_returns], axis=0)
+            deviations[with_returns] = numpy.nanmedian(numpy.abs(returns[:, with_returns] - medians[with_returns]), axis=0)
+
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            scores = numpy.where(has_previous & (deviations > 0), 0.6745 * (returns - medians) / deviations, 0.0)
+        has_next = next_rows < len(prices)
+        next_scores = numpy.where(has_next, scores[next_rows.clip(max=len(prices) - 1), columns], 0.0)
+
+        return valid & (numpy.abs(scores) > PriceCleaner.spike_threshold) & (numpy.abs(next_scores) > PriceCleaner.spike_threshold) & (numpy.sign(scores) != numpy.sign(next_scores))
+
+    @staticmethod
+    def fill(days: numpy.ndarray, prices: numpy.ndarray) -> numpy.ndarray:
+        # Forward fill, up to fill_limit_days after the last price
+        columns = numpy.arange(prices.shape[1])
+        previous_rows = PriceCleaner.get_previous_rows(~numpy.isnan(prices))
+        gaps = days[:, numpy.newaxis] - days[previous_rows.clip(min=0)]
+        fillable = numpy.isnan(prices) & (previous_rows >= 0) & (gaps <= PriceCleaner.fill_limit_days)
+        return numpy.where(fillable, prices[previous_rows.clip(min=0), columns], prices)
+
+    @staticmethod
+    def clean(days: numpy.ndarray, prices: numpy.ndarray) -> numpy.ndarray:
+        # Zero and negative prices, then spikes, are dropped and the gaps filled, each column only depends on its own prices
+        valid = ~numpy.isnan(prices) & (prices > 0)
+        valid &= ~PriceCleaner.get_spikes(prices, valid)
+        return PriceCleaner.fill(days, numpy.where(valid, prices, numpy.nan))
+
+    @staticmethod
+    def clean_with_report(days: numpy.ndarray, prices: numpy.ndarray, symbols: list[str], price_type: str) -> tuple[numpy.ndarray, PriceQualityReport]:
+        # Same cleaning, along with what it decided for every column
+        priced = ~numpy.isnan(prices)
+        valid = priced & (prices > 0)
+        spikes = PriceCleaner.get_spikes(prices, valid)
+        kept = valid & ~spikes
+        cleaned = PriceCleaner.fill(days, numpy.where(kept, prices, numpy.nan))
+
+        # Only the days from the first to the last price of each series count, before and after it the symbol did not trade
+        listed = (PriceCleaner.get_previous_rows(priced) >= 0) & (PriceCleaner.get_next_rows(priced) < len(prices))
+        missing = listed & ~priced
+        filled = listed & ~kept & ~numpy.isnan(cleaned)
+
+        # Runs of prices equal to the previous one, a day without a price ends the run
+        columns = numpy.arange(prices.shape[1])
+        previous_rows = numpy.vstack((numpy.full((1, prices.shape[1]), -1), PriceCleaner.get_previous_rows(valid)))[:-1]
+        unchanged = valid & (previous_rows >= 0) & (prices == prices[previous_rows.clip(min=0), columns])
+        run_totals = numpy.cumsum(unchanged, axis=0)
+        runs = run_totals - numpy.maximum.accumulate(numpy.where(unchanged, 0, run_totals), axis=0)
+        longest_flat_runs = runs.max(axis=0, initial=0)
+
+        # A series that stopped well before the others is stale too, e.g. a delisted symbol
+        last_rows = PriceCleaner.get_previous_rows(valid)[-1] if len(prices) else numpy.full(prices.shape[1], -1)
+        last_days = numpy.where(last_rows >= 0, days[last_rows.clip(min=0)] if len(prices) else 0, 0)
+        end_day = days[-1] if len(days) else 0
+        stale = (last_rows >= 0) & ((longest_flat_runs >= PriceCleaner.stale_run_days) | (last_days < end_day - PriceCleaner.stale_days))
+
+        return cleaned, PriceQualityReport(
+            list(symbols),
+            [price_type] * len(symbols),
+            numpy.count_nonzero(listed, axis=0),
+            numpy.count_nonzero(missing, axis=0),
+            numpy.count_nonzero(priced & ~valid, axis=0),
+            numpy.count_nonzero(spikes, axis=0),
+            numpy.count_nonzero(filled, axis=0),
+            numpy.count_nonzero(listed & numpy.isnan(cleaned), axis=0),
+            longest_flat_runs,
+            last_days,
+            stale
+        )
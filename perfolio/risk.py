@@ -0,0 +1,99 @@
+import numpy
+
+from PySide6.QtCore import QDate
+from perfolio.portfolio import Portfolio
+from perfolio.utils import Utils
+
+TRADING_DAYS_PER_YEAR = 252
+
+class DailyReturns:
+    def __init__(self, days: numpy.ndarray, values: numpy.ndarray, returns: numpy.ndarray):
+        # returns[i] is the flow-adjusted return from days[i] to days[i + 1], NaN when nothing was held
+        self.days = days
+        self.values = values
+        self.returns = returns
+
+class RiskMetrics:
+    def __init__(self, annualized_return: float, volatility: float, sharpe_ratio: float, sortino_ratio: float, max_drawdown: float, peak_day: int, trough_day: int, recovery_day: int, beta: float):
+        self.annualized_return = annualized_return
+        self.volatility = volatility
+        self.sharpe_ratio = sharpe_ratio
+        self.sortino_ratio = sortino_ratio
+        self.max_drawdown = max_drawdown
+        self.peak_day = peak_day
+        self.trough_day = trough_day
+        self.recovery_day = recovery_day
+        self.beta = beta
+
+class RiskProcessor:
+    @staticmethod
+    def get_trading_days(portfolio: Portfolio, begin_date: QDate, end_date: QDate) -> numpy.ndarray:
+        days = portfolio.get_price_source().get_days()
+        return days[(days >= Utils.date_to_day(begin_date)) & (days <= Utils.date_to_day(end_date))]
+
+    @staticmethod
+    def calculate_daily_returns(portfolio: Portfolio, begin_date: QDate, end_date: QDate) -> DailyReturns:
+        days = RiskProcessor.get_trading_days(portfolio, begin_date, end_date)
+
+        # One valuation pass over every trading day, cash flows are removed from each day's change
+        values = portfolio.get_values_at_days(days, True)
+        cash_flows = numpy.diff(portfolio.get_cumulative_cash_flows_at_days(days))
+
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            returns = numpy.where(values[:-1] != 0, (values[1:] - cash_flows) / values[:-1] - 1, numpy.nan)
+
+        return DailyReturns(days, values, returns)
+
+    @staticmethod
+    def calculate_growth_index(returns: numpy.ndarray) -> numpy.ndarray:
+        # Growth of 1 invested on the first day, one entry per day, days without return are flat
+        return numpy.concatenate(([1.0], numpy.cumprod(1 + numpy.nan_to_num(returns))))
+
+    @staticmethod
+    def calculate_drawdowns(growth: numpy.ndarray) -> numpy.ndarray:
+        return growth / numpy.maximum.accumulate(growth) - 1
+
+    @staticmethod
+    def calculate_risk_metrics(daily_returns: DailyReturns, risk_free_rate: float, benchmark_prices: numpy.ndarray = None) -> RiskMetrics:
+        returns = daily_returns.returns
+        valid_returns = returns[~numpy.isnan(returns)]
+        count = len(valid_returns)
+
+        daily_risk_free_rate = (1 + risk_free_rate) ** (1 / TRADING_DAYS_PER_YEAR) - 1
+        excess_returns = valid_returns - daily_risk_free_rate
+
+        annualized_return = numpy.prod(1 + valid_returns) ** (TRADING_DAYS_PER_YEAR / count) - 1 if count > 0 else numpy.nan
+        daily_volatility = numpy.std(valid_returns, ddof=1) if count > 1 else numpy.nan
+        downside_deviation = numpy.sqrt(numpy.mean(numpy.minimum(excess_returns, 0) ** 2)) if count > 0 else numpy.nan
+
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            sharpe_ratio = numpy.mean(excess_returns) / daily_volatility * numpy.sqrt(TRADING_DAYS_PER_YEAR) if count > 1 else numpy.nan
+            sortino_ratio = numpy.mean(excess_returns) / downside_deviation * numpy.sqrt(TRADING_DAYS_PER_YEAR) if count > 0 else numpy.nan
+
+        growth = RiskProcessor.calculate_growth_index(returns)
+        drawdowns = RiskProcessor.calculate_drawdowns(growth)
+        trough_index = int(numpy.argmin(drawdowns))
+        peak_index = int(numpy.argmax(growth[:trough_index + 1]))
+        recovery_indices = numpy.flatnonzero(growth[trough_index:] >= growth[peak_index]) + trough_index
+        recovery_indices = recovery_indices[recovery_indices > trough_index]
+        days = daily_returns.days
+
+        beta = numpy.nan
+        if benchmark_prices is not None:
+            benchmark_returns = benchmark_prices[1:] / benchmark_prices[:-1] - 1
+            paired = ~numpy.isnan(returns) & ~numpy.isnan(benchmark_returns)
+            if numpy.count_nonzero(paired) > 1:
+                covariance = numpy.cov(returns[paired], benchmark_returns[paired])
+                beta = covariance[0, 1] / covariance[1, 1] if covariance[1, 1] != 0 else numpy.nan
+
+        return RiskMetrics(
+            annualized_return,
+            daily_volatility * numpy.sqrt(TRADING_DAYS_PER_YEAR),
+            sharpe_ratio,
+            sortino_ratio,
+            drawdowns[trough_index],
+            days[peak_index] if len(days) else None,
+            days[trough_index] if len(days) else None,
+            days[recovery_indices[0]] if len(recovery_indices) else None,
+            beta
+        )
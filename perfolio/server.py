@@ -0,0 +1,246 @@
+import asyncio
+import json
+import os
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from PySide6.QtCore import Qt, QDate
+from perfolio.operations import Operation, OperationRegistry
+from perfolio.output import Output, Table
+from perfolio.portfolio import Portfolio
+from perfolio.providers import OfflinePriceProvider
+from perfolio.settings import AppSettings
+from perfolio.shadow import ShadowMode
+from perfolio.symbol import SymbolCache
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+class OperationResult:
+    def __init__(self, operation: Operation, success: bool, texts: list[str], tables: list[Table]):
+        self.operation = operation
+        self.success = success
+        self.texts = texts
+        self.tables = tables
+
+# Portfolio kept in memory between requests, along with its price cache
+class LoadedPortfolio:
+    def __init__(self, file_paths: list[str]):
+        self.file_paths = file_paths
+        self.modification_times = None
+        self.portfolio = Portfolio()
+
+        # Portfolios (ledger, price cache) are not thread safe, one operation at a time per portfolio
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        modification_times = [os.path.getmtime(file_path) for file_path in self.file_paths]
+        if modification_times != self.modification_times:
+            self.portfolio.load_data_from_csvs(self.file_paths)
+            self.portfolio.update_symbol_cache(False, AppSettings.get_list("benchmark_symbols"))
+            self.modification_times = modification_times
+
+class AnalysisServer:
+    reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+    stream_chunk_size = 4096
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, max_workers: int = 4):
+        self.host = host
+        self.port = port
+        self.executor = ThreadPoolExecutor(max_workers)
+        self.portfolios = dict[str, LoadedPortfolio]()
+        self.portfolios_lock = threading.Lock()
+
+        # Identical queries running at the same time share a single computation
+        self.in_flight = dict[str, asyncio.Future]()
+
+    async def start(self) -> asyncio.AbstractServer:
+        server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+        return server
+
+    async def serve_forever(self):
+        server = await self.start()
+        print(f"Perfolio API listening on http://{self.host}:{self.port}")
+        async with server:
+            await server.serve_forever()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            method, path, body = await self.read_request(reader)
+            await self.route(method, path, body, writer)
+        except HTTPError as e:
+            await self.send_json(writer, e.status, {"error": str(e)})
+        except Exception as e:
+            await self.send_json(writer, 500, {"error": str(e)})
+        finally:
+            writer.close()
+
+    async def read_request(self, reader: asyncio.StreamReader) -> tuple[str, str, bytes]:
+        request_line = (await reader.readline()).decode("latin-1").split()
+        if len(request_line) != 3:
+            raise HTTPError(400, "Malformed request line.")
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        content_length = int(headers.get("content-length", 0))
+        body = await reader.readexactly(content_length) if content_length > 0 else b""
+        return request_line[0].upper(), urlsplit(request_line[1]).path, body
+
+    async def route(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter):
+        parts = [part for part in path.split("/") if part]
+
+        if parts == ["operations"]:
+            if method != "GET":
+                raise HTTPError(405, "Use GET to list operations.")
+            await self.send_json(writer, 200, self.list_operations())
+        elif len(parts) == 2 and parts[0] == "operations":
+            if method != "POST":
+                raise HTTPError(405, "Use POST to run an operation.")
+            try:
+                request = json.loads(body or b"{}")
+            except json.JSONDecodeError as e:
+                raise HTTPError(400, f"Invalid JSON body: {e}")
+            result = await self.run_operation_coalesced(parts[1], request)
+            await self.send_result(writer, result)
+        else:
+            raise HTTPError(404, f"Unknown endpoint: {path}")
+
+    def list_operations(self) -> list[dict]:
+        return [
+            {
+                "hash": entry.hash,
+                "category": entry.category,
+                "name": entry.name,
+                "endpoint": f"/operations/{entry.hash}",
+            }
+            for entry in OperationRegistry.get_entries()
+        ]
+
+    async def run_operation_coalesced(self, hashcode: str, request: dict) -> OperationResult:
+        key = json.dumps([hashcode, request], sort_keys=True)
+
+        future = self.in_flight.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(self.executor, self.run_operation, hashcode, request)
+            self.in_flight[key] = future
+            future.add_done_callback(lambda _: self.in_flight.pop(key, None))
+
+        return await asyncio.shield(future)
+
+    def get_loaded_portfolio(self, file_paths: list[str]) -> LoadedPortfolio:
+        file_paths = [os.path.abspath(file_path) for file_path in file_paths]
+        for file_path in file_paths:
+            if not os.path.exists(file_path):
+                raise HTTPError(404, f"Portfolio not found: {file_path}")
+
+        # The same files in the same order share one loaded portfolio
+        key = "\n".join(file_paths)
+        with self.portfolios_lock:
+            if key not in self.portfolios:
+                self.portfolios[key] = LoadedPortfolio(file_paths)
+            return self.portfolios[key]
+
+    @staticmethod
+    def convert_settings(operation: Operation, values: dict) -> dict:
+        settings = {}
+
+        # Dates are given as ISO strings, anything else is passed as is
+        for key, setting in operation.get_settings_desc().items():
+            if key in values:
+                value = values[key]
+                if isinstance(setting.default, QDate):
+                    value = QDate.fromString(str(value), Qt.DateFormat.ISODate)
+                    if not value.isValid():
+                        raise HTTPError(400, f"Invalid date for setting '{key}': {values[key]}")
+                settings[key] = value
+
+        return settings
+
+    def run_operation(self, hashcode: str, request: dict) -> OperationResult:
+        OperationRegistry.load_plugins()
+        entry = OperationRegistry.hashes.get(hashcode)
+        if entry is None:
+            raise HTTPError(404, f"Unknown operation: {hashcode}")
+        if "portfolio" not in request:
+            raise HTTPError(400, "Missing 'portfolio' (path to a CSV file, or a list of them).")
+        file_paths = request["portfolio"] if isinstance(request["portfolio"], list) else [request["portfolio"]]
+        if not file_paths:
+            raise HTTPError(400, "No portfolio file given.")
+
+        # Registered instances hold their settings while running, requests get their own
+        operation = type(entry.get_instance())(entry.category, entry.name)
+        settings = self.convert_settings(operation, request.get("settings", {}))
+
+        texts = []
+        tables = []
+        output = Output()
+        output.register_callbacks(texts.append, tables.append)
+
+        loaded_portfolio = self.get_loaded_portfolio(file_paths)
+        with loaded_portfolio.lock:
+            loaded_portfolio.refresh()
+
+            # An account narrows the analysis to its own transactions, all accounts are combined otherwise
+            account = request.get("account")
+            if account is not None and account not in loaded_portfolio.portfolio.get_accounts():
+                raise HTTPError(404, f"Unknown account: {account}")
+            portfolio = loaded_portfolio.portfolio.get_account_portfolio(account)
+            success = operation.execute_with_settings(settings, portfolio, output)
+            if ShadowMode.is_enabled():
+                ShadowMode.run(operation, settings, portfolio)
+
+        return OperationResult(operation, success, texts, tables)
+
+    async def send_json(self, writer: asyncio.StreamWriter, status: int, payload):
+        body = json.dumps(payload).encode()
+        writer.write(f"HTTP/1.1 {status} {self.reasons.get(status, '')}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode())
+        writer.write(body)
+        await writer.drain()
+
+    async def send_result(self, writer: asyncio.StreamWriter, result: OperationResult):
+        # Tables are streamed in chunks, straight from their typed columns
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nTransfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+
+        async def write_chunk(text: str):
+            data = text.encode()
+            writer.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+            await writer.drain()
+
+        await write_chunk(json.dumps({"operation": result.operation.name, "success": result.success, "texts": result.texts})[:-1] + ', "tables": [')
+
+        for table_index, table in enumerate(result.tables):
+            columns = [{"name": column.name, "format": column.format} for column in table.columns]
+            await write_chunk(("," if table_index else "") + json.dumps({"name": table.name, "columns": columns})[:-1] + ', "rows": [')
+
+            separator = ""
+            for rows in table.iterate_json_rows(self.stream_chunk_size):
+                await write_chunk(separator + json.dumps(rows)[1:-1])
+                separator = ","
+
+            await write_chunk("]}")
+
+        await write_chunk("]}")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+def serve(host: str, port: int, offline: bool = False) -> int:
+    if offline:
+        SymbolCache.price_provider = OfflinePriceProvider()
+
+    server = AnalysisServer(host, port)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
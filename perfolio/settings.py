@@ -112,7 +112,11 @@ class SettingFactory:
 class AppSettings:
     settings_desc = {
         "theme": SettingFactory.list("Theme (restart to apply)", ["auto", "light", "dark"], "auto"),
-        "auto_load_historical_prices": SettingFactory.bool("Automatically Load Historical Prices", False)
+        "auto_load_historical_prices": SettingFactory.bool("Automatically Load Historical Prices", False),
+        "benchmark_symbols": SettingFactory.string("Benchmark Symbols", "SPY", "Comma separated symbols, e.g. SPY, QQQ"),
+        "include_dividends": SettingFactory.bool("Include Dividends in Returns", True),
+        "memory_budget": SettingFactory.integer("Valuation Memory Budget (MB, 0 for Unlimited)", 0),
+        "shadow_mode": SettingFactory.bool("Shadow Mode (Check Results Against the Reference Engine)", False)
     }
     
     settings = {}
@@ -125,6 +129,11 @@ class AppSettings:
         else:
             return AppSettings.settings[setting_id]
     
+    @staticmethod
+    def get_list(setting_id: str, force_default=False) -> list[str]:
+        value = AppSettings.get(setting_id, force_default)
+        return [item.strip() for item in value.split(",") if item.strip()]
+    
     @staticmethod
     def set(setting_id: str, value):
         AppSettings.settings[setting_id] = value
@@ -0,0 +1,552 @@
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy
+
+from PySide6.QtCore import Qt, QDate
+from perfolio.backtest import BacktestProcessor
+from perfolio.operations import Operation, OperationRegistry
+from perfolio.output import Chart, Output, Table
+from perfolio.periodic import PeriodicReturnsProcessor
+from perfolio.portfolio import Portfolio, Transaction
+from perfolio.pricestore import PriceStore
+from perfolio.providers import OfflinePriceProvider
+from perfolio.settings import AppSettings
+from perfolio.symbol import SymbolCache
+from perfolio.twr import TWRPeriod, TWRProcessor, TWRResult
+from perfolio.utils import Utils
+
+# The same transactions and prices valued the straightforward way, one transaction, symbol and day at a time
+class ReferencePortfolio(Portfolio):
+    def __init__(self, portfolio: Portfolio):
+        self.clear()
+        self.file_path = portfolio.file_path
+        self.file_paths = portfolio.file_paths
+        self.transactions = portfolio.transactions
+        self.symbol_cache = portfolio.symbol_cache
+        self.include_dividends = portfolio.include_dividends
+        self.splits = {}
+        self.dividend_events = None
+
+    def get_price(self, symbol: str, day: int, price_type: str) -> float:
+        try:
+            return float(self.symbol_cache.get_symbol_price_at_date(symbol, Utils.day_to_date(day), price_type))
+        except ValueError:
+            return numpy.nan
+
+    def get_events(self, symbol: str, price_type: str) -> list[tuple[int, float]]:
+        days = self.symbol_cache.get_days()
+        values = self.symbol_cache.get_symbol_prices_at_days([symbol], days, price_type)[:, 0]
+        return [(int(day), float(value)) for day, value in zip(days, values) if value > 0]
+
+    def get_splits(self, symbol: str) -> list[tuple[int, float]]:
+        if self.symbol_cache is None:
+            return []
+        if symbol not in self.splits:
+            self.splits[symbol] = [(day, ratio) for day, ratio in self.get_events(symbol, 'Stock Splits') if ratio != 1]
+        return self.splits[symbol]
+
+    def get_holdings_at_date(self, target_date: QDate, at_close: bool, filter_empty_holdings: bool = True) -> dict[str, float]:
+        target_day = Utils.date_to_day(target_date)
+        holdings = {symbol: 0.0 for symbol in self.get_ledger().symbols}
+
+        for transaction in sorted(self.get_valid_transactions(), key=lambda t: t.date):
+            day = Utils.date_to_day(transaction.date)
+            if day > target_day or (day == target_day and not at_close):
+                continue
+
+            # Every split after the transaction, up to the open of the target day, multiplies its shares
+            shares = float(transaction.quantity) * (-1.0 if transaction.type == 'sell' else 1.0)
+            for split_day, ratio in self.get_splits(transaction.symbol):
+                if day < split_day <= target_day:
+                    shares *= ratio
+            holdings[transaction.symbol] += shares
+
+        if filter_empty_holdings:
+            holdings = {symbol: shares for symbol, shares in holdings.items() if shares != 0}
+        return holdings
+
+    def get_value_at_date(self, date: QDate, at_close: bool):
+        total_portfolio_value = 0.0
+        day = Utils.date_to_day(date)
+        for symbol, quantity in self.get_holdings_at_date(date, at_close).items():
+            price = self.get_price(symbol, day, 'Close' if at_close else 'Open')
+            if not numpy.isnan(price):
+                total_portfolio_value += quantity * price
+        return total_portfolio_value
+
+    def get_positions_at_days(self, days: numpy.ndarray, at_close: bool) -> numpy.ndarray:
+        symbols = self.get_ledger().symbols
+        return numpy.array([[self.get_holdings_at_date(Utils.day_to_date(day), at_close, False)[symbol] for symbol in symbols] for day in days]).reshape(len(days), len(symbols))
+
+    def get_position_entries(self, days: numpy.ndarray, at_close: bool) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        positions = self.get_positions_at_days(days, at_close)
+        rows, symbol_ids = numpy.nonzero(positions)
+        return rows, symbol_ids, positions[rows, symbol_ids]
+
+    def get_values_matrix(self, days: numpy.ndarray, at_close: bool) -> numpy.ndarray:
+        symbols = self.get_ledger().symbols
+        values = numpy.zeros((len(days), len(symbols)))
+        for row, day in enumerate(days):
+            holdings = self.get_holdings_at_date(Utils.day_to_date(day), at_close, False)
+            for column, symbol in enumerate(symbols):
+                price = self.get_price(symbol, day, 'Close' if at_close else 'Open')
+                if holdings[symbol] != 0 and not numpy.isnan(price):
+                    values[row, column] = holdings[symbol] * price
+        return values
+
+    def get_values_at_days(self, days: numpy.ndarray, at_close: bool) -> numpy.ndarray:
+        return numpy.array([self.get_value_at_date(Utils.day_to_date(day), at_close) for day in days], dtype=float)
+
+    def get_dividend_events(self) -> list[tuple[int, str, float]]:
+        # Shares held at the open of the ex-date receive the dividend
+        if self.dividend_events is None:
+            self.dividend_events = [
+                (day, symbol, self.get_holdings_at_date(Utils.day_to_date(day), False, False)[symbol] * dividend)
+                for symbol in self.get_ledger().symbols
+                for day, dividend in self.get_events(symbol, 'Dividends')
+            ]
+        return self.dividend_events
+
+    def get_flows(self) -> list[tuple[int, str, float]]:
+        # Purchases are money in, sales and received dividends money out
+        flows = [
+            (Utils.date_to_day(transaction.date), transaction.symbol, float(transaction.quantity) * float(transaction.price) * (-1.0 if transaction.type == 'sell' else 1.0))
+            for transaction in self.get_valid_transactions()
+        ]
+        if self.include_dividends and self.symbol_cache is not None:
+            flows += [(day, symbol, -income) for day, symbol, income in self.get_dividend_events()]
+        return flows
+
+    def get_cash_flows_between_days(self, boundary_days: numpy.ndarray) -> numpy.ndarray:
+        symbols = self.get_ledger().symbols
+        cash_flows = numpy.zeros((max(len(boundary_days) - 1, 0), len(symbols)))
+        for day, symbol, amount in self.get_flows():
+            for row in range(len(boundary_days) - 1):
+                if boundary_days[row] < day <= boundary_days[row + 1]:
+                    cash_flows[row, symbols.index(symbol)] += amount
+        return cash_flows
+
+    def get_cumulative_cash_flows_at_days(self, days: numpy.ndarray) -> numpy.ndarray:
+        flows = self.get_flows()
+        return numpy.array([sum(amount for flow_day, _, amount in flows if flow_day <= day) for day in days], dtype=float)
+
+    def get_weighted_cash_flows(self, begin_day: int, end_day: int) -> tuple[float, float]:
+        cash_flow = 0.0
+        weighted_cash_flow = 0.0
+        for day, _, amount in self.get_flows():
+            if begin_day <= day <= end_day:
+                cash_flow += amount
+                weighted_cash_flow += amount * ((end_day - day) / (end_day - begin_day) if end_day > begin_day else 1.0)
+        return cash_flow, weighted_cash_flow
+
+    def get_dividends_between(self, start_date: QDate, end_date: QDate) -> float:
+        if not self.include_dividends or self.symbol_cache is None:
+            return 0.0
+        start_day = Utils.date_to_day(start_date)
+        end_day = Utils.date_to_day(end_date)
+        return sum(income for day, _, income in self.get_dividend_events() if start_day < day <= end_day)
+
+    def calculate_own_twr(self, begin_date: QDate, end_date: QDate) -> TWRResult:
+        # One period per transaction date, valued and netted of cash flows one after the other, so operations run
+        # in shadow mode compare TWRProcessor.calculate_twr against this loop
+        period_dates = sorted(set(transaction.date for transaction in self.get_transactions_between_dates(begin_date, end_date)))
+        if not period_dates or period_dates[-1] != end_date:
+            period_dates.append(end_date)
+
+        symbol_count = len(self.get_ledger().symbols)
+        periods = []
+        boundary_days = [Utils.date_to_day(begin_date)]
+        twr = 1.0
+        contributions = numpy.zeros(symbol_count)
+        weighted_lengths = numpy.zeros(symbol_count)
+        gains_losses = numpy.zeros(symbol_count)
+        total_length = 0
+        previous_date = begin_date
+        previous_values = self.get_values_matrix(numpy.array(boundary_days), False)[0]
+        for period_date in period_dates:
+            if period_date == previous_date:
+                continue
+            period_day = Utils.date_to_day(period_date)
+            values = self.get_values_matrix(numpy.array([period_day]), True)[0]
+            cash_flows = self.get_cash_flows_between_days(numpy.array([boundary_days[-1], period_day]))[0]
+            previous_value, value, cash_flow = previous_values.sum(), values.sum(), cash_flows.sum()
+            growth_factor = (value - cash_flow) / previous_value if previous_value != 0 else 1.0
+            periods.append(TWRPeriod(previous_date, period_date, growth_factor - 1, growth_factor, previous_value, value, cash_flow, value - previous_value - cash_flow))
+
+            # Each symbol's gain over the period, as a share of the growth so far, and its weight over the period's length
+            symbol_gains_losses = values - previous_values - cash_flows
+            if previous_value != 0:
+                contributions += symbol_gains_losses / previous_value * twr
+                weighted_lengths += previous_values / previous_value * (period_day - boundary_days[-1])
+                total_length += period_day - boundary_days[-1]
+            gains_losses += symbol_gains_losses
+            if not numpy.isnan(growth_factor):
+                twr *= growth_factor
+
+            boundary_days.append(period_day)
+            previous_date = period_date
+            previous_values = values
+
+        weights = weighted_lengths / total_length if total_length > 0 else numpy.zeros(symbol_count)
+        return TWRResult(periods, twr - 1, self.get_ledger().symbols, numpy.array(boundary_days, dtype=numpy.int64), contributions, weights, gains_losses)
+
+class ShadowMismatch:
+    def __init__(self, location: str, optimized, reference):
+        self.location = location
+        self.optimized = optimized
+        self.reference = reference
+
+    def __str__(self) -> str:
+        return f"{self.location}: optimized {self.optimized!r}, reference {self.reference!r}"
+
+class ShadowReport:
+    def __init__(self, name: str, optimized_duration: float, reference_duration: float, compared: int, mismatches: list[ShadowMismatch]):
+        self.name = name
+        self.optimized_duration = optimized_duration
+        self.reference_duration = reference_duration
+        self.compared = compared
+        self.mismatches = mismatches
+
+    def get_speedup(self) -> float:
+        return self.reference_duration / self.optimized_duration if self.optimized_duration > 0 else numpy.inf
+
+    def get_summary(self) -> str:
+        status = f"{len(self.mismatches)} mismatches" if self.mismatches else "match"
+        return f"{self.name}: {status} in {self.compared} values, optimized {self.optimized_duration * 1000:.1f} ms, reference {self.reference_duration * 1000:.1f} ms, speedup {self.get_speedup():.1f}x"
+
+# Runs operations on the optimized engine and on the reference one, and reports where their results differ
+class ShadowMode:
+    relative_tolerance = 1e-9
+    absolute_tolerance = 1e-6
+
+    # Mismatches written per report, the count is always given
+    max_logged_mismatches = 20
+
+    # Set from the command line for the session only, the saved setting is left as it is
+    forced = False
+
+    number_pattern = re.compile(r"-?\d[\d,]*(?:\.(\d+))?")
+
+    @staticmethod
+    def is_enabled() -> bool:
+        return ShadowMode.forced or AppSettings.get("shadow_mode")
+
+    @staticmethod
+    def capture(operation: Operation, settings: dict, portfolio: Portfolio) -> tuple[bool, list, float]:
+        results = []
+        output = Output()
+        output.register_callbacks(results.append, results.append, results.append)
+
+        start = time.perf_counter()
+        try:
+            success = operation.execute_with_settings(settings, portfolio, output)
+        except Exception as e:
+            success = False
+            results.append(f"Error: {e}")
+        return success, results, time.perf_counter() - start
+
+    @staticmethod
+    def is_close(optimized: float, reference: float) -> bool:
+        if numpy.isnan(optimized) or numpy.isnan(reference):
+            return bool(numpy.isnan(optimized) and numpy.isnan(reference))
+        return abs(optimized - reference) <= ShadowMode.absolute_tolerance + ShadowMode.relative_tolerance * abs(reference)
+
+    @staticmethod
+    def compare_numbers(location: str, optimized: numpy.ndarray, reference: numpy.ndarray, mismatches: list[ShadowMismatch]) -> int:
+        optimized = numpy.asarray(optimized, dtype=float).ravel()
+        reference = numpy.asarray(reference, dtype=float).ravel()
+        if len(optimized) != len(reference):
+            mismatches.append(ShadowMismatch(f"{location} length", len(optimized), len(reference)))
+            return 1
+        for index in range(len(optimized)):
+            if not ShadowMode.is_close(optimized[index], reference[index]):
+                mismatches.append(ShadowMismatch(f"{location}[{index}]", float(optimized[index]), float(reference[index])))
+        return len(optimized)
+
+    @staticmethod
+    def compare_text(location: str, optimized: str, reference: str, mismatches: list[ShadowMismatch]):
+        # Numbers printed in texts may round differently, they are allowed one unit of their last digit
+        optimized, reference = str(optimized), str(reference)
+        optimized_numbers = list(ShadowMode.number_pattern.finditer(optimized))
+        reference_numbers = list(ShadowMode.number_pattern.finditer(reference))
+        if ShadowMode.number_pattern.sub("#", optimized) != ShadowMode.number_pattern.sub("#", reference) or len(optimized_numbers) != len(reference_numbers):
+            mismatches.append(ShadowMismatch(location, optimized, reference))
+            return
+
+        for optimized_number, reference_number in zip(optimized_numbers, reference_numbers):
+            decimals = len(optimized_number.group(1) or "")
+            difference = abs(float(optimized_number.group().replace(",", "")) - float(reference_number.group().replace(",", "")))
+            if difference > 10 ** -decimals + ShadowMode.absolute_tolerance:
+                mismatches.append(ShadowMismatch(location, optimized, reference))
+                return
+
+    @staticmethod
+    def compare_table(location: str, optimized: Table, reference: Table, mismatches: list[ShadowMismatch]) -> int:
+        if optimized.get_headers() != reference.get_headers() or optimized.get_row_count() != reference.get_row_count():
+            mismatches.append(ShadowMismatch(f"{location} shape", (optimized.get_headers(), optimized.get_row_count()), (reference.get_headers(), reference.get_row_count())))
+            return 1
+
+        compared = 0
+        for optimized_column, reference_column in zip(optimized.columns, reference.columns):
+            column_location = f"{location}.{optimized_column.name}"
+            if optimized_column.format == "text":
+                for row in range(len(optimized_column)):
+                    ShadowMode.compare_text(f"{column_location}[{row}]", optimized_column.values[row], reference_column.values[row], mismatches)
+                compared += len(optimized_column)
+            elif optimized_column.format == "date":
+                compared += ShadowMode.compare_numbers(column_location, optimized_column.values.astype(numpy.int64), reference_column.values.astype(numpy.int64), mismatches)
+            else:
+                compared += ShadowMode.compare_numbers(column_location, optimized_column.values, reference_column.values, mismatches)
+        return compared
+
+    @staticmethod
+    def compare_results(optimized_results: list, reference_results: list) -> tuple[int, list[ShadowMismatch]]:
+        mismatches = []
+        compared = 0
+        if len(optimized_results) != len(reference_results):
+            mismatches.append(ShadowMismatch("result count", len(optimized_results), len(reference_results)))
+
+        for index, (optimized, reference) in enumerate(zip(optimized_results, reference_results)):
+            optimized = optimized.to_table() if isinstance(optimized, Chart) else optimized
+            reference = reference.to_table() if isinstance(reference, Chart) else reference
+            if isinstance(optimized, Table) and isinstance(reference, Table):
+                compared += ShadowMode.compare_table(f"#{index} {optimized.name}", optimized, reference, mismatches)
+            elif isinstance(optimized, str) and isinstance(reference, str):
+                ShadowMode.compare_text(f"#{index} text", optimized, reference, mismatches)
+                compared += 1
+            else:
+                mismatches.append(ShadowMismatch(f"#{index} kind", type(optimized).__name__, type(reference).__name__))
+        return compared, mismatches
+
+    @staticmethod
+    def run(operation: Operation, settings: dict, portfolio: Portfolio, log: bool = True, reference_portfolio: ReferencePortfolio = None) -> ShadowReport:
+        reference_portfolio = reference_portfolio or ReferencePortfolio(portfolio)
+        optimized_success, optimized_results, optimized_duration = ShadowMode.capture(operation, settings, portfolio)
+        reference_success, reference_results, reference_duration = ShadowMode.capture(operation, settings, reference_portfolio)
+
+        compared, mismatches = ShadowMode.compare_results(optimized_results, reference_results)
+        if optimized_success != reference_success:
+            mismatches.insert(0, ShadowMismatch("success", optimized_success, reference_success))
+
+        report = ShadowReport(operation.get_display_name(), optimized_duration, reference_duration, compared, mismatches)
+        if log:
+            ShadowMode.log(report)
+        return report
+
+    @staticmethod
+    def log(report: ShadowReport):
+        lines = [f"{time.strftime('%Y-%m-%d %H:%M:%S')} [shadow] {report.get_summary()}"]
+        lines += [f"    {mismatch}" for mismatch in report.mismatches[:ShadowMode.max_logged_mismatches]]
+        if len(report.mismatches) > ShadowMode.max_logged_mismatches:
+            lines.append(f"    ... {len(report.mismatches) - ShadowMode.max_logged_mismatches} more")
+        text = "\n".join(lines)
+
+        print(text, file=sys.stderr)
+        try:
+            os.makedirs(Utils.get_logs_folder_path(), exist_ok=True)
+            with open(Utils.get_diagnostics_file_path(), "a") as file:
+                file.write(text + "\n")
+        except Exception as e:
+            print(f"Error writing diagnostics: {e}", file=sys.stderr)
+
+# Differential runs of both engines over random synthetic portfolios, priced offline
+class ShadowHarness:
+    symbol_pool = [f"SYN{index}" for index in range(30)]
+
+    # Share of offline quotes that are bad, so the cleaning and Price Quality have something to find
+    glitch_rate = 0.002
+
+    # Memory taken by a row of results (a day's value, a period's totals and its TWRPeriod), allowed on top of the memory budget
+    bytes_per_result_row = 256
+
+    @staticmethod
+    def generate_portfolio(generator: numpy.random.Generator, memory_budget: int = 0) -> Portfolio:
+        symbols = list(generator.choice(ShadowHarness.symbol_pool, size=int(generator.integers(2, 8)), replace=False))
+        start_day = Utils.date_to_day(QDate(2012, 1, 2)) + int(generator.integers(0, 10 * 365))
+
+        # Business days only, sales never exceed the shares bought, so every transaction is valid
+        days = numpy.sort(start_day + generator.integers(0, 3 * 365, int(generator.integers(5, 80))))
+        held = {}
+        portfolio = Portfolio()
+        portfolio.clear()
+        for day in days:
+            date = Utils.day_to_date(int(day))
+            while date.dayOfWeek() > 5:
+                date = date.addDays(1)
+            symbol = str(generator.choice(symbols))
+            transaction = Transaction()
+            transaction.symbol = symbol
+            transaction.date = date
+            transaction.quantity = float(generator.integers(1, 50)) if generator.random() < 0.8 else round(float(generator.uniform(0.1, 20)), 3)
+            if held.get(symbol, 0) >= transaction.quantity and generator.random() < 0.35:
+                transaction.type = 'sell'
+                held[symbol] -= transaction.quantity
+            else:
+                transaction.type = 'buy'
+                held[symbol] = held.get(symbol, 0) + transaction.quantity
+            transaction.price = round(float(generator.uniform(10, 500)), 2)
+            portfolio.transactions.append(transaction)
+
+        portfolio.include_dividends = bool(generator.random() < 0.7)
+        portfolio.memory_budget = memory_budget
+        portfolio.update_symbol_cache(True, ["SPY"])
+        return portfolio
+
+    @staticmethod
+    def download_reference_prices(symbol_cache: SymbolCache) -> SymbolCache:
+        # The same symbols and days downloaded in one go, without the price store, for the reference engine.
+        # The cache being checked was read back from the store and extended in place, with symbols in the order they were added
+        price_store = SymbolCache.price_store
+        SymbolCache.price_store = None
+        try:
+            reference_cache = SymbolCache(symbol_cache.start_date, symbol_cache.end_date, symbol_cache.symbols, symbol_cache.benchmark_symbols)
+            reference_cache.symbols = list(symbol_cache.symbols)
+            reference_cache.update()
+        finally:
+            SymbolCache.price_store = price_store
+        return reference_cache
+
+    @staticmethod
+    def get_settings(operation: Operation, portfolio: Portfolio, generator: numpy.random.Generator, begin_date: QDate, end_date: QDate) -> dict:
+        settings = {key: setting.default for key, setting in operation.get_settings_desc().items()}
+        for key, date in [("from", begin_date), ("to", end_date), ("date", end_date)]:
+            if key in settings:
+                settings[key] = date
+
+        # Inputs without a usable default are generated, so both engines have something to compute
+        if "weights" in settings:
+            # One or two weight sets over some of the portfolio's symbols, rebalanced on a random schedule
+            symbols = sorted(set(transaction.symbol for transaction in portfolio.transactions))
+            weight_sets = []
+            for _ in range(int(generator.integers(1, 3))):
+                weighted = generator.choice(symbols, size=int(generator.integers(1, len(symbols) + 1)), replace=False)
+                weight_sets.append(", ".join(f"{symbol} {int(weight)}" for symbol, weight in zip(weighted, generator.integers(1, 100, len(weighted)))))
+            settings["weights"] = "\n".join(weight_sets)
+            settings["schedule"] = str(generator.choice(BacktestProcessor.schedules))
+            settings["cost_rate"] = float(generator.choice([0.0, 10.0]))
+        if "ranges" in settings:
+            # Custom ranges inside the compared range, every other time
+            settings["frequency"] = str(generator.choice(PeriodicReturnsProcessor.frequencies))
+            begin_day, end_day = Utils.date_to_day(begin_date), Utils.date_to_day(end_date)
+            ranges = numpy.sort(generator.integers(begin_day, end_day + 1, (int(generator.integers(1, 4)), 2)), axis=1)
+            settings["ranges"] = "\n".join(" ".join(Utils.day_to_date(int(day)).toString(Qt.DateFormat.ISODate) for day in days) for days in ranges)
+        return settings
+
+    @staticmethod
+    def check_memory(portfolio: Portfolio, begin_date: QDate, end_date: QDate) -> ShadowReport:
+        # Values of every trading day, then the TWR, traced against the memory budget before anything builds the price cache.
+        # The ledger, splits and dividends are built first, they are kept between operations and grow with the transactions
+        days = portfolio.get_price_source().get_days()
+        portfolio.get_dividend_income()
+        mismatches = []
+        tracemalloc.start()
+        try:
+            values = portfolio.get_values_at_days(days, True)
+            retained, peak = tracemalloc.get_traced_memory()
+            checks = [("values", peak - retained, len(days))]
+            tracemalloc.reset_peak()
+            twr = TWRProcessor.calculate_twr(portfolio, begin_date, end_date)
+            retained, peak = tracemalloc.get_traced_memory()
+            checks.append(("twr", peak - retained, len(twr.periods) + 1))
+        finally:
+            tracemalloc.stop()
+
+        # Only the results may grow past the budget, and the cache's (price type x day x symbol) array is never built
+        for name, transient_bytes, rows in checks:
+            allowed_bytes = portfolio.memory_budget + rows * ShadowHarness.bytes_per_result_row
+            if transient_bytes > allowed_bytes:
+                mismatches.append(ShadowMismatch(f"{name} working memory", transient_bytes, allowed_bytes))
+        if not portfolio.symbol_cache.invalid:
+            mismatches.append(ShadowMismatch("price cache built", True, False))
+
+        # Same results as valuing from the cache without a budget, which is timed as the reference.
+        # Loading the cache writes the store again, both engines are warmed up before they are timed
+        in_memory = Portfolio()
+        in_memory.clear()
+        in_memory.transactions = portfolio.transactions
+        in_memory.symbol_cache = portfolio.symbol_cache
+        in_memory.include_dividends = portfolio.include_dividends
+        in_memory.get_dividend_income()
+        portfolio.get_dividend_income()
+        durations = []
+        for engine in [portfolio, in_memory]:
+            start = time.perf_counter()
+            results = (engine.get_values_at_days(days, True), TWRProcessor.calculate_twr(engine, begin_date, end_date))
+            durations.append(time.perf_counter() - start)
+        compared = ShadowMode.compare_numbers("budget values", values, results[0], mismatches)
+        compared += ShadowMode.compare_numbers("budget twr", [twr.value], [results[1].value], mismatches)
+
+        peak_bytes = max(transient_bytes for _, transient_bytes, _ in checks)
+        return ShadowReport(f"Memory Budget (peak {peak_bytes} of {portfolio.memory_budget} bytes, reference unbudgeted)", durations[0], durations[1], compared, mismatches)
+
+    @staticmethod
+    def compare_engines(portfolio: Portfolio, generator: numpy.random.Generator, operation_filter: str = "") -> list[ShadowReport]:
+        reference = ReferencePortfolio(portfolio)
+        reference.symbol_cache = ShadowHarness.download_reference_prices(portfolio.symbol_cache)
+        ledger = portfolio.get_ledger()
+        first_day, last_day = int(ledger.days[0]), int(ledger.days[-1]) + 60
+        begin_day, end_day = numpy.sort(generator.integers(first_day - 30, last_day, 2))
+        begin_date, end_date = Utils.day_to_date(int(begin_day)), Utils.day_to_date(int(end_day))
+        reports = []
+
+        # Budgeted portfolios are checked first, the reference engine reads the cache
+        if portfolio.memory_budget:
+            reports.append(ShadowHarness.check_memory(portfolio, begin_date, end_date))
+
+        # Valuation at random days, at the open and at the close
+        days = numpy.sort(generator.integers(first_day - 10, last_day, 25))
+        for at_close in [False, True]:
+            mismatches = []
+            start = time.perf_counter()
+            optimized = portfolio.get_values_at_days(days, at_close)
+            optimized_duration = time.perf_counter() - start
+            start = time.perf_counter()
+            expected = [reference.get_value_at_date(Utils.day_to_date(int(day)), at_close) for day in days]
+            reference_duration = time.perf_counter() - start
+            compared = ShadowMode.compare_numbers(f"value at {'close' if at_close else 'open'}", optimized, expected, mismatches)
+            reports.append(ShadowReport(f"Valuation ({'close' if at_close else 'open'})", optimized_duration, reference_duration, compared, mismatches))
+
+        # TWR against the period-by-period loop
+        mismatches = []
+        start = time.perf_counter()
+        optimized = TWRProcessor.calculate_twr(portfolio, begin_date, end_date)
+        optimized_duration = time.perf_counter() - start
+        start = time.perf_counter()
+        expected = reference.calculate_own_twr(begin_date, end_date)
+        reference_duration = time.perf_counter() - start
+        compared = ShadowMode.compare_numbers("twr", [optimized.value], [expected.value], mismatches)
+        for field in ["begin_portfolio_value", "end_portfolio_value", "cash_flow", "growth_factor"]:
+            compared += ShadowMode.compare_numbers(f"twr {field}", [getattr(period, field) for period in optimized.periods], [getattr(period, field) for period in expected.periods], mismatches)
+        reports.append(ShadowReport("TWR", optimized_duration, reference_duration, compared, mismatches))
+
+        # Every registered operation, on the same range
+        for entry in OperationRegistry.get_entries():
+            if operation_filter.lower() in entry.get_display_name().lower():
+                operation = entry.get_instance()
+                settings = ShadowHarness.get_settings(operation, portfolio, generator, begin_date, end_date)
+                reports.append(ShadowMode.run(operation, settings, portfolio, False, reference))
+        return reports
+
+    @staticmethod
+    def run(portfolio_count: int, seed: int = 0, operation_filter: str = "") -> int:
+        # Offline prices in a throwaway store, so valuations streamed from the store under a memory budget are exercised too
+        SymbolCache.price_provider = OfflinePriceProvider(glitch_rate=ShadowHarness.glitch_rate)
+        SymbolCache.price_store = PriceStore(tempfile.mkdtemp(prefix="perfolio-shadow-"))
+
+        generator = numpy.random.default_rng(seed)
+        total_mismatches = 0
+        for index in range(portfolio_count):
+            portfolio = ShadowHarness.generate_portfolio(generator, int(generator.choice([0, 0, 64 * 1024, 256 * 1024])))
+
+            for report in ShadowHarness.compare_engines(portfolio, generator, operation_filter):
+                total_mismatches += len(report.mismatches)
+                print(f"portfolio {index} (budget {portfolio.memory_budget}): {report.get_summary()}")
+                for mismatch in report.mismatches[:ShadowMode.max_logged_mismatches]:
+                    print(f"    {mismatch}")
+
+        print(f"{portfolio_count} portfolios, {total_mismatches} mismatches")
+        return 1 if total_mismatches else 0
@@ -0,0 +1,150 @@
+import os
+import numpy
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+
+from PySide6.QtCore import QDate
+from perfolio.portfolio import Portfolio
+from perfolio.risk import RiskProcessor
+
+class SimulationResult:
+    def __init__(self, days: numpy.ndarray, initial_value: float, symbols: list[str], percentiles: list[float], bands: numpy.ndarray, mean_values: numpy.ndarray, loss_probabilities: numpy.ndarray):
+        # bands[i] holds the percentiles[i] value of every simulated path at each future day
+        self.days = days
+        self.initial_value = initial_value
+        self.symbols = symbols
+        self.percentiles = percentiles
+        self.bands = bands
+        self.mean_values = mean_values
+        self.loss_probabilities = loss_probabilities
+
+def attach_shared_array(name: str, shape: tuple) -> tuple[shared_memory.SharedMemory, numpy.ndarray]:
+    memory = shared_memory.SharedMemory(name=name)
+    return memory, numpy.ndarray(shape, dtype=numpy.float64, buffer=memory.buf)
+
+def simulate_paths(returns_name: str, returns_shape: tuple, paths_name: str, paths_shape: tuple, values: numpy.ndarray, method: str, mean: numpy.ndarray, cholesky: numpy.ndarray, start: int, end: int, seed: numpy.random.SeedSequence):
+    # Runs in a worker process, reads the shared returns and writes paths [start, end) of the shared output in place
+    returns_memory, returns = attach_shared_array(returns_name, returns_shape)
+    paths_memory, paths = attach_shared_array(paths_name, paths_shape)
+
+    try:
+        generator = numpy.random.default_rng(seed)
+        horizon = paths_shape[1]
+        symbol_count = returns_shape[1]
+
+        # Paths are generated in batches so the (paths x days x symbols) growth stays within a fixed budget
+        batch_size = max(1, SimulationProcessor.batch_elements // (horizon * symbol_count))
+        for batch_start in range(start, end, batch_size):
+            batch_end = min(batch_start + batch_size, end)
+            count = batch_end - batch_start
+
+            if method == "Bootstrap":
+                # Whole historical days are resampled, which keeps the correlation between symbols
+                growth = 1 + returns[generator.integers(0, len(returns), (count, horizon))]
+                numpy.cumprod(growth, axis=1, out=growth)
+            else:
+                growth = generator.standard_normal((count, horizon, symbol_count)) @ cholesky.T + mean
+                numpy.cumsum(growth, axis=1, out=growth)
+                numpy.exp(growth, out=growth)
+
+            paths[batch_start:batch_end] = growth @ values
+    finally:
+        del returns, paths
+        returns_memory.close()
+        paths_memory.close()
+
+class SimulationProcessor:
+    methods = ["Bootstrap", "Parametric"]
+    percentiles = [5, 25, 50, 75, 95]
+
+    # Paths per task and (paths x days x symbols) elements per batch within a task
+    chunk_size = 2048
+    batch_elements = 4_000_000
+
+    @staticmethod
+    def get_daily_returns(portfolio: Portfolio, symbols: list[str], days: numpy.ndarray) -> numpy.ndarray:
+        prices = portfolio.get_price_source().get_symbol_prices_at_days(symbols, days, 'Adj Close')
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            returns = prices[1:] / prices[:-1] - 1
+
+        # Days no symbol traded are dropped, symbols that did not trade on a given day are flat
+        returns = returns[~numpy.all(numpy.isnan(returns), axis=1)]
+        return numpy.nan_to_num(returns, nan=0.0, posinf=0.0, neginf=0.0)
+
+    @staticmethod
+    def get_future_days(last_day: int, horizon: int) -> numpy.ndarray:
+        start = numpy.datetime64(int(last_day), 'D')
+        return numpy.busday_offset(start, numpy.arange(1, horizon + 1), roll='forward').astype(numpy.int64)
+
+    @staticmethod
+    def simulate(portfolio: Portfolio, history_begin_date: QDate, as_of_date: QDate, horizon: int, path_count: int, method: str, seed: int = 0, max_workers: int = None) -> SimulationResult:
+        if method not in SimulationProcessor.methods:
+            raise ValueError(f"Unknown simulation method: {method}")
+
+        days = RiskProcessor.get_trading_days(portfolio, history_begin_date, as_of_date)
+        if len(days) < 2:
+            raise ValueError("Not enough market data in the history range.")
+
+        # Current holdings are projected as they are, valued at the last trading day
+        ledger = portfolio.get_ledger()
+        values = portfolio.get_values_matrix(days[-1:], True)[0]
+        held = numpy.flatnonzero(values != 0)
+        if len(held) == 0:
+            raise ValueError("Nothing is held at the end of the history range.")
+
+        symbols = [ledger.symbols[index] for index in held]
+        values = values[held]
+        returns = SimulationProcessor.get_daily_returns(portfolio, symbols, days)
+        if len(returns) == 0:
+            raise ValueError("Not enough market data in the history range.")
+
+        mean = numpy.zeros(len(symbols))
+        cholesky = numpy.zeros((len(symbols), len(symbols)))
+        if method == "Parametric":
+            log_returns = numpy.log1p(returns)
+            mean = log_returns.mean(axis=0)
+            covariance = numpy.atleast_2d(numpy.cov(log_returns, rowvar=False)) if len(log_returns) > 1 else numpy.zeros_like(cholesky)
+
+            # A tiny ridge keeps the factorization defined for flat or perfectly correlated symbols
+            cholesky = numpy.linalg.cholesky(covariance + numpy.eye(len(symbols)) * 1e-12)
+
+        # Workers read the returns and write their paths straight into shared memory, nothing is copied back
+        returns_memory = shared_memory.SharedMemory(create=True, size=max(returns.nbytes, 1))
+        paths_memory = shared_memory.SharedMemory(create=True, size=max(path_count * horizon * 8, 1))
+        shared_returns = paths = None
+        try:
+            shared_returns = numpy.ndarray(returns.shape, dtype=numpy.float64, buffer=returns_memory.buf)
+            shared_returns[:] = returns
+            paths = numpy.ndarray((path_count, horizon), dtype=numpy.float64, buffer=paths_memory.buf)
+
+            # Chunks have a fixed size and their own seed, so results do not depend on the number of workers
+            chunk_starts = range(0, path_count, SimulationProcessor.chunk_size)
+            seeds = numpy.random.SeedSequence(seed).spawn(len(chunk_starts))
+            tasks = [
+                (returns_memory.name, returns.shape, paths_memory.name, paths.shape, values, method, mean, cholesky, start, min(start + SimulationProcessor.chunk_size, path_count), chunk_seed)
+                for start, chunk_seed in zip(chunk_starts, seeds)
+            ]
+
+            max_workers = min(max_workers or os.cpu_count() or 1, len(tasks))
+            if max_workers > 1:
+                # Spawned workers do not inherit the GUI's threads
+                with ProcessPoolExecutor(max_workers, mp_context=get_context("spawn")) as executor:
+                    for future in [executor.submit(simulate_paths, *task) for task in tasks]:
+                        future.result()
+            else:
+                for task in tasks:
+                    simulate_paths(*task)
+
+            bands = numpy.percentile(paths, SimulationProcessor.percentiles, axis=0)
+            mean_values = paths.mean(axis=0)
+            loss_probabilities = numpy.mean(paths < values.sum(), axis=0)
+        finally:
+            # Views must be released before the shared memory can be closed
+            shared_returns = paths = None
+            returns_memory.close()
+            returns_memory.unlink()
+            paths_memory.close()
+            paths_memory.unlink()
+
+        return SimulationResult(SimulationProcessor.get_future_days(days[-1], horizon), values.sum(), symbols, SimulationProcessor.percentiles, bands, mean_values, loss_probabilities)
@@ -0,0 +1,105 @@
+import numpy
+
+# Per-symbol running values stored only where they change, in compressed sparse row layout:
+# symbol s owns entries offsets[s]:offsets[s + 1], each holding the value from its key (a transaction or day count) on
+class SparseSeries:
+    def __init__(self, symbol_count: int, symbol_ids: numpy.ndarray, keys: numpy.ndarray, values: numpy.ndarray, default: float = 0.0):
+        # Entries are sorted by symbol, then by key
+        self.symbol_count = symbol_count
+        self.symbol_ids = symbol_ids
+        self.keys = keys
+        self.values = values
+        self.default = default
+        self.offsets = numpy.searchsorted(symbol_ids, numpy.arange(symbol_count + 1))
+
+        # Keys are shifted into a range of their own per symbol so any (symbol, key) pair is found with a single searchsorted
+        self.key_base = int(keys.min()) if len(keys) else 0
+        self.key_span = int(keys.max()) - self.key_base + 2 if len(keys) else 1
+        self.composite_keys = symbol_ids * self.key_span + (keys - self.key_base)
+
+        # An entry holds until the next entry of its symbol, the last one indefinitely
+        self.end_keys = numpy.append(keys[1:], 0)
+        last_entries = self.offsets[1:][self.offsets[1:] > self.offsets[:-1]] - 1
+        self.end_keys[last_entries] = numpy.iinfo(numpy.int64).max
+
+    @staticmethod
+    def from_changes(symbol_count: int, symbol_ids: numpy.ndarray, keys: numpy.ndarray, changes: numpy.ndarray, accumulate=numpy.cumsum, default: float = 0.0) -> 'SparseSeries':
+        # Changes are accumulated per symbol, one entry per change, so memory follows the number of changes
+        order = numpy.lexsort((keys, symbol_ids))
+        symbol_ids = symbol_ids[order].astype(numpy.int64)
+        keys = keys[order].astype(numpy.int64)
+        changes = changes[order]
+
+        values = numpy.empty(len(changes))
+        offsets = numpy.searchsorted(symbol_ids, numpy.arange(symbol_count + 1))
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            if end > start:
+                values[start:end] = accumulate(changes[start:end])
+
+        return SparseSeries(symbol_count, symbol_ids, keys, values, default)
+
+    def splice(self, edited_symbol_ids: numpy.ndarray, first_key: int, symbol_ids: numpy.ndarray, keys: numpy.ndarray, changes: numpy.ndarray, key_map: numpy.ndarray = None, accumulate=numpy.cumsum) -> 'SparseSeries':
+        # Entries of the edited symbols from first_key on are accumulated again from their changes, every other entry keeps its value
+        # under its new key (key_map[key], keys before first_key are left unchanged)
+        replaced = numpy.isin(self.symbol_ids, edited_symbol_ids) & (self.keys >= first_key)
+        kept_symbol_ids = self.symbol_ids[~replaced]
+        kept_keys = self.keys[~replaced] if key_map is None else key_map[self.keys[~replaced]]
+        kept_values = self.values[~replaced]
+
+        # Each edited symbol carries on from its value before first_key, the same sequence of operations as a full accumulation
+        order = numpy.lexsort((keys, symbol_ids))
+        symbol_ids = symbol_ids[order].astype(numpy.int64)
+        keys = keys[order].astype(numpy.int64)
+        changes = changes[order]
+        values = numpy.empty(len(changes))
+        previous_values = self.get_values(edited_symbol_ids, numpy.full(len(edited_symbol_ids), first_key - 1))
+        for symbol_id, previous_value in zip(edited_symbol_ids, previous_values):
+            start, end = numpy.searchsorted(symbol_ids, [symbol_id, symbol_id + 1])
+            values[start:end] = accumulate(numpy.concatenate(([previous_value], changes[start:end])))[1:]
+
+        # Both sets of entries are sorted, the new ones are inserted into the kept ones
+        all_keys = numpy.concatenate((kept_keys, keys))
+        key_base = int(all_keys.min()) if len(all_keys) else 0
+        key_span = int(all_keys.max()) - key_base + 2 if len(all_keys) else 1
+        positions = numpy.searchsorted(kept_symbol_ids * key_span + (kept_keys - key_base), symbol_ids * key_span + (keys - key_base))
+        return SparseSeries(
+            self.symbol_count,
+            numpy.insert(kept_symbol_ids, positions, symbol_ids),
+            numpy.insert(kept_keys, positions, keys),
+            numpy.insert(kept_values, positions, values),
+            self.default
+        )
+
+    def get_values(self, symbol_ids: numpy.ndarray, keys: numpy.ndarray) -> numpy.ndarray:
+        # Value of each (symbol, key) pair, set by the last entry of the symbol at or before the key
+        if len(self.values) == 0:
+            return numpy.full(len(keys), self.default)
+
+        # Keys before the first entry fall into the previous symbol's range, keys after the last one are clamped to the symbol's own
+        keys = numpy.clip(keys - self.key_base, -1, self.key_span - 1)
+        indices = numpy.searchsorted(self.composite_keys, symbol_ids * self.key_span + keys, side='right') - 1
+        found = indices >= self.offsets[symbol_ids]
+        return numpy.where(found, self.values[indices.clip(min=0)], self.default)
+
+    def get_entries(self, keys: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        # Rows (into keys), symbols and values of every value other than the default, found per entry rather than per (key, symbol) pair
+        order = numpy.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+
+        entries = numpy.flatnonzero(self.values != self.default)
+        first = numpy.searchsorted(sorted_keys, self.keys[entries], side='left')
+        lengths = numpy.searchsorted(sorted_keys, self.end_keys[entries], side='left') - first
+
+        # Each entry covers a contiguous run of the sorted keys, the runs are expanded together
+        total = int(lengths.sum())
+        run_starts = numpy.repeat(first - (numpy.cumsum(lengths) - lengths), lengths)
+        rows = order[run_starts + numpy.arange(total)]
+        entries = numpy.repeat(entries, lengths)
+        return rows, self.symbol_ids[entries], self.values[entries]
+
+    def get_dense(self, keys: numpy.ndarray) -> numpy.ndarray:
+        # One row per key, one column per symbol
+        dense = numpy.full((len(keys), self.symbol_count), self.default)
+        rows, symbol_ids, values = self.get_entries(keys)
+        dense[rows, symbol_ids] = values
+        return dense
@@ -0,0 +1,49 @@
+import numpy
+
+from perfolio.ledger import Ledger, LedgerEdit
+from perfolio.sparse import SparseSeries
+
+# Share counts of the ledger's transactions carried through the stock splits that follow them
+class SplitAdjustment:
+    def __init__(self, ledger: Ledger, price_source):
+        # The price source is the symbol cache, or prices streamed from the price store
+        self.price_source = price_source
+        self.version = price_source.version
+        self.ledger = ledger
+
+        # Each symbol's cumulative split factor from the open of every split day on, one entry per split, 1 before any
+        symbol_ids, days, ratios = price_source.get_price_events(ledger.symbols, 'Stock Splits')
+        valid = (ratios > 0) & (ratios != 1)
+        self.factors = SparseSeries.from_changes(len(ledger.symbols), symbol_ids[valid], days[valid], ratios[valid], numpy.cumprod, 1.0)
+
+        # Quantities expressed in shares before any split, so positions only need the factor of the day they are read at
+        self.transaction_factors = self.factors.get_values(ledger.symbol_ids, ledger.days)
+        self.base_quantities = ledger.quantities / self.transaction_factors
+        self.base_positions = ledger.accumulate(self.base_quantities)
+
+    def apply_edit(self, edit: LedgerEdit):
+        # The ledger was edited in place, split factors only change with the prices
+        first_row = edit.first_row
+        self.transaction_factors = numpy.concatenate((self.transaction_factors[:first_row], self.factors.get_values(self.ledger.symbol_ids[first_row:], self.ledger.days[first_row:])))
+        self.base_quantities = numpy.concatenate((self.base_quantities[:first_row], self.ledger.quantities[first_row:] / self.transaction_factors[first_row:]))
+        self.base_positions = self.ledger.update_accumulated(self.base_positions, self.base_quantities, edit)
+
+    def get_factors_at_days(self, days: numpy.ndarray) -> numpy.ndarray:
+        # A split applies from the open of its day, to transactions of that day as well
+        return self.factors.get_dense(days)
+
+    def get_positions_at_points(self, symbol_ids: numpy.ndarray, days: numpy.ndarray, at_close: bool) -> numpy.ndarray:
+        # Share counts of single (day, symbol) pairs
+        base_positions = self.base_positions.get_values(symbol_ids, self.ledger.get_transaction_counts(days, at_close))
+        return base_positions * self.factors.get_values(symbol_ids, days)
+
+    def get_position_entries(self, days: numpy.ndarray, at_close: bool) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        # Only held symbols are looked up in the split factors
+        rows, symbol_ids, base_positions = self.base_positions.get_entries(self.ledger.get_transaction_counts(days, at_close))
+        return rows, symbol_ids, base_positions * self.factors.get_values(symbol_ids, days[rows])
+
+    def get_positions_at_days(self, days: numpy.ndarray, at_close: bool) -> numpy.ndarray:
+        positions = numpy.zeros((len(days), len(self.ledger.symbols)))
+        rows, symbol_ids, shares = self.get_position_entries(days, at_close)
+        positions[rows, symbol_ids] = shares
+        return positions
@@ -0,0 +1,156 @@
+import numpy
+
+from collections import OrderedDict
+
+from perfolio.pricestore import PriceStore, StoredPrices
+from perfolio.symbol import SymbolCache
+from perfolio.utils import Utils
+
+# Prices read from the price store a few days at a time, instead of the cache's (price type x day x symbol) array
+class StoredPriceSource:
+    # Symbols kept mapped between lookups, each one an open file
+    max_mapped_symbols = 64
+
+    # Working memory of a day scanned for events or prices, masks and row numbers included
+    bytes_per_scanned_day = 64
+
+    def __init__(self, symbol_cache: SymbolCache, price_store: PriceStore, memory_budget: int):
+        self.symbol_cache = symbol_cache
+        self.price_store = price_store
+        self.memory_budget = memory_budget
+        self.start_day = Utils.date_to_day(symbol_cache.start_date)
+
+        # Columns are scanned in slices of days, within half of the budget like the valuation blocks
+        self.slice_days = max(1, memory_budget // 2 // StoredPriceSource.bytes_per_scanned_day)
+
+        # Stored files are mapped, only the rows looked up are ever read, so later blocks mostly reuse the same maps
+        self.mapped = OrderedDict()
+        self.mapped_version = None
+
+    @property
+    def version(self) -> int:
+        # The store is written by the cache, whenever the cache's prices change
+        return self.symbol_cache.version
+
+    @property
+    def invalid(self) -> bool:
+        # Like SymbolCache.invalid, prices are only there once the store was updated
+        return self.symbol_cache.store_stale
+
+    def update(self):
+        # Files are written again by the update, none is kept mapped meanwhile
+        if self.symbol_cache.store_stale:
+            self.mapped.clear()
+            self.symbol_cache.update_store(self.memory_budget)
+
+    def load(self, symbol: str) -> StoredPrices:
+        self.update()
+        if self.mapped_version != self.version:
+            self.mapped.clear()
+            self.mapped_version = self.version
+
+        if symbol in self.mapped:
+            self.mapped.move_to_end(symbol)
+            return self.mapped[symbol]
+
+        # None when the symbol is not stored cleaned from the cache's start, the cache then has to fetch it
+        stored = self.price_store.map(symbol)
+        if stored is not None and (stored.cleaned_from != self.start_day or not set(SymbolCache.price_types).issubset(stored.prices)):
+            stored = None
+
+        self.mapped[symbol] = stored
+        while len(self.mapped) > StoredPriceSource.max_mapped_symbols:
+            self.mapped.popitem(last=False)
+        return stored
+
+    @staticmethod
+    def get_column(stored: StoredPrices, price_type: str) -> numpy.ndarray:
+        # Lookups read the cleaned prices where there are some, like the cache's cleaned copy
+        return stored.cleaned.get(price_type, stored.prices[price_type])
+
+    def get_days(self) -> numpy.ndarray:
+        # Every symbol is stored over the same days from its first price on, like the cache's rows
+        days = numpy.zeros(0, dtype=numpy.int64)
+        for symbol in self.symbol_cache.symbols:
+            stored = self.load(symbol)
+            if stored is not None:
+                days = numpy.union1d(days, stored.days[numpy.searchsorted(stored.days, self.start_day):])
+        return days
+
+    def get_price_events(self, symbols: list[str], price_type: str) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        symbol_ids, days, values = [], [], []
+        for symbol_id, symbol in enumerate(symbols):
+            stored = self.load(symbol)
+            if stored is None:
+                _, stored_days, stored_values = self.symbol_cache.get_price_events([symbol], price_type)
+                symbol_ids.append(numpy.full(len(stored_days), symbol_id, dtype=numpy.int64))
+                days.append(stored_days)
+                values.append(stored_values)
+                continue
+
+            column = StoredPriceSource.get_column(stored, price_type)
+            for start in range(numpy.searchsorted(stored.days, self.start_day), len(stored.days), self.slice_days):
+                prices = column[start:start + self.slice_days]
+                rows = start + numpy.flatnonzero(~numpy.isnan(prices) & (prices != 0))
+                symbol_ids.append(numpy.full(len(rows), symbol_id, dtype=numpy.int64))
+                days.append(stored.days[rows])
+                values.append(column[rows])
+
+        if not symbol_ids:
+            return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0)
+        return numpy.concatenate(symbol_ids), numpy.concatenate(days).astype(numpy.int64), numpy.concatenate(values)
+
+    def get_symbol_prices_at_points(self, symbols: list[str], days: numpy.ndarray, symbol_ids: numpy.ndarray, price_type='Close') -> numpy.ndarray:
+        # Same lookup as SymbolCache.get_symbol_prices_at_points, only the requested rows are read
+        if price_type not in SymbolCache.price_type_indices:
+            raise ValueError(f"Price type {price_type} not found in cache.")
+
+        prices = numpy.full(len(days), numpy.nan)
+        order = numpy.argsort(symbol_ids, kind='stable')
+        bounds = numpy.searchsorted(symbol_ids[order], numpy.arange(len(symbols) + 1))
+
+        for symbol_id in numpy.flatnonzero(numpy.diff(bounds)):
+            points = order[bounds[symbol_id]:bounds[symbol_id + 1]]
+            point_days = days[points]
+            stored = self.load(symbols[symbol_id])
+            if stored is None:
+                prices[points] = self.symbol_cache.get_symbol_prices_at_points([symbols[symbol_id]], point_days, numpy.zeros(len(points), dtype=numpy.int64), price_type)
+                continue
+            if len(stored.days) == 0:
+                continue
+
+            # Days before the cache's start are left out like the cache does
+            rows = numpy.minimum(stored.days.searchsorted(point_days), len(stored.days) - 1)
+            found = (stored.days[rows] == point_days) & (point_days >= self.start_day)
+            prices[points[found]] = StoredPriceSource.get_column(stored, price_type)[rows[found]]
+
+        return prices
+
+    def get_symbol_prices_at_days(self, symbols: list[str], days: numpy.ndarray, price_type='Close') -> numpy.ndarray:
+        # Same as SymbolCache.get_symbol_prices_at_days, rows are the requested days, columns the requested symbols
+        prices = numpy.full((len(days), len(symbols)), numpy.nan)
+        for symbol_id, symbol in enumerate(symbols):
+            prices[:, symbol_id] = self.get_symbol_prices_at_points([symbol], days, numpy.zeros(len(days), dtype=numpy.int64), price_type)
+        return prices
+
+    def get_last_symbol_prices_at_days(self, symbol: str, days: numpy.ndarray, price_type='Close') -> tuple[numpy.ndarray, numpy.ndarray]:
+        # Same as SymbolCache.get_last_symbol_prices_at_days, the last priced row is carried from slice to slice
+        stored = self.load(symbol)
+        if stored is None:
+            return self.symbol_cache.get_last_symbol_prices_at_days(symbol, days, price_type)
+
+        column = StoredPriceSource.get_column(stored, price_type)
+        rows = numpy.searchsorted(stored.days, days, side='right') - 1
+        priced_rows = numpy.full(len(days), -1, dtype=numpy.int64)
+        last_priced_row = -1
+        for start in range(numpy.searchsorted(stored.days, self.start_day), len(stored.days), self.slice_days):
+            prices = column[start:start + self.slice_days]
+            slice_priced_rows = numpy.maximum.accumulate(numpy.where(numpy.isnan(prices), last_priced_row, start + numpy.arange(len(prices))))
+            last_priced_row = slice_priced_rows[-1]
+            in_slice = (rows >= start) & (rows < start + len(prices))
+            priced_rows[in_slice] = slice_priced_rows[rows[in_slice] - start]
+
+        found = priced_rows >= 0
+        if not found.any():
+            return numpy.full(len(days), numpy.nan), numpy.full(len(days), -1, dtype=numpy.int64)
+        return numpy.where(found, column[priced_rows.clip(min=0)], numpy.nan), numpy.where(found, stored.days[priced_rows.clip(min=0)], -1)
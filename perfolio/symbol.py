@@ -1,38 +1,439 @@
-import yfinance as yf 
+import numpy
 
 from PySide6.QtCore import Qt, QDate
-from pandas import Timestamp
+from pandas import DataFrame
+
+from perfolio.pricestore import PriceStore, StoredPrices
+from perfolio.providers import YahooPriceProvider
+from perfolio.quality import PriceCleaner, PriceQualityReport
+from perfolio.utils import Utils
 
 class SymbolCache:
-    def __init__(self, start_date: QDate, end_date: QDate, symbols: list[str]):
+    price_provider = YahooPriceProvider()
+    price_store: PriceStore = None
+    price_types = ['Open', 'Close', 'Adj Close', 'Dividends', 'Stock Splits']
+
+    # Provider prices are adjusted for later splits, these are turned back into the prices actually traded
+    split_adjusted_price_types = ['Open', 'Close', 'Dividends']
+
+    # The provider adjusts these up to the end of each download, rows downloaded later would be on another basis,
+    # so they are never stored and derived from the traded prices instead, see get_adjusted_close
+    derived_price_types = ['Adj Close']
+    price_type_indices = {price_type: index for index, price_type in enumerate(price_types)}
+
+    # Rows reserved up front, the buffers then double in size when full
+    initial_day_capacity = 256
+
+    # Working memory of a downloaded price day of one symbol, the provider's frame and its copies included
+    bytes_per_downloaded_day = 256
+
+    def __init__(self, start_date: QDate, end_date: QDate, symbols: list[str], benchmark_symbols: list[str] = []):
         self.start_date = start_date
         self.end_date = end_date
-        self.symbols = symbols
+        self.benchmark_symbols = [symbol for symbol in benchmark_symbols if symbol]
+        self.symbols = sorted(set(symbols) | set(self.benchmark_symbols))
         self.invalid = True
+        self.stale = True
+
+        # The price store can be kept up to date instead of the prices held here, see update_store
+        self.store_stale = True
+
+        # Bumped on every change of the stored prices, so caches derived from them know when to rebuild
+        self.version = 0
+
+        # Lookups read a cleaned copy of the prices, made again whenever the version changes
+        self.cleaned_version = None
+        self.quality_report: PriceQualityReport = None
 
     def invalidate(self):
         self.invalid = True
+        self.store_stale = True
+
+    def add_symbols(self, symbols: list[str]):
+        missing_symbols = [symbol for symbol in symbols if symbol and symbol not in self.symbols]
+        if not missing_symbols:
+            return
+
+        # New symbols get their own columns and are fetched on the next refresh, without touching the others
+        self.symbols = self.symbols + missing_symbols
+        if not self.invalid:
+            self.symbol_indices.update({symbol: len(self.symbol_indices) for symbol in missing_symbols})
+            self.fetched_through = numpy.append(self.fetched_through, numpy.full(len(missing_symbols), Utils.date_to_day(self.start_date) - 1))
+            self.price_buffer = numpy.concatenate((self.price_buffer, numpy.full((len(SymbolCache.price_types), len(self.day_buffer), len(missing_symbols)), numpy.nan)), axis=2)
+            self.version += 1
+            self.update_views()
+        self.stale = True
+        self.store_stale = True
+
+    def add_benchmark_symbols(self, benchmark_symbols: list[str]):
+        self.benchmark_symbols += [symbol for symbol in benchmark_symbols if symbol and symbol not in self.benchmark_symbols]
+        self.add_symbols(benchmark_symbols)
+
+    def extend_to(self, end_date: QDate):
+        if end_date > self.end_date:
+            self.end_date = end_date
+            self.stale = True
+            self.store_stale = True
 
     def populate(self):
-        start_date_str = self.start_date.toString(Qt.DateFormat.ISODate)
-        end_date_str = self.end_date.addDays(1).toString(Qt.DateFormat.ISODate)
-        self.cache = yf.download(self.symbols, start=start_date_str, end=end_date_str)
+        start_day = Utils.date_to_day(self.start_date)
+        self.symbol_indices = {symbol: index for index, symbol in enumerate(self.symbols)}
+        self.fetched_through = numpy.full(len(self.symbols), start_day - 1, dtype=numpy.int64)
+        self.allocate(SymbolCache.initial_day_capacity)
+
+        if SymbolCache.price_store is not None:
+            stored = {symbol: SymbolCache.price_store.load(symbol) for symbol in self.symbols}
+            stored = {symbol: stored_prices for symbol, stored_prices in stored.items() if SymbolCache.is_reusable(stored_prices, start_day)}
+
+            # All stored days are added at once, each symbol then only fills its column
+            if stored:
+                self.add_days(numpy.unique(numpy.concatenate([stored_prices.days[stored_prices.days >= start_day] for stored_prices in stored.values()])))
+            for symbol, stored_prices in stored.items():
+                in_range = stored_prices.days >= start_day
+                self.store_prices(stored_prices.days[in_range], [symbol], {price_type: values[in_range][:, None] for price_type, values in stored_prices.prices.items()})
+                self.fetched_through[self.symbol_indices[symbol]] = stored_prices.fetched_through
+
         self.invalid = False
+        self.refresh()
 
-    def get_symbol_price_at_date(self, symbol: str, date: QDate, price_type='Close'):
+    def refresh(self):
         if self.invalid:
             self.populate()
+            return
+
+        end_day = Utils.date_to_day(self.end_date)
+        stale_columns = numpy.flatnonzero(self.fetched_through < end_day)
+
+        # Symbols missing the same days are requested together, usually all of them at once
+        groups = [(fetched_through, [self.symbols[column] for column in stale_columns if self.fetched_through[column] == fetched_through]) for fetched_through in numpy.unique(self.fetched_through[stale_columns])]
+        for fetched_through, symbols in groups:
+            start_date_str = Utils.day_to_date(fetched_through + 1).toString(Qt.DateFormat.ISODate)
+            end_date_str = Utils.day_to_date(end_day + 1).toString(Qt.DateFormat.ISODate)
+            frame = SymbolCache.price_provider.download(symbols, start_date_str, end_date_str)
+
+            days, prices = SymbolCache.read_frame(frame, symbols)
+            self.store_prices(days, symbols, prices)
+
+            # The last day may still be trading, it is requested again on the next refresh
+            for symbol in symbols:
+                self.fetched_through[self.symbol_indices[symbol]] = end_day - 1
+                self.save_symbol(symbol)
+
+        self.stale = False
+
+    def update(self):
+        if self.invalid:
+            self.populate()
+        elif self.stale:
+            self.refresh()
+
+        if self.cleaned_version != self.version:
+            self.clean()
+
+    @staticmethod
+    def is_reusable(stored_prices: StoredPrices, start_day: int) -> bool:
+        # Stored prices are reused when they go back far enough, only the days after them are downloaded
+        return stored_prices is not None and stored_prices.covered_from <= start_day and set(SymbolCache.price_types).issubset(stored_prices.prices)
+
+    def update_store(self, memory_budget: int):
+        # Prices go from the provider straight into the price store, cleaned there for StoredPriceSource to read,
+        # one symbol at a time so the (price type x day x symbol) array is never built
+        if not self.store_stale:
+            return
+
+        start_day = Utils.date_to_day(self.start_date)
+        end_day = Utils.date_to_day(self.end_date)
+
+        # Every symbol is saved over the days any of them has, like the cache's columns
+        fetched_through = {}
+        grid = numpy.zeros(0, dtype=numpy.int64)
+        for symbol in self.symbols:
+            stored = SymbolCache.price_store.map(symbol)
+            reusable = SymbolCache.is_reusable(stored, start_day)
+            fetched_through[symbol] = stored.fetched_through if reusable else start_day - 1
+            if reusable:
+                grid = numpy.union1d(grid, stored.days[stored.days >= start_day])
+
+        # Symbols missing the same days are requested together, as many at once as the memory budget allows
+        stale_symbols = [symbol for symbol in self.symbols if fetched_through[symbol] < end_day]
+        for through in sorted(set(fetched_through[symbol] for symbol in stale_symbols)):
+            symbols = [symbol for symbol in stale_symbols if fetched_through[symbol] == through]
+            download_size = max(1, memory_budget // ((end_day - through) * SymbolCache.bytes_per_downloaded_day))
+            for start in range(0, len(symbols), download_size):
+                download_symbols = symbols[start:start + download_size]
+                start_date_str = Utils.day_to_date(through + 1).toString(Qt.DateFormat.ISODate)
+                end_date_str = Utils.day_to_date(end_day + 1).toString(Qt.DateFormat.ISODate)
+                frame = SymbolCache.price_provider.download(download_symbols, start_date_str, end_date_str)
+
+                # The last day may still be trading, it is requested again on the next update
+                days, prices = SymbolCache.read_frame(frame, download_symbols)
+                grid = numpy.union1d(grid, days[days >= start_day])
+                for column, symbol in enumerate(download_symbols):
+                    self.save_stored_symbol(symbol, grid, days, {price_type: values[:, column] for price_type, values in prices.items()}, through, end_day - 1)
+
+        # Symbols saved before later downloads added days, or not cleaned from this start, are written again
+        no_days = numpy.zeros(0, dtype=numpy.int64)
+        for symbol in self.symbols:
+            stored = SymbolCache.price_store.map(symbol)
+            if stored is None:
+                continue
+            later_days = stored.days[stored.days >= start_day]
+            if stored.cleaned_from != start_day or (len(later_days) and len(later_days) != numpy.count_nonzero(grid >= later_days[0])):
+                # Every stored row is kept, the last day included, only the grid and the cleaning change
+                through = stored.fetched_through
+                last_day = int(stored.days[-1]) if len(stored.days) else through
+                del stored
+                self.save_stored_symbol(symbol, grid, no_days, {price_type: numpy.zeros(0) for price_type in SymbolCache.price_types}, last_day, through)
+
+        self.store_stale = False
+
+    def save_stored_symbol(self, symbol: str, grid: numpy.ndarray, days: numpy.ndarray, prices: dict[str, numpy.ndarray], kept_through: int, fetched_through: int):
+        # Stored days up to kept_through are kept, the given days come after them
+        start_day = Utils.date_to_day(self.start_date)
+        stored = SymbolCache.price_store.load(symbol)
+        covered_from = start_day
+        if SymbolCache.is_reusable(stored, start_day):
+            kept = stored.days <= kept_through
+            covered_from = stored.covered_from
+            days = numpy.concatenate((stored.days[kept], days))
+            prices = {price_type: numpy.concatenate((stored.prices[price_type][kept], prices[price_type])) for price_type in SymbolCache.price_types}
+
+        # Days before the start are kept as they are, the others are every day of the grid from the first price on, like save_symbol
+        earlier = days < start_day
+        later_days = days[~earlier]
+        priced = ~numpy.all(numpy.isnan(numpy.vstack([values[~earlier] for values in prices.values()])), axis=0)
+        grid_days = grid[grid >= later_days[numpy.argmax(priced)]] if priced.any() else numpy.zeros(0, dtype=numpy.int64)
+        rows = numpy.searchsorted(grid_days, later_days).clip(max=max(len(grid_days) - 1, 0))
+        traded = grid_days[rows] == later_days if len(grid_days) else numpy.zeros(len(later_days), dtype=bool)
+        grid_prices = {}
+        for price_type, values in prices.items():
+            grid_prices[price_type] = numpy.full(len(grid_days), numpy.nan)
+            grid_prices[price_type][rows[traded]] = values[~earlier][traded]
+
+        # Cleaned like the cache cleans its copy, each column only depends on its own prices from the start on
+        cleaned = {price_type: PriceCleaner.clean(grid_days, grid_prices[price_type][:, numpy.newaxis]) for price_type in PriceCleaner.cleaned_price_types}
+        cleaned['Adj Close'] = SymbolCache.get_adjusted_close(cleaned['Close'], grid_prices['Dividends'][:, numpy.newaxis], grid_prices['Stock Splits'][:, numpy.newaxis])
+        cleaned = {price_type: numpy.concatenate((numpy.full(numpy.count_nonzero(earlier), numpy.nan), values[:, 0])) for price_type, values in cleaned.items()}
+
+        try:
+            SymbolCache.price_store.save(symbol, StoredPrices(
+                covered_from,
+                fetched_through,
+                numpy.concatenate((days[earlier], grid_days)),
+                {price_type: numpy.concatenate((values[earlier], grid_prices[price_type])) for price_type, values in prices.items()},
+                start_day,
+                cleaned
+            ))
+        except Exception as e:
+            print(f"Error storing prices for {symbol}: {e}")
+        self.version += 1
+
+    def clean(self):
+        # Raw prices are what gets stored, gaps, spikes and invalid prices are only dealt with in the copy the lookups read
+        self.clean_prices = self.prices.copy()
+        reports = []
+        for price_type in PriceCleaner.cleaned_price_types:
+            index = SymbolCache.price_type_indices[price_type]
+            self.clean_prices[index], report = PriceCleaner.clean_with_report(self.days, self.prices[index], self.symbols, price_type)
+            reports.append(report)
+        adjusted_close = [SymbolCache.price_type_indices[price_type] for price_type in ['Adj Close', 'Close', 'Dividends', 'Stock Splits']]
+        self.clean_prices[adjusted_close[0]] = SymbolCache.get_adjusted_close(*self.clean_prices[adjusted_close[1:]])
+        self.quality_report = PriceQualityReport.concatenate(reports)
+        self.cleaned_version = self.version
 
-        if price_type not in self.cache:
+    @staticmethod
+    def get_adjusted_close(close: numpy.ndarray, dividends: numpy.ndarray, splits: numpy.ndarray) -> numpy.ndarray:
+        # Traded (day x symbol) closes grown by every split and reinvested dividend, then scaled so the last day is the close like
+        # the provider's Adj Close. Derived from all the rows at once, it is on the same basis however they were downloaded
+        ratios = numpy.where(numpy.isnan(splits) | (splits <= 0), 1.0, splits)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            reinvested = numpy.nan_to_num(1 + numpy.nan_to_num(dividends) / close, nan=1.0, posinf=1.0, neginf=1.0)
+        growth = numpy.cumprod(ratios * reinvested, axis=0)
+        return close * growth / growth[-1] if len(growth) else close.copy()
+
+    def get_quality_report(self) -> PriceQualityReport:
+        self.update()
+        return self.quality_report
+
+    @staticmethod
+    def read_frame(frame: DataFrame, symbols: list[str]) -> tuple[numpy.ndarray, dict[str, numpy.ndarray]]:
+        # Dates are stored as day ordinals so bulk lookups are a single searchsorted
+        days = frame.index.values.astype('datetime64[D]').astype(numpy.int64)
+        prices = {}
+
+        for price_type in SymbolCache.price_types:
+            if price_type in frame and price_type not in SymbolCache.derived_price_types:
+                price_frame = frame[price_type]
+                if not isinstance(price_frame, DataFrame):
+                    price_frame = price_frame.to_frame(symbols[0])
+                prices[price_type] = price_frame.reindex(columns=symbols).to_numpy(dtype=numpy.float64)
+            else:
+                prices[price_type] = numpy.full((len(days), len(symbols)), numpy.nan)
+
+        # Each day is scaled by the splits after it in the frame, which runs up to the newest day, so stored prices never need rewriting
+        ratios = numpy.where(numpy.isnan(prices['Stock Splits']) | (prices['Stock Splits'] <= 0), 1.0, prices['Stock Splits'])
+        later_factors = numpy.vstack((numpy.cumprod(ratios[:0:-1], axis=0)[::-1], numpy.ones((1, len(symbols)))))
+        for price_type in SymbolCache.split_adjusted_price_types:
+            prices[price_type] = prices[price_type] * later_factors
+
+        return days, prices
+
+    def allocate(self, capacity: int):
+        self.day_count = 0
+        self.day_buffer = numpy.zeros(capacity, dtype=numpy.int64)
+        # Every price type lives in one (price type x day x symbol) array, filled in a single pass
+        self.price_buffer = numpy.full((len(SymbolCache.price_types), capacity, len(self.symbols)), numpy.nan)
+        self.version += 1
+        self.update_views()
+
+    def update_views(self):
+        # Views over the filled rows, appending in place leaves the rows before the append point untouched
+        self.days = self.day_buffer[:self.day_count]
+        self.prices = self.price_buffer[:, :self.day_count]
+
+    def add_days(self, days: numpy.ndarray):
+        new_days = numpy.setdiff1d(days, self.days)
+        if len(new_days) == 0:
+            return
+
+        required_capacity = self.day_count + len(new_days)
+        if self.day_count == 0 or new_days[0] > self.days[-1]:
+            # Newer days are appended, the buffers only grow when full
+            if required_capacity > len(self.day_buffer):
+                capacity = max(required_capacity, 2 * len(self.day_buffer))
+                self.day_buffer = numpy.resize(self.day_buffer, capacity)
+                grown_buffer = numpy.full((self.price_buffer.shape[0], capacity, self.price_buffer.shape[2]), numpy.nan)
+                grown_buffer[:, :self.day_count] = self.prices
+                self.price_buffer = grown_buffer
+            self.day_buffer[self.day_count:required_capacity] = new_days
+        else:
+            # Days in the middle of the history, only happens when symbols trade on different calendars
+            merged_days = numpy.union1d(self.days, new_days)
+            rows = numpy.searchsorted(merged_days, self.days)
+            capacity = max(required_capacity, len(self.day_buffer))
+            self.day_buffer = numpy.zeros(capacity, dtype=numpy.int64)
+            self.day_buffer[:required_capacity] = merged_days
+            merged_buffer = numpy.full((self.price_buffer.shape[0], capacity, self.price_buffer.shape[2]), numpy.nan)
+            merged_buffer[:, rows] = self.prices
+            self.price_buffer = merged_buffer
+
+        self.day_count = required_capacity
+        self.update_views()
+
+    def store_prices(self, days: numpy.ndarray, symbols: list[str], prices: dict[str, numpy.ndarray]):
+        if len(days) == 0:
+            return
+
+        self.add_days(days)
+        rows = numpy.searchsorted(self.days, days)
+        columns = numpy.array([self.symbol_indices[symbol] for symbol in symbols], dtype=numpy.int64)
+        for price_type, values in prices.items():
+            # Files stored before Adj Close was derived still hold the provider's
+            if price_type in SymbolCache.price_type_indices and price_type not in SymbolCache.derived_price_types:
+                self.price_buffer[SymbolCache.price_type_indices[price_type]][numpy.ix_(rows, columns)] = values
+        self.version += 1
+
+    def save_symbol(self, symbol: str):
+        if SymbolCache.price_store is None:
+            return
+
+        # Every day from the first price on, so the days the symbol is missing are cleaned the same way once read back
+        # The stored file is written without cleaned prices, update_store cleans it again
+        self.store_stale = True
+        column = self.symbol_indices[symbol]
+        priced = ~numpy.all(numpy.isnan(self.prices[:, :, column]), axis=0)
+        traded = numpy.arange(len(self.days)) >= numpy.argmax(priced) if priced.any() else priced
+        try:
+            SymbolCache.price_store.save(symbol, StoredPrices(
+                Utils.date_to_day(self.start_date),
+                int(self.fetched_through[column]),
+                self.days[traded],
+                {price_type: self.prices[index, traded, column] for index, price_type in enumerate(SymbolCache.price_types)}
+            ))
+        except Exception as e:
+            print(f"Error storing prices for {symbol}: {e}")
+
+    def get_days(self) -> numpy.ndarray:
+        self.update()
+        return self.days
+
+    def get_symbol_price_at_date(self, symbol: str, date: QDate, price_type='Close'):
+        self.update()
+
+        if price_type not in SymbolCache.price_type_indices:
             raise ValueError(f"Price type {price_type} not found in cache.")
 
-        if symbol not in self.cache[price_type]:
+        if symbol not in self.symbol_indices:
             raise ValueError(f"Symbol {symbol} not found in cache[{price_type}].")
-        
-        timestamp = Timestamp(date.toString(Qt.DateFormat.ISODate))
-
-        if timestamp not in self.cache[price_type][symbol]:
-            raise ValueError(f"Date {timestamp} not found in cache[{price_type}][{symbol}].")
-        
-        return self.cache[price_type][symbol][timestamp]
-    
\ No newline at end of file
+
+        day = Utils.date_to_day(date)
+        row = numpy.searchsorted(self.days, day)
+
+        if row == len(self.days) or self.days[row] != day:
+            raise ValueError(f"Date {date.toString(Qt.DateFormat.ISODate)} not found in cache[{price_type}][{symbol}].")
+
+        return self.clean_prices[SymbolCache.price_type_indices[price_type], row, self.symbol_indices[symbol]]
+
+    def get_prices_at_days(self, symbols: list[str], days: numpy.ndarray, price_types: list[str]) -> numpy.ndarray:
+        self.update()
+
+        for price_type in price_types:
+            if price_type not in SymbolCache.price_type_indices:
+                raise ValueError(f"Price type {price_type} not found in cache.")
+
+        # One (price type x day x symbol) gather, anything missing is NaN
+        prices = numpy.full((len(price_types), len(days), len(symbols)), numpy.nan)
+
+        if len(self.days) == 0:
+            return prices
+
+        rows = numpy.searchsorted(self.days, days).clip(max=len(self.days) - 1)
+        found_rows = self.days[rows] == days
+        columns = numpy.array([self.symbol_indices.get(symbol, -1) for symbol in symbols], dtype=numpy.int64)
+        found_columns = columns >= 0
+        fields = numpy.array([SymbolCache.price_type_indices[price_type] for price_type in price_types], dtype=numpy.int64)
+
+        prices[numpy.ix_(numpy.ones(len(fields), dtype=bool), found_rows, found_columns)] = self.clean_prices[numpy.ix_(fields, rows[found_rows], columns[found_columns])]
+        return prices
+
+    def get_symbol_prices_at_days(self, symbols: list[str], days: numpy.ndarray, price_type='Close') -> numpy.ndarray:
+        # Rows are the requested days, columns the requested symbols
+        return self.get_prices_at_days(symbols, days, [price_type])[0]
+
+    def get_last_symbol_prices_at_days(self, symbol: str, days: numpy.ndarray, price_type='Close') -> tuple[numpy.ndarray, numpy.ndarray]:
+        # Price of the last day with one on or before every day, along with that day, NaN and -1 before the first price
+        all_days = self.get_days()
+        prices = self.get_symbol_prices_at_days([symbol], all_days, price_type)[:, 0]
+        priced = ~numpy.isnan(prices)
+        priced_days, priced_prices = all_days[priced], prices[priced]
+        if len(priced_days) == 0:
+            return numpy.full(len(days), numpy.nan), numpy.full(len(days), -1, dtype=numpy.int64)
+
+        rows = numpy.searchsorted(priced_days, days, side='right') - 1
+        found = rows >= 0
+        return numpy.where(found, priced_prices[rows.clip(min=0)], numpy.nan), numpy.where(found, priced_days[rows.clip(min=0)], -1)
+
+    def get_symbol_prices_at_points(self, symbols: list[str], days: numpy.ndarray, symbol_ids: numpy.ndarray, price_type='Close') -> numpy.ndarray:
+        # Prices of single (day, symbol) pairs, symbol ids index into the requested symbols, anything missing is NaN
+        self.update()
+
+        if price_type not in SymbolCache.price_type_indices:
+            raise ValueError(f"Price type {price_type} not found in cache.")
+
+        prices = numpy.full(len(days), numpy.nan)
+
+        if len(self.days) == 0:
+            return prices
+
+        rows = numpy.searchsorted(self.days, days).clip(max=len(self.days) - 1)
+        columns = numpy.array([self.symbol_indices.get(symbol, -1) for symbol in symbols], dtype=numpy.int64)[symbol_ids]
+        found = (self.days[rows] == days) & (columns >= 0)
+
+        prices[found] = self.clean_prices[SymbolCache.price_type_indices[price_type], rows[found], columns[found]]
+        return prices
+
+    def get_price_events(self, symbols: list[str], price_type: str) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        # Symbol ids (into symbols), days and values of the sparse price types, e.g. every split or dividend
+        prices = self.get_symbol_prices_at_days(symbols, self.get_days(), price_type)
+        rows, symbol_ids = numpy.nonzero(~numpy.isnan(prices) & (prices != 0))
+        return symbol_ids, self.days[rows], prices[rows, symbol_ids]
@@ -1,8 +1,8 @@
 import numpy
 
-from itertools import groupby
 from PySide6.QtCore import QDate
 from perfolio.portfolio import Portfolio
+from perfolio.utils import Utils
 
 class TWRPeriod:
     def __init__(self, start_date: QDate, end_date: QDate, period_return: float, growth_factor: float, begin_portfolio_value: float, end_portfolio_value: float, cash_flow: float, gain_loss: float):
@@ -15,64 +15,143 @@ class TWRPeriod:
         self.cash_flow = cash_flow
         self.gain_loss = gain_loss
 
+class TWRContribution:
+    def __init__(self, symbol: str, weight: float, contribution: float, gain_loss: float):
+        self.symbol = symbol
+        self.weight = weight
+        self.contribution = contribution
+        self.gain_loss = gain_loss
+
 class TWRResult:
-    def __init__(self, periods: list[TWRPeriod], value: float):
+    def __init__(self, periods: list[TWRPeriod], value: float, symbols: list[str] = [], boundary_days: numpy.ndarray = None, contributions: numpy.ndarray = None, weights: numpy.ndarray = None, gains_losses: numpy.ndarray = None):
         self.periods = periods
         self.value = value
 
+        # Per-symbol breakdown over all periods, one value per symbol
+        self.symbols = symbols
+        self.boundary_days = boundary_days
+        self.contributions = contributions
+        self.weights = weights
+        self.gains_losses = gains_losses
+
+class ModifiedDietzResult:
+    def __init__(self, value: float, begin_value: float, end_value: float, cash_flow: float, weighted_cash_flow: float):
+        self.value = value
+        self.begin_value = begin_value
+        self.end_value = end_value
+        self.cash_flow = cash_flow
+        self.weighted_cash_flow = weighted_cash_flow
+
 class TWRProcessor:
+    methods = ["Exact", "Modified Dietz", "Both"]
+
+    # Working memory of one period and symbol: values at both ends, cash flows, their breakdown and the positions behind them
+    bytes_per_symbol_period = 256
+
     @staticmethod
-    def calculate_twr_period(portfolio: Portfolio, period_date: QDate, previous_period_date: QDate, previous_period_portfolio: float) -> TWRPeriod:
-        current_portfolio = portfolio.get_value_at_date(period_date, True)
-        period_cash_flows = portfolio.get_cash_flows_between(previous_period_date, period_date)
-
-        if previous_period_portfolio != 0:
-            growth_factor = (current_portfolio - period_cash_flows) / previous_period_portfolio
-            period_return = ((current_portfolio - period_cash_flows) - previous_period_portfolio) / previous_period_portfolio
-        else:
-            growth_factor = 1
-            period_return = 0
-
-        gain_loss =  current_portfolio - previous_period_portfolio - period_cash_flows
-
-        return TWRPeriod(
-            previous_period_date,
-            period_date,
-            period_return,
-            growth_factor,
-            previous_period_portfolio,
-            current_portfolio,
-            period_cash_flows,
-            gain_loss
-        )
-    
+    def accumulate_rows(totals: numpy.ndarray, rows: numpy.ndarray) -> numpy.ndarray:
+        # Rows are added one after the other, so sums do not depend on where blocks start
+        return numpy.cumsum(numpy.vstack((totals, rows)), axis=0)[-1]
+
     @staticmethod
     def calculate_twr(portfolio: Portfolio, begin_date: QDate, end_date: QDate) -> TWRResult:
-        filtered_transactions = portfolio.get_transactions_between_dates(begin_date, end_date)
+        own_twr = portfolio.calculate_own_twr(begin_date, end_date)
+        if own_twr is not None:
+            return own_twr
+
+        ledger = portfolio.get_ledger()
+        symbol_count = len(ledger.symbols)
+
+        # Periods are split on every day with transactions
+        boundary_days = ledger.get_period_boundaries(Utils.date_to_day(begin_date), Utils.date_to_day(end_date))
+        period_count = len(boundary_days) - 1
 
-        # Combine transactions per period
-        periods_transactions = {key: list(group) for key, group in groupby(filtered_transactions, key=lambda t: t.date)}
+        # Periods are valued in blocks that fit the memory budget, carrying the last values and the compounding into the next block
+        block_size = portfolio.get_block_size(period_count, symbol_count * TWRProcessor.bytes_per_symbol_period)
 
-        periods = list[TWRPeriod]()
+        # The first period starts at the open, before that day's transactions, every other one at the close where the previous ended
+        previous_end_values = portfolio.get_values_matrix(boundary_days[:1], False)
+        blocks = []
+        compounding = 1.0
+        contributions = numpy.zeros(symbol_count)
+        weighted_lengths = numpy.zeros(symbol_count)
+        gains_losses = numpy.zeros(symbol_count)
 
-        previous_portfolio = portfolio.get_value_at_date(begin_date, False)
-        previous_period_date = begin_date
+        for start in range(0, period_count, block_size):
+            block_days = boundary_days[start:start + block_size + 1]
+            end_values = portfolio.get_values_matrix(block_days[1:], True)
+            begin_values = numpy.vstack((previous_end_values, end_values[:-1]))
+            cash_flows = portfolio.get_cash_flows_between_days(block_days)
+            previous_end_values = end_values[-1:]
 
-        for period_date in periods_transactions.keys():
-            if period_date != previous_period_date:
-                period_result = TWRProcessor.calculate_twr_period(portfolio, period_date, previous_period_date, previous_portfolio)
-                periods.append(period_result)
-                previous_period_date = period_date
-                previous_portfolio = period_result.end_portfolio_value
+            begin_totals = begin_values.sum(axis=1)
+            end_totals = end_values.sum(axis=1)
+            cash_flow_totals = cash_flows.sum(axis=1)
+            blocks.append((begin_totals, end_totals, cash_flow_totals))
 
-        if previous_period_date != end_date:
-            periods.append(TWRProcessor.calculate_twr_period(portfolio, end_date, previous_period_date, previous_portfolio))
+            # Each symbol's share of every period's return, compounded by the growth accumulated before that period
+            valid_periods = begin_totals != 0
+            safe_begin_totals = numpy.where(valid_periods, begin_totals, 1.0)[:, numpy.newaxis]
+            symbol_gains_losses = end_values - begin_values - cash_flows
+            period_contributions = numpy.where(valid_periods[:, numpy.newaxis], symbol_gains_losses / safe_begin_totals, 0.0)
+            block_compounding = numpy.cumprod(numpy.concatenate(([compounding], 1 + period_contributions.sum(axis=1))))
+            compounding = block_compounding[-1]
+            contributions = TWRProcessor.accumulate_rows(contributions, period_contributions * block_compounding[:-1, numpy.newaxis])
+
+            # Weights are averaged over time, using the length of each period
+            period_lengths = numpy.where(valid_periods, numpy.diff(block_days), 0)
+            period_weights = numpy.where(valid_periods[:, numpy.newaxis], begin_values / safe_begin_totals, 0.0)
+            weighted_lengths = TWRProcessor.accumulate_rows(weighted_lengths, period_weights * period_lengths[:, numpy.newaxis])
+            gains_losses = TWRProcessor.accumulate_rows(gains_losses, symbol_gains_losses)
+
+        begin_totals, end_totals, cash_flow_totals = [numpy.concatenate(totals) for totals in zip(*blocks)] if blocks else [numpy.zeros(0)] * 3
+
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            growth_factors = numpy.where(begin_totals != 0, (end_totals - cash_flow_totals) / begin_totals, 1.0)
+        period_returns = growth_factors - 1
+        period_gains_losses = end_totals - begin_totals - cash_flow_totals
+
+        periods = [
+            TWRPeriod(
+                Utils.day_to_date(boundary_days[index]),
+                Utils.day_to_date(boundary_days[index + 1]),
+                period_returns[index],
+                growth_factors[index],
+                begin_totals[index],
+                end_totals[index],
+                cash_flow_totals[index],
+                period_gains_losses[index]
+            )
+            for index in range(len(growth_factors))
+        ]
+
+        # Periods without a value to start from already have a growth factor of 1
+        twr = numpy.prod(growth_factors)
+
+        # Lengths are whole days, their total is exact whatever the blocks
+        total_length = numpy.diff(boundary_days)[begin_totals != 0].sum()
+        weights = weighted_lengths / total_length if total_length > 0 else numpy.zeros(symbol_count)
+
+        return TWRResult(periods, twr - 1, ledger.symbols, boundary_days, contributions, weights, gains_losses)
+
+    @staticmethod
+    def calculate_contributions(twr: TWRResult) -> list[TWRContribution]:
+        return [
+            TWRContribution(symbol, twr.weights[index], twr.contributions[index], twr.gains_losses[index])
+            for index, symbol in enumerate(twr.symbols)
+        ]
+
+    @staticmethod
+    def calculate_modified_dietz(portfolio: Portfolio, begin_date: QDate, end_date: QDate) -> ModifiedDietzResult:
+        begin_day = Utils.date_to_day(begin_date)
+        end_day = Utils.date_to_day(end_date)
 
-        twr = 1.0
+        # Approximates TWR from the two range valuations only, cash flows come from prefix sums
+        begin_value = portfolio.get_values_at_days(numpy.array([begin_day]), False)[0]
+        end_value = portfolio.get_values_at_days(numpy.array([end_day]), True)[0]
+        cash_flow, weighted_cash_flow = portfolio.get_weighted_cash_flows(begin_day, end_day)
 
-        for period in periods:
-            if not numpy.isnan(period.growth_factor):
-                twr *= period.growth_factor
+        average_capital = begin_value + weighted_cash_flow
+        value = (end_value - begin_value - cash_flow) / average_capital if average_capital != 0 else numpy.nan
 
-        return TWRResult(periods, twr - 1)
-    
\ No newline at end of file
+        return ModifiedDietzResult(value, begin_value, end_value, cash_flow, weighted_cash_flow)
@@ -1,9 +1,14 @@
 import os
 import sys
 import json
+import numpy
 
 from datetime import datetime
 from dateutil import parser
+from PySide6.QtCore import QDate
+
+# Julian day number of 1970-01-01, the numpy datetime64 epoch
+EPOCH_JULIAN_DAY = 2440588
 
 class Utils:
     @staticmethod
@@ -14,6 +19,18 @@ class Utils:
     def get_logs_folder_path():
         return os.path.join(Utils.get_appdata_path(), 'logs')
     
+    @staticmethod
+    def get_prices_folder_path():
+        return os.path.join(Utils.get_appdata_path(), 'prices')
+    
+    @staticmethod
+    def get_history_file_path():
+        return os.path.join(Utils.get_logs_folder_path(), 'results.sqlite3')
+    
+    @staticmethod
+    def get_diagnostics_file_path():
+        return os.path.join(Utils.get_logs_folder_path(), 'diagnostics.log')
+    
     @staticmethod
     def get_settings_file_path():
         return os.path.join(Utils.get_appdata_path(), "settings.json")
@@ -23,28 +40,26 @@ class Utils:
         return os.path.join(Utils.get_appdata_path(), "user.json")
     
     @staticmethod
-    def store_last_opened_portfolio(portfolio_file_path: str):
+    def store_last_opened_portfolio(portfolio_file_paths: list[str]):
         user_file = Utils.get_user_file_path()
-        data = {'last_portfolio_opened': portfolio_file_path}
+        data = {'last_portfolio_opened': portfolio_file_paths[0] if portfolio_file_paths else None, 'last_portfolios_opened': portfolio_file_paths}
         with open(user_file, 'w') as json_file:
             json.dump(data, json_file, indent=4)
 
     @staticmethod
-    def retrieve_last_opened_portfolio():
+    def retrieve_last_opened_portfolio() -> list[str]:
         user_file = Utils.get_user_file_path()
         if os.path.exists(user_file):
             with open(user_file, 'r') as json_file:
                 try:
                     data = json.load(json_file)
-                    last_portfolio_opened = data.get('last_portfolio_opened')
-                    if last_portfolio_opened and os.path.exists(last_portfolio_opened):
-                        return last_portfolio_opened
-                    else:
-                        return None
+                    # Files written before several portfolios could be opened only hold a single path
+                    last_portfolios_opened = data.get('last_portfolios_opened') or [data.get('last_portfolio_opened')]
+                    return [file_path for file_path in last_portfolios_opened if file_path and os.path.exists(file_path)]
                 except json.JSONDecodeError:
-                    return None  # Return None if there's an issue decoding JSON
+                    return []  # Return nothing if there's an issue decoding JSON
         else:
-            return None  # Return None if JSON file doesn't exist
+            return []  # Return nothing if JSON file doesn't exist
     
     @staticmethod
     def get_supported_date_formats():
@@ -57,4 +72,15 @@ class Utils:
             return parsed_date.strftime(format)
         except:
             return None
- 
\ No newline at end of file
+
+    @staticmethod
+    def date_to_day(date: QDate) -> int:
+        return date.toJulianDay() - EPOCH_JULIAN_DAY
+
+    @staticmethod
+    def day_to_date(day: int) -> QDate:
+        return QDate.fromJulianDay(int(day) + EPOCH_JULIAN_DAY)
+
+    @staticmethod
+    def dates_to_days(dates: list[QDate]) -> numpy.ndarray:
+        return numpy.array([Utils.date_to_day(date) for date in dates], dtype=numpy.int64)
@@ -0,0 +1,138 @@
+import numpy
+import pandas
+
+from perfolio.output import Column
+from perfolio.sparse import SparseSeries
+from perfolio.utils import Utils
+
+# Day ordinal of transactions without a valid date, shown as NaT
+INVALID_DAY = numpy.iinfo(numpy.int64).min
+
+class ValidationReport:
+    def __init__(self, valid: numpy.ndarray, prices_checked: bool, rows: numpy.ndarray, severities: list[str], issues: list[str], symbols: list[str], days: numpy.ndarray, messages: list[str]):
+        # valid[i] tells whether transaction i takes part in calculations, the other arrays hold one entry per issue
+        self.valid = valid
+        self.prices_checked = prices_checked
+        self.rows = rows
+        self.severities = severities
+        self.issues = issues
+        self.symbols = symbols
+        self.days = days
+        self.messages = messages
+
+    def get_issue_count(self) -> int:
+        return len(self.rows)
+
+    def get_error_count(self) -> int:
+        return self.severities.count("Error")
+
+    def get_columns(self) -> list[Column]:
+        return [
+            Column("Row", self.rows, "integer"),
+            Column("Severity", self.severities),
+            Column("Issue", self.issues),
+            Column("Symbol", self.symbols),
+            Column("Date", self.days.astype('datetime64[D]'), "date"),
+            Column("Message", self.messages),
+        ]
+
+class PortfolioValidator:
+    @staticmethod
+    def to_floats(values: list) -> numpy.ndarray:
+        # Anything that does not parse as a number becomes NaN
+        return pandas.to_numeric(pandas.Series(values, dtype=object), errors='coerce').to_numpy(dtype=numpy.float64)
+
+    @staticmethod
+    def validate(transactions: list, price_source=None) -> ValidationReport:
+        # The price source is the symbol cache, or prices streamed from the price store
+        count = len(transactions)
+        symbols = numpy.array([transaction.symbol or "" for transaction in transactions], dtype=object)
+        types = numpy.array([transaction.type for transaction in transactions], dtype=object)
+        quantities = PortfolioValidator.to_floats([transaction.quantity for transaction in transactions])
+        prices = PortfolioValidator.to_floats([transaction.price for transaction in transactions])
+        valid_dates = numpy.array([transaction.date is not None and transaction.date.isValid() for transaction in transactions], dtype=bool)
+        days = numpy.array([Utils.date_to_day(transaction.date) if valid else INVALID_DAY for transaction, valid in zip(transactions, valid_dates)], dtype=numpy.int64)
+
+        is_trade = (types == 'buy') | (types == 'sell')
+
+        # Each check is a mask over every transaction, flagged rows become issues
+        checks = [
+            ("Error", "Invalid date", ~valid_dates, "Date could not be parsed, the transaction is ignored."),
+            ("Error", "Missing symbol", symbols == "", "Symbol is empty, the transaction is ignored."),
+            ("Warning", "Unknown type", ~is_trade, "Only 'buy' and 'sell' transactions are supported, the transaction is ignored."),
+            ("Error", "Invalid quantity", is_trade & ~(quantities > 0), "Quantity is not a positive number, the transaction is ignored."),
+            ("Error", "Invalid price", is_trade & ~(prices >= 0), "Price is missing or negative, the transaction is ignored."),
+        ]
+
+        valid = numpy.ones(count, dtype=bool)
+        for _, _, mask, _ in checks:
+            valid &= ~mask
+
+        # Prices and splits can only be checked once they are loaded
+        prices_checked = price_source is not None and not price_source.invalid
+        unique_symbols, symbol_ids = numpy.unique(symbols.astype(str), return_inverse=True)
+
+        # Quantities in shares before any split, like Portfolio.get_split_adjustment, so a sale after a split is compared with the shares it multiplied
+        kept = numpy.flatnonzero(valid)
+        split_factors = numpy.ones(count)
+        if prices_checked and len(kept):
+            event_symbol_ids, event_days, ratios = price_source.get_price_events(unique_symbols.tolist(), 'Stock Splits')
+            splits = (ratios > 0) & (ratios != 1)
+            factors = SparseSeries.from_changes(len(unique_symbols), event_symbol_ids[splits], event_days[splits], ratios[splits], numpy.cumprod, 1.0)
+            split_factors[kept] = factors.get_values(symbol_ids[kept], days[kept])
+
+        # Positions at the end of each day, per symbol, only from the transactions that are kept
+        order = kept[numpy.lexsort((days[kept], symbols[kept].astype(str)))]
+        sorted_symbols = symbols[order]
+        sorted_days = days[order]
+        signed_quantities = numpy.where(types[order] == 'sell', -quantities[order], quantities[order]) / split_factors[order]
+
+        symbol_starts = numpy.ones(len(order), dtype=bool)
+        symbol_starts[1:] = sorted_symbols[1:] != sorted_symbols[:-1]
+        positions = numpy.cumsum(signed_quantities)
+        positions -= (positions - signed_quantities)[symbol_starts][numpy.cumsum(symbol_starts) - 1]
+
+        day_starts = symbol_starts.copy()
+        day_starts[1:] |= sorted_days[1:] != sorted_days[:-1]
+
+        # Without any valid transaction there is no day to end
+        day_ends = numpy.append(numpy.flatnonzero(day_starts)[1:], len(order)) - 1 if len(order) else order
+        end_of_day_positions = positions[day_ends][numpy.cumsum(day_starts) - 1] * split_factors[order]
+
+        oversold = numpy.zeros(count, dtype=bool)
+        oversold[order] = (types[order] == 'sell') & (end_of_day_positions < -1e-9)
+        checks.append(("Warning", "Negative position", oversold, "Sell leaves a negative position at the end of the day."))
+
+        if prices_checked:
+            priced_symbol_ids, _, _ = price_source.get_price_events(unique_symbols.tolist(), 'Close')
+            known_symbols = numpy.isin(numpy.arange(len(unique_symbols)), priced_symbol_ids)[symbol_ids]
+            checks.append(("Warning", "Unknown symbol", valid & ~known_symbols, "No prices were found for this symbol, its holdings are valued at zero."))
+
+        rows = []
+        severities = []
+        issues = []
+        issue_symbols = []
+        issue_days = []
+        messages = []
+        for severity, issue, mask, message in checks:
+            flagged = numpy.flatnonzero(mask)
+            rows.append(flagged + 1)
+            severities += [severity] * len(flagged)
+            issues += [issue] * len(flagged)
+            issue_symbols += symbols[flagged].tolist()
+            issue_days.append(days[flagged])
+            messages += [message] * len(flagged)
+
+        # Issues are listed in file order
+        rows = numpy.concatenate(rows)
+        order = numpy.argsort(rows, kind='stable')
+        return ValidationReport(
+            valid,
+            prices_checked,
+            rows[order],
+            [severities[index] for index in order],
+            [issues[index] for index in order],
+            [issue_symbols[index] for index in order],
+            numpy.concatenate(issue_days)[order],
+            [messages[index] for index in order]
+        )
@@ -0,0 +1,89 @@
+from PySide6.QtCore import QDate
+from perfolio.periodic import PeriodicReturnsProcessor
+from perfolio.portfolio import Portfolio, Transaction
+from perfolio.twr import TWRProcessor
+
+# One change of the transaction list: at index, removed is taken out and added put in its place
+class TransactionEdit:
+    def __init__(self, index: int, removed: Transaction, added: Transaction):
+        self.index = index
+        self.removed = removed
+        self.added = added
+
+    def get_inverse(self) -> 'TransactionEdit':
+        return TransactionEdit(self.index, self.added, self.removed)
+
+    def get_earliest_date(self) -> QDate:
+        # Results ending before this date are not affected by the edit
+        dates = [transaction.date for transaction in (self.removed, self.added) if transaction is not None and transaction.date is not None and transaction.date.isValid()]
+        return min(dates, default=QDate())
+
+# Hypothetical edits of the loaded transactions, undone and redone by applying their inverse
+class WhatIfSession:
+    def __init__(self, portfolio: Portfolio):
+        self.portfolio = portfolio
+        self.undo_stack = list[TransactionEdit]()
+        self.redo_stack = list[TransactionEdit]()
+
+    def clear(self):
+        # Loading or reloading files discards the edits
+        self.undo_stack = []
+        self.redo_stack = []
+
+    def get_edit_count(self) -> int:
+        return len(self.undo_stack)
+
+    def can_undo(self) -> bool:
+        return len(self.undo_stack) > 0
+
+    def can_redo(self) -> bool:
+        return len(self.redo_stack) > 0
+
+    def apply(self, edit: TransactionEdit) -> QDate:
+        self.portfolio.edit_transactions(edit.index, edit.removed, edit.added)
+        return edit.get_earliest_date()
+
+    def edit(self, edit: TransactionEdit) -> QDate:
+        self.redo_stack = []
+        self.undo_stack.append(edit)
+        return self.apply(edit)
+
+    def add(self, transaction: Transaction) -> QDate:
+        return self.edit(TransactionEdit(len(self.portfolio.transactions), None, transaction))
+
+    def remove(self, index: int) -> QDate:
+        return self.edit(TransactionEdit(index, self.portfolio.transactions[index], None))
+
+    def modify(self, index: int, transaction: Transaction) -> QDate:
+        return self.edit(TransactionEdit(index, self.portfolio.transactions[index], transaction))
+
+    def undo(self) -> QDate:
+        if not self.can_undo():
+            return None
+        edit = self.undo_stack.pop()
+        self.redo_stack.append(edit)
+        return self.apply(edit.get_inverse())
+
+    def redo(self) -> QDate:
+        if not self.can_redo():
+            return None
+        edit = self.redo_stack.pop()
+        self.undo_stack.append(edit)
+        return self.apply(edit)
+
+    def get_summary(self, begin_date: QDate, end_date: QDate) -> str:
+        # Holdings, TWR and MWR of the edited portfolio between the nearest trading days, the MWR the same way as the Calculate MWR operation
+        portfolio = self.portfolio
+        ranges = PeriodicReturnsProcessor.snap_to_trading_days(portfolio, [("", begin_date, end_date)])
+        if not ranges:
+            return f"What-if ({self.get_edit_count()} edits): no trading day in the period"
+        _, begin_date, end_date = ranges[0]
+        holdings = portfolio.get_holdings_at_date(end_date, True)
+        final_value = portfolio.get_value_at_date(end_date, True)
+        initial_value = portfolio.get_value_at_date(begin_date, False)
+        cash_flows = portfolio.get_cash_flows_between(begin_date, end_date) - portfolio.get_dividends_between(begin_date, end_date)
+        twr = TWRProcessor.calculate_twr(portfolio, begin_date, end_date)
+        mwr = f"{(final_value - cash_flows) / initial_value - 1:.2%}" if initial_value != 0 else "n/a"
+
+        period = f"{begin_date.toString('yyyy-MM-dd')} to {end_date.toString('yyyy-MM-dd')}"
+        return f"What-if ({self.get_edit_count()} edits, {period}): {len(holdings)} holdings worth {final_value:,.2f}, TWR {twr.value:.2%}, MWR {mwr}"